@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+'''
+Copyright 2016 John David Anderson
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Author: John D. Anderson
+Email: jander43@vols.utk.edu
+Usage:
+    batch_export.py 'file.hdf5' 'outdir' 'start' 'stop' 'every'
+                    ['png' | 'gif' | 'mp4'] ['dataset' ...]
+Description:
+    This program writes heatmap frames of many datasets and steps in one go.
+    The parent process reads the rows holding the steps of a dataset (as
+    chunks of all runs x several steps, resolved through step_index.py) and
+    a process pool renders the frames (PNG, with matplotlib's Agg backend,
+    coloured like the GUI by colour_lut.py).
+    Frames of each dataset can then be encoded to an animated GIF or MP4 with
+    ffmpeg or ImageMagick, when either is installed.
+'''
+
+# libraries
+import sys
+import os
+import re
+import logging
+import subprocess
+import multiprocessing
+from distutils.spawn import find_executable
+import lazy_import
+
+# lazily loaded libraries (see lazy_import.py)
+np = lazy_import.LazyModule('numpy')
+mpl_figure = lazy_import.LazyModule('matplotlib.figure')
+backend_agg = lazy_import.LazyModule('matplotlib.backends.backend_agg')
+
+# custom libraries (local directory)
+import stream_reader
+import storage
+import square_build
+import step_index
+import colour_lut
+
+# constants
+FORMATS = ('png', 'gif', 'mp4')
+FPS = 5
+DPI = 90
+
+# globals (set in each pool process by init_worker)
+WORKER = {}
+
+
+# functions
+def frame_stem(dset):
+    '''
+    Function to generate the file name stem of a dataset's frames and
+    animation.
+    '''
+    return re.sub(r'\W+', '_', dset).strip('_')
+
+
+def frame_name(dset, step):
+    '''
+    Function to generate the file name of a frame.
+    '''
+    return '{0}_{1:06d}.png'.format(frame_stem(dset), step)
+
+
+def grid_index(nruns):
+    '''
+    Function to return the (rows, cols) tile position of every run, in the
+    square layout used by the GUI (see square_build.py).
+    '''
+    list_rows = square_build.square_builder(nruns)
+    rows = np.repeat(np.arange(len(list_rows)), [r[0] for r in list_rows])
+    cols = np.concatenate([np.arange(r[0]) for r in list_rows])
+    return rows, cols
+
+
+def init_worker(nruns, colormap, norm):
+    '''
+    Function to set up a pool process (tile layout and colour table).
+    '''
+    WORKER['rows'], WORKER['cols'] = grid_index(nruns)
+    WORKER['colormap'], WORKER['norm'] = colormap, norm
+    rgb = [[int(c[i:i + 2], 16) for i in (1, 3, 5)]
+           for c in colour_lut.lut(colormap) + [colour_lut.MISSING]]
+    WORKER['rgb'] = np.array(rgb, dtype=np.uint8)
+
+
+def render_frame(task):
+    '''
+    Function run in a pool process to render one heatmap frame to PNG.
+    '''
+    path, title, values = task
+
+    # tiles coloured on the frame's own scale (like the GUI)
+    grid = np.empty((WORKER['rows'].max() + 1, WORKER['cols'].max() + 1))
+    grid.fill(np.nan)
+    grid[WORKER['rows'], WORKER['cols']] = values
+    cmap = colour_lut.ColourMap(values, WORKER['colormap'], WORKER['norm'])
+    image = WORKER['rgb'][cmap.index(grid)]
+
+    # draw
+    fig = mpl_figure.Figure(figsize=(4, 4.4), dpi=DPI)
+    backend_agg.FigureCanvasAgg(fig)
+    axes = fig.add_subplot(111)
+    axes.imshow(image, interpolation='nearest')
+    axes.set_xticks([])
+    axes.set_yticks([])
+    axes.set_title(title, fontsize='small')
+    axes.set_xlabel('{0:.4g} - {1:.4g} ({2})'.format(cmap.vmin, cmap.vmax,
+                                                     cmap.norm),
+                    fontsize='small')
+    fig.savefig(path)
+    return path
+
+
+def gen_step_chunks(source, index, runs, datapath, start, stop, every,
+                    fill='nan', memory_limit=stream_reader.MEMORY_LIMIT):
+    '''
+    Generator to yield (steps, [runs x len(steps)] values) covering [step]
+    values "start" to "stop" (every "every"th), reading chunks of all runs
+    (of a store, see storage.py) that fit in "memory_limit". Steps are
+    resolved to rows of each run by "index" (a step_index.StepIndex, see
+    step_index.FILLS for "fill"), like the 'value' heatmap reduction.
+    '''
+    steps = range(start, stop + 1, every)
+    width = max(1, memory_limit // (len(runs) * stream_reader.ITEM_BYTES))
+    for i in xrange(0, len(steps), width):
+        chunk_steps = steps[i:i + width]
+        rows = np.column_stack([index.rows(step, fill, runs)
+                                for step in chunk_steps])
+        yield chunk_steps, source.read_rows(datapath, runs, rows)[1]
+
+
+def encode(frames, outpath, fmt, fps=FPS):
+    '''
+    Function to encode PNG frames as an animated GIF or MP4 with ffmpeg (or
+    ImageMagick's convert for GIFs). Returns False if no encoder is found.
+    '''
+    ffmpeg, convert = find_executable('ffmpeg'), find_executable('convert')
+    listing = outpath + '.txt'
+    if ffmpeg:
+        with open(listing, 'w') as f:
+            for frame in frames:
+                f.write("file '{0}'\nduration {1}\n".format(
+                    os.path.abspath(frame), 1.0 / fps))
+        cmd = [ffmpeg, '-y', '-loglevel', 'error', '-f', 'concat', '-safe',
+               '0', '-i', listing]
+        if fmt == 'mp4':
+            cmd += ['-pix_fmt', 'yuv420p', '-vf',
+                    'scale=trunc(iw/2)*2:trunc(ih/2)*2']
+        subprocess.check_call(cmd + [outpath])
+        os.remove(listing)
+    elif convert and fmt == 'gif':
+        subprocess.check_call([convert, '-delay', str(100 // fps), '-loop',
+                               '0'] + list(frames) + [outpath])
+    else:
+        return False
+    return True
+
+
+def batch_export(hdfpath, outdir, start, stop, every=1, fmt='png',
+                 datasets=None, colormap='pyvisualize', norm='linear',
+                 workers=None, fill='nan',
+                 memory_limit=stream_reader.MEMORY_LIMIT):
+    '''
+    Function to export heatmap frames of "datasets" (all if None) for [step]
+    values "start" to "stop" (see step_index.FILLS for "fill"), returning
+    {dataset: [frame paths]} (plus the animation path per dataset for
+    'gif'/'mp4').
+    '''
+    if fmt not in FORMATS:
+        raise ValueError('unknown format: {0}'.format(fmt))
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+
+    # source (see storage.py) and its steps (see step_index.py)
+    source = storage.open_store(hdfpath)
+    runs, dnames = source.runs, source.datasets
+    index = step_index.store_index(source)
+
+    pool = multiprocessing.Pool(workers, init_worker,
+                                (len(runs), colormap, norm))
+    results = {}
+    try:
+        for dset in datasets or dnames:
+            frames, pending = [], None
+
+            # read next chunk while the previous one renders
+            for steps, chunk in gen_step_chunks(source, index, runs, dset,
+                                                start, stop, every, fill,
+                                                memory_limit):
+                tasks = [(os.path.join(outdir, frame_name(dset, step)),
+                          '{0} | step {1}'.format(dset, step), chunk[:, i])
+                         for i, step in enumerate(steps)]
+                if pending is not None:
+                    frames.extend(pending.get())
+                pending = pool.map_async(render_frame, tasks)
+            if pending is not None:
+                frames.extend(pending.get())
+            results[dset] = frames
+            logging.info('Exported: {0} frames of {1}'.format(len(frames),
+                                                              dset))
+
+            # animation
+            if fmt != 'png' and frames:
+                outpath = os.path.join(outdir, '{0}.{1}'.format(
+                    frame_stem(dset), fmt))
+                if encode(frames, outpath, fmt):
+                    results[dset + '.' + fmt] = outpath
+                else:
+                    logging.warning('No {0} encoder found (ffmpeg/convert), '
+                                    'kept PNG frames'.format(fmt))
+    finally:
+        pool.close()
+        pool.join()
+        source.close()
+
+    # return
+    return results
+
+
+# executable
+if __name__ == '__main__':
+
+    if len(sys.argv) < 6:
+        sys.exit()
+    else:
+        logging.basicConfig(level=logging.INFO)
+        fmt = sys.argv[6] if len(sys.argv) > 6 else 'png'
+        batch_export(sys.argv[1], sys.argv[2], int(sys.argv[3]),
+                     int(sys.argv[4]), int(sys.argv[5]), fmt,
+                     sys.argv[7:] or None)
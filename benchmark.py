@@ -0,0 +1,442 @@
+#!/usr/bin/env python
+'''
+Copyright 2016 John David Anderson
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Author: John D. Anderson
+Email: jander43@vols.utk.edu
+Usage:
+    benchmark.py 'runs' 'ticks' 'metrics' ['results.json']
+    benchmark.py backends 'runs' 'ticks' 'metrics' ['results.json']
+    benchmark.py compare 'old.json' 'new.json'
+Description:
+    This program generates a synthetic NetLogo BehaviorSpace "table" CSV of
+    runs x ticks x metrics, times each stage of the pyvisualize pipeline on it
+    (conversion, slice reads, layout, colouring and rendering) and writes the
+    results as JSON so separate benchmark runs can be compared. The
+    "backends" mode instead converts the same CSV to each storage backend
+    (see storage.py), compares conversion time, size on disk, metadata,
+    tick slice, all tick and per run read latency, and checks every backend
+    reads the same step index, all tick means and summaries as the HDF5
+    file.
+'''
+
+# libraries
+import sys
+import os
+import time
+import json
+import random
+import shutil
+import tempfile
+import platform
+import subprocess
+import Queue
+import lazy_import
+
+# lazily loaded libraries (see lazy_import.py)
+np = lazy_import.LazyModule('numpy')
+
+# custom libraries (local directory)
+import pyvisualize
+import square_build
+import heatmap_metrics
+import csv_parse
+import run_summary
+import colour_lut
+import storage
+import flat_store
+import stream_reader
+import step_index
+
+# constants
+REPEAT = 3
+PARALLEL = 8
+PARAMS = 16
+SAMPLE_RUNS = 10
+RESULTS = 'benchmark_results.json'
+HERE = os.path.dirname(os.path.abspath(__file__))
+PREAMBLE = (
+    '"BehaviorSpace results (NetLogo 5.2.1)"\n'
+    '"benchmark.nlogo"\n'
+    '"experiment"\n'
+    '"01/01/2016 00:00:00:000 -0000"\n'
+    '"min-pxcor","max-pxcor","min-pycor","max-pycor"\n'
+    '"0","30","0","30"\n'
+)
+
+
+# functions
+def quote(fields):
+    '''
+    Function to format a row the way BehaviorSpace does (every field quoted).
+    '''
+    return ','.join('"{0}"'.format(field) for field in fields) + '\n'
+
+
+def gen_behaviorspace_csv(path, runs, ticks, metrics, seed=0):
+    '''
+    Function to write a synthetic BehaviorSpace table of "runs" x "ticks" x
+    "metrics". Like BehaviorSpace, PARALLEL runs are interleaved row by row.
+    '''
+    rand = random.Random(seed)
+
+    # header
+    names = ['param_{0}'.format(i) for i in range(PARAMS - 1)]
+    header = (['[run number]'] + names + ['mode', '[step]'] +
+              ['metric_{0}'.format(i) for i in range(metrics)])
+
+    with open(path, 'w') as f:
+        f.write(PREAMBLE)
+        f.write(quote(header))
+
+        # batches of interleaved runs
+        for r0 in xrange(1, runs + 1, PARALLEL):
+            batch = range(r0, min(r0 + PARALLEL, runs + 1))
+            params = {run: [rand.randint(0, 9) for __ in names] +
+                      ['""{0}""'.format(rand.choice(('Batch', 'Chemostat')))]
+                      for run in batch}
+            state = {run: [rand.random() * 100 for __ in range(metrics)]
+                     for run in batch}
+            for step in xrange(ticks):
+                for run in batch:
+                    values = state[run]
+                    for i in range(metrics):
+                        values[i] = max(0.0, values[i] + rand.gauss(0, 5))
+                    f.write(quote([run] + params[run] + [step] +
+                                  ['{0:.4f}'.format(v) for v in values]))
+
+    # return
+    return path
+
+
+def timed(func, *args):
+    '''
+    Function to call func(*args) REPEAT times, returning (result, seconds).
+    '''
+    seconds = []
+    for __ in range(REPEAT):
+        start = time.time()
+        result = func(*args)
+        seconds.append(time.time() - start)
+    return result, seconds
+
+
+def startup():
+    '''
+    Function to time a cold import of pyvisualize in a fresh interpreter.
+    '''
+    code = ('import time; t = time.time(); import pyvisualize; '
+            'print time.time() - t')
+    out = subprocess.check_output([sys.executable, '-c', code], cwd=HERE)
+    return float(out.split()[-1])
+
+
+def parse(csvpath, backend):
+    '''
+    Function to parse the CSV body without writing anything.
+    '''
+    with open(csvpath, 'rU') as f:
+        header = csv_parse.read_header(f)
+        for block in csv_parse.gen_blocks(f, len(header), backend):
+            pass
+
+
+def convert(csvpath, backend='hdf5'):
+    '''
+    Function to run the CSV conversion to a store of "backend" (see
+    storage.BACKENDS), returning the path of the store.
+    '''
+    return pyvisualize.csv2hdf5(csvpath, Queue.LifoQueue(), store=backend)
+
+
+def metadata(path):
+    '''
+    Function to open a store and read its runs, datasets and the parameters
+    of its first run.
+    '''
+    with storage.open_store(path) as store:
+        return len(store.runs), store.datasets, store.run_params(store.runs[0])
+
+
+def read_runs(path, runs):
+    '''
+    Function to read every dataset of "runs" the way the portfolio does (see
+    pyvisualize.find_group).
+    '''
+    for run in runs:
+        grpQ, attrQ = Queue.Queue(), Queue.Queue()
+        pyvisualize.find_group(path, run, grpQ, attrQ)
+        list(iter(grpQ.get, None))
+
+
+def store_results(store, ticks):
+    '''
+    Function to return the step index fields, all tick means and summary
+    statistics of "/metric_0" read from a store.
+    '''
+    index = step_index.scan(store)
+    means = np.concatenate([values for __, values in
+                            heatmap_metrics.reduce_runs(
+                                store, '/metric_0', 'mean', 0, ticks - 1,
+                                index)])
+    runs, stats = run_summary.summarize(store, '/metric_0')
+    return {'index_runs': index.runs, 'index_first': index.first,
+            'index_stride': index.stride, 'index_length': index.length,
+            'means': means, 'summary_runs': np.asarray(runs), 'summary': stats}
+
+
+def check_store(path, expected, ticks):
+    '''
+    Function to raise a ValueError if the store at "path" reads other
+    results (see store_results) than "expected".
+    '''
+    with storage.open_store(path) as store:
+        results = store_results(store, ticks)
+    for name in sorted(expected):
+        if (results[name].shape != expected[name].shape or
+                not np.allclose(results[name], expected[name],
+                                equal_nan=True)):
+            raise ValueError('{0} reads another {1} than the HDF5 file'.format(
+                path, name))
+
+
+def layout(values):
+    '''
+    Function to run the square layout of heatmap tiles.
+    '''
+    list_rows = square_build.square_builder(len(values))
+    return square_build.square_list(list_rows, list(values))
+
+
+def colour(heat_map):
+    '''
+    Function to run the colouring of every heatmap tile (i.e. fitting a
+    colour_lut.ColourMap and looking up every tile).
+    '''
+    values = [temp for row in heat_map for temp in row]
+    cmap = colour_lut.ColourMap(values)
+    return [cmap.colours[i] for i in cmap.index(values)]
+
+
+def render(heat_map, run_map, hdfpath):
+    '''
+    Function to draw the heatmap on a withdrawn Tk window (None if no display
+    is available).
+    '''
+    try:
+        root = pyvisualize.Tkinter.Tk()
+    except pyvisualize.Tkinter.TclError:
+        return None
+    root.withdraw()
+    cmap = colour_lut.ColourMap([temp for row in heat_map for temp in row])
+    start = time.time()
+    can, __, __ = pyvisualize.draw_heatmap(root, root, heat_map, run_map,
+                                           hdfpath, cmap)
+    root.update_idletasks()
+    seconds = time.time() - start
+    root.destroy()
+    return seconds
+
+
+def run_benchmark(runs, ticks, metrics, workdir=None):
+    '''
+    Function to time every pipeline stage on a synthetic data set, returning a
+    list of result dicts.
+    '''
+    # scratch directory
+    cleanup = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='pyvisualize_bench_')
+    case = '{0}x{1}x{2}'.format(runs, ticks, metrics)
+    results = []
+
+    def record(stage, seconds):
+        results.append({'case': case, 'stage': stage, 'seconds': seconds,
+                        'best': min(seconds) if seconds else None})
+
+    try:
+        # cold start
+        record('startup', [startup() for i in range(REPEAT)])
+
+        # generate data
+        csvpath = os.path.join(workdir, 'bench_{0}.csv'.format(case))
+        start = time.time()
+        gen_behaviorspace_csv(csvpath, runs, ticks, metrics)
+        record('generate', [time.time() - start])
+
+        # parsing only
+        for backend in csv_parse.BACKENDS:
+            __, seconds = timed(parse, csvpath, backend)
+            record('parse_' + backend, seconds)
+
+        # conversion
+        hdfpath, seconds = timed(convert, csvpath)
+        record('csv2hdf5', seconds)
+
+        # slice reads (single tick, then a reduction over all ticks)
+        tick = ticks // 2
+        values, seconds = timed(heatmap_metrics.heatmap_values, hdfpath,
+                                '/metric_0', 'value', tick)
+        record('read_slice', seconds)
+        __, seconds = timed(heatmap_metrics.heatmap_values, hdfpath,
+                            '/metric_0', 'mean', 0, ticks - 1)
+        record('read_mean', seconds)
+
+        # top N query on the summary index
+        __, seconds = timed(run_summary.top_runs, hdfpath, '/metric_0',
+                            'peak', 10)
+        record('top_runs', seconds)
+
+        # layout
+        runs_sorted = sorted(values)
+        ordered = [values[run] for run in runs_sorted]
+        heat_map, seconds = timed(layout, ordered)
+        record('square_list', seconds)
+        run_map = layout(runs_sorted)
+
+        # colouring
+        __, seconds = timed(colour, heat_map)
+        record('crange', seconds)
+
+        # rendering
+        seconds = [render(heat_map, run_map, hdfpath) for i in range(REPEAT)]
+        record('render', [s for s in seconds if s is not None])
+
+    finally:
+        if cleanup:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    # return
+    return results
+
+
+def run_backends(runs, ticks, metrics, workdir=None):
+    '''
+    Function to convert one synthetic data set to every storage backend and
+    time the same reads on each, returning a list of result dicts (stages
+    are prefixed by the backend; per run reads are seconds per run).
+    '''
+    # scratch directory
+    cleanup = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='pyvisualize_bench_')
+    case = '{0}x{1}x{2}'.format(runs, ticks, metrics)
+    results = []
+
+    def record(stage, seconds, size=None):
+        results.append({'case': case, 'stage': stage, 'seconds': seconds,
+                        'best': min(seconds) if seconds else None,
+                        'bytes': size})
+
+    try:
+        # generate data
+        csvpath = os.path.join(workdir, 'bench_{0}.csv'.format(case))
+        gen_behaviorspace_csv(csvpath, runs, ticks, metrics)
+        sample = range(1, runs + 1, max(1, runs // SAMPLE_RUNS))
+        paths = {}
+
+        for backend in storage.BACKENDS:
+
+            # conversion (and size on disk)
+            path, seconds = timed(convert, csvpath, backend)
+            record(backend + '_convert', seconds, storage.disk_size(path))
+            paths[backend] = path
+
+            # metadata
+            __, seconds = timed(metadata, path)
+            record(backend + '_metadata', seconds)
+
+            # one tick of every run, then every tick of one dataset
+            __, seconds = timed(heatmap_metrics.heatmap_values, path,
+                                '/metric_0', 'value', ticks // 2)
+            record(backend + '_read_slice', seconds)
+            __, seconds = timed(heatmap_metrics.heatmap_values, path,
+                                '/metric_0', 'mean', 0, ticks - 1)
+            record(backend + '_read_mean', seconds)
+
+            # whole runs
+            __, seconds = timed(read_runs, path, sample)
+            record(backend + '_read_run', [s / len(sample) for s in seconds])
+
+        # same results from every store as from the HDF5 file itself
+        with stream_reader.HDF5Store(hdf5path=paths['hdf5']) as store:
+            expected = store_results(store, ticks)
+        flat_store.export_flat(paths['hdf5'])
+        for path in paths.values():
+            check_store(path, expected, ticks)
+
+    finally:
+        if cleanup:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    # return
+    return results
+
+
+def write_results(results, outpath):
+    '''
+    Function to write benchmark results (plus machine details) as JSON.
+    '''
+    report = {
+              'meta': {
+                       'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'python': platform.python_version(),
+                       'platform': platform.platform(),
+                       'repeat': REPEAT
+              },
+              'results': results
+    }
+    with open(outpath, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def compare_results(oldpath, newpath):
+    '''
+    Function to print the ratio new/old of the best time of every stage.
+    '''
+    with open(oldpath) as f:
+        old = {(r['case'], r['stage']): r['best']
+               for r in json.load(f)['results']}
+    with open(newpath) as f:
+        new = json.load(f)['results']
+    for result in new:
+        key = (result['case'], result['stage'])
+        if old.get(key) and result['best']:
+            print '{0:>16} {1:<12} {2:10.4f}s {3:6.2f}x'.format(
+                key[0], key[1], result['best'], result['best'] / old[key])
+
+
+# executable
+if __name__ == '__main__':
+
+    if len(sys.argv) == 4 and sys.argv[1] == 'compare':
+        compare_results(sys.argv[2], sys.argv[3])
+    elif len(sys.argv) in (5, 6) and sys.argv[1] == 'backends':
+        results = run_backends(int(sys.argv[2]), int(sys.argv[3]),
+                               int(sys.argv[4]))
+        outpath = sys.argv[5] if len(sys.argv) == 6 else RESULTS
+        write_results(results, outpath)
+        for result in results:
+            print '{0:>16} {1:<16} {2:10.4f}s {3}'.format(
+                result['case'], result['stage'], result['best'],
+                '{0:,} B'.format(result['bytes']) if result['bytes'] else '')
+    elif len(sys.argv) in (4, 5):
+        results = run_benchmark(int(sys.argv[1]), int(sys.argv[2]),
+                                int(sys.argv[3]))
+        outpath = sys.argv[4] if len(sys.argv) == 5 else RESULTS
+        write_results(results, outpath)
+        for result in results:
+            print '{0:>16} {1:<12} {2}'.format(result['case'], result['stage'],
+                                               result['best'])
+    else:
+        sys.exit()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+'''
+Copyright 2016 John David Anderson
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Author: John D. Anderson
+Email: jander43@vols.utk.edu
+Description:
+    This module maps heatmap values to colours through precomputed lookup
+    tables (LUTs). A LUT of 256 or 1024 '#rrggbb' strings is built once per
+    colormap (the original pyvisualize palette or a matplotlib colormap), and
+    a ColourMap turns values into LUT indices with linear, log or quantile
+    normalization, so colouring is one vectorized index computation.
+'''
+
+# libraries
+import lazy_import
+
+# lazily loaded libraries (see lazy_import.py)
+np = lazy_import.LazyModule('numpy')
+mpl_cm = lazy_import.LazyModule('matplotlib.cm')
+
+# constants
+MISSING = '#808080'
+PALETTE = [(0, 0, 1), (0, 0.5, 0), (0, 1, 0), (1, 0.5, 0), (1, 0, 0)]
+COLORMAPS = ('pyvisualize', 'viridis', 'plasma', 'inferno', 'magma', 'jet',
+             'hot', 'coolwarm', 'gray')
+NORMS = ('linear', 'log', 'quantile')
+SIZES = (256, 1024)
+
+# globals
+LUTS = {}
+
+
+# functions
+def palette_rgb(palette, size):
+    '''
+    Function to interpolate a palette of RGB tuples (0 - 1) at the centre of
+    "size" equal steps, returning a [size x 3] array.
+    Adapted from: martineau, Wed Oct 05 2016, renegade, "Heat map from data
+                  points in python", Mar 25, 2015 at 22:11,
+                  http://stackoverflow.com/a/29269645/6926917
+    '''
+    colours = np.array(palette, dtype=np.float64)
+    fval = (np.arange(size) + 0.5) / size * (len(colours) - 1)
+    ival = fval.astype(np.int64)
+    diff = (fval - ival)[:, None]
+    upper = np.minimum(ival + 1, len(colours) - 1)
+    return colours[ival] + diff * (colours[upper] - colours[ival])
+
+
+def lut(name='pyvisualize', size=SIZES[0]):
+    '''
+    Function to return the LUT of a colormap (a list of "size" colour
+    strings, lowest first), building it on first use.
+    '''
+    key = (name, size)
+    if key not in LUTS:
+        if name == 'pyvisualize':
+            rgb = palette_rgb(PALETTE, size)
+        elif name in COLORMAPS:
+            rgb = mpl_cm.get_cmap(name)((np.arange(size) + 0.5) / size)[:, :3]
+        else:
+            raise ValueError('unknown colormap: {0}'.format(name))
+        LUTS[key] = ['#%02x%02x%02x' % tuple(c) for c in
+                     (rgb * 255).astype(np.int64).tolist()]
+    return LUTS[key]
+
+
+# class def
+class ColourMap(object):
+    '''
+    Class mapping values to colours of a LUT. The scale (and, for 'quantile',
+    the breakpoints) is fitted to "values"; NaN maps to the MISSING colour.
+    The 'log' normalization uses log(1 + value - minimum) so it also works for
+    zero or negative data.
+    '''
+    # constructor
+    def __init__(self, values, name='pyvisualize', norm='linear',
+                 size=SIZES[0]):
+        if norm not in NORMS:
+            raise ValueError('unknown normalization: {0}'.format(norm))
+        self.name, self.norm, self.size = name, norm, size
+        self.colours = lut(name, size) + [MISSING]
+
+        # scale
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            values = np.zeros(1)
+        self.vmin, self.vmax = float(values.min()), float(values.max())
+        self.span = (self.vmax - self.vmin) or 1.0
+        self.breaks = None
+        if norm == 'quantile':
+            self.breaks = np.percentile(values, np.linspace(0, 100, size + 1))
+
+    def index(self, values):
+        '''
+        Function to return the LUT index of every value (an int array of the
+        same shape, with "size" for NaN).
+        '''
+        values = np.asarray(values, dtype=np.float64)
+        missing = np.isnan(values)
+        with np.errstate(invalid='ignore'):
+            if self.norm == 'quantile':
+                codes = np.searchsorted(self.breaks[1:-1], values,
+                                        side='right')
+            else:
+                if self.norm == 'log':
+                    scaled = (np.log1p(np.maximum(values - self.vmin, 0)) /
+                              np.log1p(self.span))
+                else:
+                    scaled = (values - self.vmin) / self.span
+                codes = np.where(missing, 0, scaled * self.size)
+                codes = np.clip(codes, 0, self.size - 1).astype(np.int64)
+        return np.where(missing, self.size, codes)
+
+    def colour(self, value):
+        '''
+        Function to return the colour string of a single value.
+        '''
+        return self.colours[int(self.index(value))]
+
+    def value_at(self, fraction):
+        '''
+        Function to return the value at "fraction" (0 - 1) of the colour scale
+        (i.e. the inverse of the normalization, for colorbar labels).
+        '''
+        if self.norm == 'quantile':
+            return float(np.interp(fraction * self.size,
+                                   np.arange(self.size + 1), self.breaks))
+        if self.norm == 'log':
+            return self.vmin + float(np.expm1(fraction *
+                                              np.log1p(self.span)))
+        return self.vmin + fraction * self.span
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+'''
+Copyright 2016 John David Anderson
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Author: John D. Anderson
+Email: jander43@vols.utk.edu
+Usage: csv_parse.py 'file.csv' ['numpy' | 'csv']
+Description:
+    This program parses the body of a NetLogo BehaviorSpace "table" CSV in
+    blocks of lines. Each block becomes NumPy arrays of run numbers, steps and
+    metric values (converted in bulk), plus the parameter strings of the first
+    row of every run in the block.
+'''
+
+# libraries
+import sys
+import csv
+import time
+import warnings
+import lazy_import
+
+# lazily loaded libraries (see lazy_import.py)
+np = lazy_import.LazyModule('numpy')
+
+# constants
+HEADER_ROW = 6
+PARAM_COLUMNS = 17
+STEP_COLUMN = 17
+BLOCK_BYTES = 8 * 2**20
+BACKENDS = ('numpy', 'csv')
+
+
+# functions
+def read_header(csvfile):
+    '''
+    Function to skip the BehaviorSpace preamble and return the header row.
+    '''
+    for i in range(HEADER_ROW + 1):
+        line = csvfile.readline()
+        if i == HEADER_ROW:
+            return next(csv.reader([line]))
+    raise ValueError('no BehaviorSpace header found')
+
+
+def numpy_block(lines, ncols):
+    '''
+    Function to parse a block by cutting the parameter columns out of every
+    (fully quoted) line and converting all numeric fields with a single
+    np.fromstring() call. Returns None if the block does not parse cleanly.
+    '''
+    # run + step + metric columns
+    nnum = ncols - PARAM_COLUMNS + 1
+
+    # keep first and last (i.e. step onwards) pieces of each line
+    parts = [line.split('","', PARAM_COLUMNS) for line in lines]
+    text = ''.join([p[0] + '","' + p[-1] for p in parts])
+    text = text.replace('"', '').replace('\n', ',')
+
+    # bulk conversion (a short result means a non-numeric/quoted comma field)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        numbers = np.fromstring(text, sep=',')
+    if numbers.size != len(lines) * nnum:
+        return None
+    return numbers.reshape(len(lines), nnum)
+
+
+def csv_block(lines, ncols):
+    '''
+    Function to parse a block with the csv module, converting cell by cell
+    (i.e. the reference backend).
+    '''
+    rows = []
+    for line in csv.reader(lines):
+        if len(line) != ncols:
+            raise ValueError('bad row: {0}'.format(line))
+        rows.append([int(line[0])] + [float(x) for x in line[STEP_COLUMN:]])
+    return np.array(rows, dtype=np.float64)
+
+
+def parse_block(lines, ncols, backend='numpy'):
+    '''
+    Function to parse a block of body lines into (runs, steps, values,
+    params), where "params" maps each run to the parameter strings of its
+    first row in the block.
+    '''
+    # tokenize/convert
+    if backend not in BACKENDS:
+        raise ValueError('unknown backend: {0}'.format(backend))
+    numbers = None
+    if backend == 'numpy':
+        numbers = numpy_block(lines, ncols)
+    if numbers is None:
+        numbers = csv_block(lines, ncols)
+
+    # split numeric columns
+    runs = numbers[:, 0].astype(np.int64)
+    steps = numbers[:, 1].astype(np.int64)
+    values = numbers[:, 2:]
+
+    # quoted strings only for first row of each run
+    __, first = np.unique(runs, return_index=True)
+    params = {}
+    for row in first:
+        fields = next(csv.reader([lines[row]]))
+        params[int(runs[row])] = fields[:PARAM_COLUMNS]
+
+    # return
+    return runs, steps, values, params
+
+
+def gen_blocks(csvfile, ncols, backend='numpy',
+               block_bytes=BLOCK_BYTES):
+    '''
+    Generator to yield (last line number, runs, steps, values, params) for
+    every ~"block_bytes" block of body lines (the file must be positioned
+    after the header).
+    '''
+    last = HEADER_ROW
+    while True:
+        lines = csvfile.readlines(block_bytes)
+        if not lines:
+            return
+        last += len(lines)
+
+        # drop blank lines (e.g. at end of file)
+        if lines.count('\n'):
+            lines = [line for line in lines if line != '\n']
+            if not lines:
+                continue
+        yield (last,) + parse_block(lines, ncols, backend)
+
+
+def group_runs(runs):
+    '''
+    Generator to yield (run, row indices) for every run in a block, keeping
+    the original (i.e. step) order of the rows of each run.
+    '''
+    order = np.argsort(runs, kind='mergesort')
+    sorted_runs = runs[order]
+    bounds = np.flatnonzero(np.diff(sorted_runs)) + 1
+    for rows in np.split(order, bounds):
+        yield int(runs[rows[0]]), rows
+
+
+# executable
+if __name__ == '__main__':
+
+    if len(sys.argv) not in (2, 3):
+        sys.exit()
+    else:
+        backend = sys.argv[2] if len(sys.argv) == 3 else 'numpy'
+        start = time.time()
+        with open(sys.argv[1], 'rU') as f:
+            header = read_header(f)
+            nrows = 0
+            for block in gen_blocks(f, len(header), backend):
+                nrows += len(block[1])
+        print '{0} rows in {1:.3f}s ({2})'.format(nrows, time.time() - start,
+                                                  backend)
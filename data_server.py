@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+'''
+Copyright 2016 John David Anderson
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Author: John D. Anderson
+Email: jander43@vols.utk.edu
+Usage: data_server.py 'file.hdf5' ['port'] ['host']
+Description:
+    This program serves one HDF5 file read-only over HTTP, so several people
+    or scripts can query it without each reading it again. Every client
+    thread shares the heatmap slice cache of pyvisualize (and a cache of
+    loaded runs). The server listens on 127.0.0.1 unless another host is
+    given. Endpoints (add "format=npy" for NumPy .npy responses):
+
+        /datasets
+        /heatmap?dataset=D&tick=T[&stop=S&reduction=R&replicates=A&fill=F]
+        /run/N[?dataset=D&points=P]
+        /top?dataset=D[&stat=S&n=N&order=largest|smallest]
+        /timings
+'''
+
+# libraries
+import sys
+import json
+import logging
+import threading
+import collections
+import urlparse
+import StringIO
+import BaseHTTPServer
+import SocketServer
+import lazy_import
+
+# lazily loaded libraries (see lazy_import.py)
+np = lazy_import.LazyModule('numpy')
+
+# custom libraries (local directory)
+import pyvisualize
+import flat_store
+import run_summary
+import perf_trace
+
+# constants
+HOST = '127.0.0.1'
+PORT = 8008
+RUNCACHE_SIZE = 64
+
+
+# functions
+def nan_to_none(values):
+    '''
+    Function to convert floats to a JSON-safe list (NaN becomes null).
+    '''
+    return [None if value != value else value for value in values]
+
+
+# class def
+class DataHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''
+    Class handling the (GET only) requests of one client connection.
+    '''
+    server_version = 'PyVisualize'
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        query = dict(urlparse.parse_qsl(url.query))
+        route = url.path.strip('/').split('/')
+        try:
+            with perf_trace.span('serve', endpoint=route[0]):
+                if route == ['datasets']:
+                    self.datasets()
+                elif route == ['heatmap']:
+                    self.heatmap(query)
+                elif route[0] == 'run' and len(route) == 2:
+                    self.run(int(route[1]), query)
+                elif route == ['top']:
+                    self.top(query)
+                elif route == ['timings']:
+                    self.send_json(perf_trace.summary())
+                else:
+                    self.send_error(404, 'unknown endpoint')
+        except (KeyError, ValueError) as err:
+            self.send_error(400, 'bad request: {0}'.format(err))
+
+    def datasets(self):
+        '''
+        Function to send the dataset names and length of the file.
+        '''
+        dnames, dlen = pyvisualize.hdf5_summary(self.server.hdfpath)
+        self.send_json({'datasets': dnames, 'ticks': dlen})
+
+    def heatmap(self, query):
+        '''
+        Function to send {run: value} of a heatmap slice (see
+        pyvisualize.read_hdf5) as sorted run/value lists.
+        '''
+        tick = int(query.get('tick', 0))
+        reduction = query.get('reduction', 'value')
+        stop = int(query['stop']) if 'stop' in query else None
+        data_dict = pyvisualize.cached_values(
+            self.server.hdfpath, '/' + query['dataset'].strip('/'),
+            reduction, tick, stop, query.get('replicates', 'none'),
+            query.get('fill', 'nan'))
+        runs = sorted(data_dict)
+        values = [data_dict[run] for run in runs]
+        if query.get('format') == 'npy':
+            self.send_npy(np.column_stack((runs, values)))
+        else:
+            self.send_json({'runs': runs, 'values': nan_to_none(values)})
+
+    def run(self, run, query):
+        '''
+        Function to send the attributes and (downsampled) datasets of a run
+        (see pyvisualize.find_group).
+        '''
+        attrs, data = self.server.load_run(run)
+        if query.get('format') == 'npy':
+            self.send_npy(data[query['dataset'].strip('/')])
+            return
+        self.send_json({'run': run, 'attributes': dict(attrs),
+                        'datasets': {name: array.tolist()
+                                     for name, array in data.iteritems()}})
+
+    def top(self, query):
+        '''
+        Function to send the top N runs by a summary statistic (see
+        run_summary.top_runs).
+        '''
+        top = run_summary.top_runs(self.server.hdfpath,
+                                   '/' + query['dataset'].strip('/'),
+                                   query.get('stat', 'peak'),
+                                   int(query.get('n', 10)),
+                                   query.get('order') != 'smallest')
+        if query.get('format') == 'npy':
+            self.send_npy(np.array(top).reshape(-1, 2))
+        else:
+            self.send_json({'runs': [run for run, __ in top],
+                            'values': nan_to_none([v for __, v in top])})
+
+    def send_json(self, obj):
+        '''
+        Function to send a JSON response.
+        '''
+        self.send_body(json.dumps(obj), 'application/json')
+
+    def send_npy(self, array):
+        '''
+        Function to send an array in NumPy .npy format.
+        '''
+        buf = StringIO.StringIO()
+        np.save(buf, np.asarray(array, dtype=np.float64))
+        self.send_body(buf.getvalue(), 'application/octet-stream')
+
+    def send_body(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        logging.info('{0} - {1}'.format(self.address_string(), fmt % args))
+
+
+class DataServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    '''
+    Class for a threaded HTTP server of one HDF5 file.
+    '''
+    daemon_threads = True
+
+    # constructor
+    def __init__(self, hdfpath, host=HOST, port=PORT):
+        BaseHTTPServer.HTTPServer.__init__(self, (host, port), DataHandler)
+        self.hdfpath = hdfpath
+        self.runs = collections.OrderedDict()
+        self.runs_lock = threading.Lock()
+
+    def load_run(self, run):
+        '''
+        Function to return (attributes, {dataset: array}) of a run, from the
+        cache of the RUNCACHE_SIZE most recently requested runs when possible.
+        '''
+        key = (run, tuple(flat_store.source_stamp(self.hdfpath)))
+        with self.runs_lock:
+            if key in self.runs:
+                self.runs[key] = self.runs.pop(key)
+                return self.runs[key]
+        attr_lists, data_dicts = pyvisualize.load_group(self.hdfpath, run,
+                                                        lambda: False)
+        attrs = [attr for attr_list in attr_lists for attr in attr_list]
+        data = {}
+        for data_dict in data_dicts:
+            data.update(data_dict)
+        with self.runs_lock:
+            self.runs[key] = (attrs, data)
+            if len(self.runs) > RUNCACHE_SIZE:
+                self.runs.popitem(last=False)
+        return attrs, data
+
+
+def serve(hdfpath, host=HOST, port=PORT):
+    '''
+    Function to serve an HDF5 file until interrupted.
+    '''
+    server = DataServer(hdfpath, host, port)
+    logging.info('Serving {0} on http://{1}:{2}/'.format(hdfpath, host,
+                                                         server.server_port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# executable
+if __name__ == '__main__':
+
+    if len(sys.argv) not in (2, 3, 4):
+        sys.exit()
+    else:
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else PORT
+        host = sys.argv[3] if len(sys.argv) > 3 else HOST
+        serve(sys.argv[1], host, port)
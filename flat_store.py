@@ -0,0 +1,412 @@
+#!/usr/bin/env python
+'''
+Copyright 2016 John David Anderson
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Author: John D. Anderson
+Email: jander43@vols.utk.edu
+Usage:
+    flat_store.py 'file.hdf5'
+    flat_store.py 'file.csv'
+Description:
+    This program exports an HDF5 file written by pyvisualize to a flat,
+    contiguous "file.flat/" sidecar directory of uncompressed .npy arrays
+    (runs x ticks), which can be memory mapped and sliced without walking the
+    HDF5 group hierarchy. A CSV file is instead converted straight to a
+    standalone "file.npydir/" store of the same layout (no HDF5 file), the
+    columnar storage backend of storage.py.
+'''
+
+# libraries
+import sys
+import os
+import json
+import bisect
+import lazy_import
+
+# lazily loaded libraries (see lazy_import.py)
+np = lazy_import.LazyModule('numpy')
+
+# custom libraries (local directory)
+import stream_reader
+import param_table
+import csv_parse
+import live_convert
+
+# constants
+SUFFIX = '.flat'
+STORE_SUFFIX = '.npydir'
+INDEX = 'index.json'
+PARAMS = 'params.json'
+STEPS = 'steps.npy'
+LENGTHS = 'lengths.npy'
+STEP_INDEX = 'step_index.npz'
+
+
+# functions
+def flat_path(hdfpath):
+    '''
+    Function to generate the path of the sidecar directory for an HDF5 file.
+    '''
+    return hdfpath.rsplit('.', 1)[0] + SUFFIX
+
+
+def source_stamp(hdfpath):
+    '''
+    Function to return (mtime, size) of a file, used to detect stale exports
+    (for a store directory, of its index, which is written last).
+    '''
+    if os.path.isdir(hdfpath):
+        hdfpath = os.path.join(hdfpath, INDEX)
+    stat = os.stat(hdfpath)
+    return [stat.st_mtime, stat.st_size]
+
+
+def export_flat(hdfpath, memory_limit=stream_reader.MEMORY_LIMIT):
+    '''
+    Function to write the flat sidecar for an HDF5 file, streaming each dataset
+    so memory use stays below "memory_limit".
+    '''
+    # sidecar directory
+    outdir = flat_path(hdfpath)
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    if os.path.isfile(os.path.join(outdir, STEP_INDEX)):
+        os.remove(os.path.join(outdir, STEP_INDEX))
+
+    with stream_reader.open_hdf5(hdfpath) as hdf5file:
+
+        # runs, dataset names and run lengths
+        runs = stream_reader.list_runs(hdf5file)
+        dnames = list(hdf5file['/' + str(runs[0])])
+        lengths = np.array([hdf5file['/{0}/{1}'.format(run, dnames[0])].len()
+                            for run in runs])
+        ticks = int(lengths.max())
+        np.save(os.path.join(outdir, LENGTHS), lengths)
+
+        # parameters of every run (see param_table.py)
+        table = param_table.read_table(hdf5file)
+        params = {str(run): dict(param_table.run_params(hdf5file, run, table))
+                  for run in runs}
+        with open(os.path.join(outdir, PARAMS), 'w') as f:
+            json.dump(params, f)
+
+        # one contiguous [runs x ticks] array per dataset (steps stored once)
+        files = {}
+        for d_index, dset in enumerate(dnames):
+            files[dset] = 'values_{0}.npy'.format(d_index)
+            values = np.lib.format.open_memmap(
+                os.path.join(outdir, files[dset]), mode='w+',
+                dtype=np.float64, shape=(len(runs), ticks))
+            steps = None
+            if d_index == 0:
+                steps = np.lib.format.open_memmap(
+                    os.path.join(outdir, STEPS), mode='w+',
+                    dtype=np.float64, shape=(len(runs), ticks))
+            for block_runs, t0, bsteps, bvalues in stream_reader.gen_blocks(
+                    hdf5file, dset, 0, ticks - 1, runs, memory_limit):
+                r0 = bisect.bisect_left(runs, block_runs[0])
+                r1, t1 = r0 + len(block_runs), t0 + bvalues.shape[1]
+                values[r0:r1, t0:t1] = bvalues
+                if steps is not None:
+                    steps[r0:r1, t0:t1] = bsteps
+            del values, steps
+
+    # index written last, so a partial export is never picked up
+    index = {
+             'source': source_stamp(hdfpath),
+             'runs': runs,
+             'datasets': dnames,
+             'ticks': ticks,
+             'files': files
+    }
+    with open(os.path.join(outdir, INDEX), 'w') as f:
+        json.dump(index, f)
+
+    # return
+    return outdir
+
+
+def convert_csv(csvpath, outdir=None, Q=None, backend='numpy'):
+    '''
+    Function to convert a BehaviorSpace "table" CSV straight to a standalone
+    store (one [runs x ticks] array per dataset, NaN past the end of shorter
+    runs), pushing line numbers to "Q" (if given) as blocks are written.
+    '''
+    # store directory (index removed first, so a partial store is never used)
+    outdir = outdir or csvpath.rsplit('.', 1)[0] + STORE_SUFFIX
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    for name in (INDEX, STEP_INDEX):
+        if os.path.isfile(os.path.join(outdir, name)):
+            os.remove(os.path.join(outdir, name))
+
+    with open(csvpath, 'rU') as csvfile:
+
+        # dataset names, then runs, their lengths and parameters
+        line = csv_parse.read_header(csvfile)
+        names = line[:csv_parse.PARAM_COLUMNS]
+        dnames = line[csv_parse.STEP_COLUMN + 1:]
+        counts, params = live_convert.prescan(csvfile)
+        runs = sorted(counts)
+        lengths = np.array([counts[run] for run in runs], dtype=np.int64)
+        ticks = int(lengths.max()) if runs else 0
+        np.save(os.path.join(outdir, LENGTHS), lengths)
+        with open(os.path.join(outdir, PARAMS), 'w') as f:
+            json.dump({str(run): dict(zip(names, params[run]))
+                       for run in runs}, f)
+
+        # arrays
+        files = {dset: 'values_{0}.npy'.format(i)
+                 for i, dset in enumerate(dnames)}
+        steps = np.lib.format.open_memmap(
+            os.path.join(outdir, STEPS), mode='w+', dtype=np.float64,
+            shape=(len(runs), ticks))
+        values = [np.lib.format.open_memmap(
+            os.path.join(outdir, files[dset]), mode='w+', dtype=np.float64,
+            shape=(len(runs), ticks)) for dset in dnames]
+        for array in [steps] + values:
+            array.fill(np.nan)
+
+        # fill rows of each run in CSV order
+        csvfile.seek(0)
+        csv_parse.read_header(csvfile)
+        run_index = np.array(runs, dtype=np.int64)
+        written = np.zeros(len(runs), dtype=np.int64)
+        for i, block_runs, bsteps, bvalues, __ in csv_parse.gen_blocks(
+                csvfile, len(line), backend):
+            for run, rows in csv_parse.group_runs(block_runs):
+                row = np.searchsorted(run_index, run)
+                t0, t1 = written[row], written[row] + len(rows)
+                steps[row, t0:t1] = bsteps[rows]
+                for column, array in enumerate(values):
+                    array[row, t0:t1] = bvalues[rows, column]
+                written[row] = t1
+            if Q is not None:
+                Q.put(i)
+        del steps, values
+
+    # index written last
+    index = {
+             'source': None,
+             'runs': runs,
+             'datasets': dnames,
+             'ticks': ticks,
+             'files': files
+    }
+    with open(os.path.join(outdir, INDEX), 'w') as f:
+        json.dump(index, f)
+
+    # return
+    return outdir
+
+
+def open_dir(path):
+    '''
+    Function to return the FlatFile of a sidecar or standalone store
+    directory, or None if it has no index (e.g. is still being written).
+    '''
+    index_path = os.path.join(path, INDEX)
+    if not os.path.isfile(index_path):
+        return None
+    with open(index_path, 'r') as f:
+        return FlatFile(path, json.load(f))
+
+
+def open_flat(hdfpath):
+    '''
+    Function to return a FlatFile for an HDF5 file if an up to date sidecar
+    exists, else None.
+    '''
+    flat = open_dir(flat_path(hdfpath))
+    if flat is None or flat.source != source_stamp(hdfpath):
+        return None
+    return flat
+
+
+# class def
+class FlatFile(object):
+    '''
+    Class for memory mapped access to a flat sidecar directory.
+    '''
+    # constructor
+    def __init__(self, path, index):
+        self.path = path
+        self.source = index['source']
+        self.runs = index['runs']
+        self.datasets = index['datasets']
+        self.ticks = index['ticks']
+        self.files = index['files']
+        self.run_index = np.array(self.runs)
+        self.lengths = np.load(os.path.join(path, LENGTHS))
+        self.steps = np.load(os.path.join(path, STEPS), mmap_mode='r')
+        self.values = {}
+        self.params = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        '''
+        Function to drop the memory maps (closed once no arrays use them).
+        '''
+        self.values = {}
+        self.steps = None
+
+    def dataset(self, datapath):
+        '''
+        Function to return the memory mapped [runs x ticks] array of a dataset.
+        '''
+        dset = datapath.strip('/')
+        if dset not in self.values:
+            self.values[dset] = np.load(os.path.join(self.path,
+                                                     self.files[dset]),
+                                        mmap_mode='r')
+        return self.values[dset]
+
+    def rows(self, runs):
+        '''
+        Function to convert run numbers to row numbers of the flat arrays.
+        '''
+        return np.searchsorted(self.run_index, runs)
+
+    def attrs(self, run):
+        '''
+        Function to return the parameters of a run as a dict.
+        '''
+        if self.params is None:
+            with open(os.path.join(self.path, PARAMS), 'r') as f:
+                self.params = json.load(f)
+        return self.params[str(run)]
+
+    def run_params(self, run):
+        '''
+        Function to return the [(name, value)] parameters of a run.
+        '''
+        return sorted(self.attrs(run).items())
+
+    def keys(self, runs, exclude=()):
+        '''
+        Function to return a hashable key per run built from its parameters,
+        skipping the parameters named in "exclude".
+        '''
+        return [tuple(sorted((k, v) for k, v in self.attrs(run).iteritems()
+                             if k not in exclude)) for run in runs]
+
+    def run_steps(self, run):
+        '''
+        Function to return the steps of every row of a run.
+        '''
+        row = self.rows([run])[0]
+        return np.array(self.steps[row, :self.lengths[row]])
+
+    def read_index(self):
+        '''
+        Function to return the saved (runs, first, stride, length) arrays of
+        the step index (see step_index.py), or None if none is saved.
+        '''
+        path = os.path.join(self.path, STEP_INDEX)
+        if not os.path.isfile(path):
+            return None
+        saved = np.load(path)
+        return tuple(saved[key] for key in ('runs', 'first', 'stride',
+                                            'length'))
+
+    def save_index(self, runs, first, stride, length):
+        '''
+        Function to save the arrays of the step index beside the store.
+        '''
+        with open(os.path.join(self.path, STEP_INDEX), 'wb') as f:
+            np.savez(f, runs=runs, first=first, stride=stride, length=length)
+
+    def gen_blocks(self, datapath, start=0, stop=None, runs=None,
+                   memory_limit=stream_reader.MEMORY_LIMIT):
+        '''
+        Generator with the same blocks as stream_reader.gen_blocks(), sliced
+        straight out of the memory mapped arrays.
+        '''
+        # select runs/dataset
+        if runs is None:
+            runs = self.runs
+        values = self.dataset(datapath)
+        rows = self.rows(runs)
+        last = self.ticks - 1 if stop is None else stop
+
+        # slice blocks (NaN past the stored width)
+        run_chunk, tick_chunk = stream_reader.chunk_shape(last - start + 1,
+                                                          memory_limit)
+        for r0 in xrange(0, len(runs), run_chunk):
+            block_runs = runs[r0:r0 + run_chunk]
+            block_rows = rows[r0:r0 + run_chunk]
+            contiguous = len(block_rows) and (
+                block_rows[-1] - block_rows[0] == len(block_rows) - 1)
+            for t0 in xrange(start, last + 1, tick_chunk):
+                t1 = min(t0 + tick_chunk, last + 1)
+                bsteps = np.empty((len(block_rows), t1 - t0))
+                bvalues = np.empty((len(block_rows), t1 - t0))
+                bsteps.fill(np.nan)
+                bvalues.fill(np.nan)
+                end = min(t1, self.ticks)
+                if end > t0:
+                    if contiguous:
+                        sel = slice(block_rows[0], block_rows[-1] + 1)
+                    else:
+                        sel = block_rows
+                    bsteps[:, :end - t0] = self.steps[sel, t0:end]
+                    bvalues[:, :end - t0] = values[sel, t0:end]
+                yield block_runs, t0, bsteps, bvalues
+
+    def read_rows(self, datapath, runs, rows):
+        '''
+        Function with the same output as stream_reader.read_rows() (for one
+        row per run, or a [runs x points] array of rows).
+        '''
+        rows = np.asarray(rows)
+        found = rows >= 0
+        index = self.rows(runs)
+        if rows.ndim == 2:
+            index = np.repeat(index[:, None], rows.shape[1], axis=1)
+        index = index[found]
+        steps, values = np.empty(rows.shape), np.empty(rows.shape)
+        steps.fill(np.nan)
+        values.fill(np.nan)
+        steps[found] = self.steps[index, rows[found]]
+        values[found] = self.dataset(datapath)[index, rows[found]]
+        return steps, values
+
+    def read_run(self, run, max_points=stream_reader.PORTFOLIO_POINTS):
+        '''
+        Generator with the same output as stream_reader.read_run().
+        '''
+        row = self.rows([run])[0]
+        length = self.lengths[row]
+        bucket = int(np.ceil(2 * length / float(max_points))) or 1
+        for dset in self.datasets:
+            rows = np.column_stack((self.steps[row, :length],
+                                    self.dataset(dset)[row, :length]))
+            yield dset, stream_reader.downsample(rows, bucket)
+
+
+# executable
+if __name__ == '__main__':
+
+    if len(sys.argv) != 2:
+        sys.exit()
+    elif sys.argv[1].lower().endswith('csv'):
+        print 'Converted: {0}'.format(convert_csv(sys.argv[1]))
+    else:
+        print 'Exported: {0}'.format(export_flat(sys.argv[1]))
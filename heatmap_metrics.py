@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+'''
+Copyright 2016 John David Anderson
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Author: John D. Anderson
+Email: jander43@vols.utk.edu
+Usage: heatmap_metrics.py 'file.hdf5' 'dataset' 'reduction' 'start' 'stop'
+Description:
+    This program reduces the [step, value] datasets of every simulation in an
+    HDF5 file (or any store, see storage.py) to a single heatmap value (e.g.
+    the mean over a range of steps, located in each run by step_index), and
+    optionally aggregates replicate runs that share the same parameters. Data
+    is streamed in bounded (runs x ticks) blocks by the store.
+'''
+
+# libraries
+import sys
+import lazy_import
+
+# lazily loaded libraries (see lazy_import.py)
+np = lazy_import.LazyModule('numpy')
+
+# custom libraries (local directory)
+import stream_reader
+import storage
+import step_index
+
+# constants
+RUN_ATTR = '[run number]'
+REDUCTIONS = ('value', 'mean', 'max', 'min', 'final', 'auc')
+REPLICATE_REDUCTIONS = ('none', 'mean', 'max', 'min')
+
+
+# functions
+def reduce_block(acc, steps, values):
+    '''
+    Function to fold one [runs x ticks] block into the per-run accumulators
+    "acc" (NaN ticks, i.e. past the end of a run, are ignored).
+    '''
+    valid = ~np.isnan(values)
+    acc['count'] += valid.sum(axis=1)
+    acc['total'] += np.where(valid, values, 0).sum(axis=1)
+    acc['peak'] = np.fmax(acc['peak'], np.where(valid, values, -np.inf)
+                          .max(axis=1))
+    acc['low'] = np.fmin(acc['low'], np.where(valid, values, np.inf)
+                         .min(axis=1))
+
+    # last valid value of each run
+    has = valid.any(axis=1)
+    last = values.shape[1] - 1 - valid[:, ::-1].argmax(axis=1)
+    final = values[np.arange(len(values)), last]
+    acc['final'] = np.where(has, final, acc['final'])
+
+    # trapezoids (joined to the last point of the previous block)
+    steps = np.hstack((acc['prev'][:, :1], steps))
+    values = np.hstack((acc['prev'][:, 1:], values))
+    pairs = (values[:, 1:] + values[:, :-1]) * np.diff(steps, axis=1) / 2
+    acc['area'] += np.where(np.isnan(pairs), 0, pairs).sum(axis=1)
+    acc['prev'] = np.where(has[:, None], np.column_stack(
+        (steps[np.arange(len(steps)), last + 1], final)), acc['prev'])
+
+
+def reduce_runs(source, datapath, reduction, start, stop, index, runs=None,
+                fill='nan', memory_limit=stream_reader.MEMORY_LIMIT):
+    '''
+    Generator to yield (runs, values) blocks, reducing steps "start" to "stop"
+    of every run (or only "runs") to a single value (NaN if a run has no steps
+    in the range). Steps are resolved to rows by "index" (a
+    step_index.StepIndex); 'value' reads the row of step "start", or of the
+    step chosen by "fill" if a run has no such step. The "source" is a store
+    (see storage.py).
+    '''
+    if runs is None:
+        runs = index.runs.tolist()
+
+    # one row per run
+    if reduction == 'value':
+        rows = index.rows(start, fill, runs)
+        __, values = source.read_rows(datapath, runs, rows)
+        yield runs, values
+        return
+
+    # rows holding the step range in any run
+    first, last = index.span(start, stop, runs)
+    found = last >= first
+    if not found.any():
+        values = np.empty(len(runs))
+        values.fill(np.nan)
+        yield runs, values
+        return
+    row0, row1 = int(first[found].min()), int(last[found].max())
+
+    # stream over run blocks
+    acc, current = None, None
+    for block_runs, __, steps, values in source.gen_blocks(
+            datapath, row0, row1, runs, memory_limit):
+
+        # new set of runs: flush previous accumulators
+        if block_runs is not current:
+            if acc is not None:
+                yield current, finish(acc, reduction)
+            current, nruns = block_runs, len(block_runs)
+            acc = {'count': np.zeros(nruns), 'total': np.zeros(nruns),
+                   'peak': np.empty(nruns), 'low': np.empty(nruns),
+                   'final': np.empty(nruns), 'area': np.zeros(nruns),
+                   'prev': np.empty((nruns, 2))}
+            for key in ('peak', 'low', 'final', 'prev'):
+                acc[key].fill(np.nan)
+
+        # fold block (rows of steps outside the range count as missing)
+        with np.errstate(invalid='ignore'):
+            outside = (steps < start) | (steps > stop)
+        values[outside] = np.nan
+        reduce_block(acc, steps, values)
+
+    # last set of runs
+    if acc is not None:
+        yield current, finish(acc, reduction)
+
+
+def finish(acc, reduction):
+    '''
+    Function to turn the accumulators of a run block into reduced values.
+    '''
+    empty = acc['count'] == 0
+    if reduction == 'mean':
+        return np.where(empty, np.nan, acc['total'] / np.maximum(
+            acc['count'], 1))
+    elif reduction == 'max':
+        return np.where(empty, np.nan, acc['peak'])
+    elif reduction == 'min':
+        return np.where(empty, np.nan, acc['low'])
+    elif reduction == 'final':
+        return acc['final']
+    elif reduction == 'auc':
+        return np.where(empty, np.nan, acc['area'])
+    raise ValueError('unknown reduction: {0}'.format(reduction))
+
+
+def gen_run_values(hdf5path, datapath, reduction, start, stop,
+                   replicates='none', runs=None, fill='nan'):
+    '''
+    Generator to yield (run, replicate key, reduced value) for every
+    simulation in a store (an HDF5 file or a flat store directory, see
+    storage.py), or only "runs" (the key is only read when aggregating).
+    '''
+    with storage.open_store(hdf5path) as store:
+
+        # steps of every run (see step_index.py)
+        index = step_index.store_index(store, runs)
+
+        # reduce (keys from the run parameters, ignoring the run number)
+        for block_runs, values in reduce_runs(store, datapath, reduction,
+                                              start, stop, index, runs, fill):
+            keys = [None] * len(block_runs)
+            if replicates != 'none':
+                keys = store.keys(block_runs, exclude=(RUN_ATTR,))
+            for run, key, value in zip(block_runs, keys, values):
+                yield run, key, float(value)
+
+
+def aggregate_replicates(run_values, how):
+    '''
+    Function to combine values of runs sharing a replicate key, returning a
+    dict of {lowest run number: aggregated value}. Missing (NaN) values are
+    skipped; a replicate is NaN only if all of its runs are.
+    '''
+    # no aggregation
+    if how == 'none':
+        return {run: value for run, __, value in run_values}
+
+    # streaming aggregation (i.e. one accumulator per parameter set, counting
+    # valid values)
+    groups = {}
+    for run, key, value in run_values:
+        valid = not np.isnan(value)
+        if key not in groups:
+            groups[key] = [run, value, int(valid)]
+            continue
+        acc = groups[key]
+        acc[0] = min(acc[0], run)
+        if how == 'mean':
+            if valid:
+                acc[1] = acc[1] + value if acc[2] else value
+                acc[2] += 1
+        elif how == 'max':
+            acc[1] = float(np.fmax(acc[1], value))
+        elif how == 'min':
+            acc[1] = float(np.fmin(acc[1], value))
+        else:
+            raise ValueError('unknown replicate reduction: {0}'.format(how))
+
+    # finalize
+    if how == 'mean':
+        return {rep: total / count if count else float('nan')
+                for rep, total, count in groups.values()}
+    return {rep: value for rep, value, __ in groups.values()}
+
+
+def heatmap_values(hdf5path, datapath, reduction='value', start=0, stop=None,
+                   replicates='none', fill='nan'):
+    '''
+    Function to return a dict of {run: value} for coloring the heatmap, from
+    the steps "start" to "stop" (see step_index.FILLS for "fill").
+    '''
+    if stop is None:
+        stop = start
+    run_values = gen_run_values(hdf5path, datapath, reduction, start, stop,
+                                replicates, fill=fill)
+    return aggregate_replicates(run_values, replicates)
+
+
+# executable
+if __name__ == '__main__':
+
+    if len(sys.argv) != 6:
+        sys.exit()
+    else:
+        values = heatmap_values(sys.argv[1], sys.argv[2], sys.argv[3],
+                                int(sys.argv[4]), int(sys.argv[5]))
+        for run in sorted(values):
+            print '{0}: {1}'.format(run, values[run])
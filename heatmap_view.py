@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+'''
+Copyright 2016 John David Anderson
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Author: John D. Anderson
+Email: jander43@vols.utk.edu
+Description:
+    This module draws heatmaps of any size on a fixed size canvas. Only the
+    tiles in view are drawn (as one image, one pixel per tile, zoomed by Tk),
+    and zooming out switches to a pyramid of pre-aggregated tiles (each level
+    averages 2 x 2 tiles of the level below), so the cost of scrolling and
+    zooming depends on the size of the window rather than the data.
+'''
+
+# libraries
+import Tkinter
+import ttk
+import lazy_import
+
+# lazily loaded libraries (see lazy_import.py)
+np = lazy_import.LazyModule('numpy')
+
+# custom libraries (local directory)
+import perf_trace
+
+# constants
+CDIM = 20
+MIN_CELL = 5
+MAX_CELL = 80
+VIEW_SIZE = 600
+SCROLL_UNITS = 3
+WHEEL_EVENTS = ('<MouseWheel>', '<Shift-MouseWheel>', '<Control-MouseWheel>')
+
+
+# functions
+def grid_arrays(heat_map, run_map):
+    '''
+    Function to convert (possibly ragged) 2D lists of values and run numbers
+    to NaN/-1 padded arrays.
+    '''
+    rows, cols = len(heat_map), max(len(row) for row in heat_map)
+    values = np.empty((rows, cols))
+    values.fill(np.nan)
+    runs = np.empty((rows, cols), dtype=np.int64)
+    runs.fill(-1)
+    for y, (vrow, rrow) in enumerate(zip(heat_map, run_map)):
+        values[y, :len(vrow)] = vrow
+        runs[y, :len(rrow)] = rrow
+    return values, runs
+
+
+def build_pyramid(values):
+    '''
+    Function to return [level 0, level 1, ...] where each level averages 2 x 2
+    tiles of the previous one (ignoring missing tiles), down to a single tile.
+    '''
+    levels = [values]
+    while max(levels[-1].shape) > 1:
+        last = levels[-1]
+        rows, cols = last.shape
+        padded = np.empty((rows + rows % 2, cols + cols % 2))
+        padded.fill(np.nan)
+        padded[:rows, :cols] = last
+        blocks = padded.reshape(padded.shape[0] // 2, 2,
+                                padded.shape[1] // 2, 2)
+        valid = ~np.isnan(blocks)
+        count = valid.sum(axis=(1, 3))
+        total = np.where(valid, blocks, 0).sum(axis=(1, 3))
+        levels.append(np.where(count > 0, total / np.maximum(count, 1),
+                               np.nan))
+    return levels
+
+
+# class def
+class HeatmapView(ttk.Frame):
+    '''
+    Class for a scrollable, zoomable heatmap that only draws visible tiles,
+    coloured by "cmap" (a colour_lut.ColourMap). "on_click(run)" is called
+    when a (full resolution) tile is clicked.
+    '''
+    # view the mouse wheel is bound to (see bind_wheel)
+    wheel_owner = None
+
+    # constructor
+    def __init__(self, parent, heat_map, run_map, cmap, on_click):
+        ttk.Frame.__init__(self, parent)
+
+        # data (values are kept as LUT indices, per pyramid level)
+        self.on_click = on_click
+        self.marked_runs = []
+        values = self.load(heat_map, run_map, cmap)
+
+        # view state (pixels per tile of the current level, scroll offset)
+        self.zoom = 0
+        self.level, self.cell = 0, CDIM
+        self.offset = [0, 0]
+        self.image = None
+        self.pending = False
+
+        # widgets
+        rows, cols = values.shape
+        width = min(cols * CDIM, VIEW_SIZE)
+        height = min(rows * CDIM, VIEW_SIZE)
+        self.yscrlbr = Tkinter.Scrollbar(self, orient='vertical',
+                                         command=self.yview)
+        self.xscrlbr = Tkinter.Scrollbar(self, orient='horizontal',
+                                         command=self.xview)
+        self.canvas = Tkinter.Canvas(self, bd=1, width=width, height=height,
+                                     highlightthickness=0)
+        zoom_frame = ttk.Frame(self)
+        ttk.Button(zoom_frame, text='+', width=2,
+                   command=lambda: self.set_zoom(self.zoom - 1)
+                   ).pack(side='left')
+        ttk.Button(zoom_frame, text='-', width=2,
+                   command=lambda: self.set_zoom(self.zoom + 1)
+                   ).pack(side='left')
+
+        # packing
+        zoom_frame.pack(side='top', anchor='w')
+        self.yscrlbr.pack(side='right', fill='y')
+        self.xscrlbr.pack(side='bottom', fill='x')
+        self.canvas.pack(side='left', fill='both', expand=True)
+
+        # bindings
+        self.canvas.bind('<Button-1>', self.click)
+        self.canvas.bind('<Configure>', lambda event: self.redraw())
+        self.canvas.bind('<Enter>', lambda event: self.bind_wheel())
+        self.canvas.bind('<Leave>', lambda event: self.unbind_wheel())
+        self.canvas.bind('<Destroy>', lambda event: self.unbind_wheel())
+
+        # first draw
+        self.redraw()
+
+    def bind_wheel(self):
+        '''
+        Function to send the mouse wheel to this view while the pointer is on
+        it (wheel events go to the focus widget, so they are bound app wide).
+        '''
+        self.canvas.bind_all('<MouseWheel>', lambda event: self.yview(
+            'scroll', -1 * event.delta, 'units'))
+        self.canvas.bind_all('<Shift-MouseWheel>', lambda event: self.xview(
+            'scroll', -1 * event.delta, 'units'))
+        self.canvas.bind_all('<Control-MouseWheel>', lambda event:
+                             self.set_zoom(self.zoom + 1 if event.delta < 0
+                                           else self.zoom - 1))
+        HeatmapView.wheel_owner = self
+
+    def unbind_wheel(self):
+        '''
+        Function to remove the mouse wheel bindings, if this view owns them.
+        '''
+        if HeatmapView.wheel_owner is not self:
+            return
+        for sequence in WHEEL_EVENTS:
+            self.canvas.unbind_all(sequence)
+        HeatmapView.wheel_owner = None
+
+    def load(self, heat_map, run_map, cmap):
+        '''
+        Function to set the tiles (LUT indices per pyramid level), runs and
+        outlined positions from a heatmap, returning its value grid.
+        '''
+        self.colours = np.array(cmap.colours, dtype=object)
+        values, self.runs = grid_arrays(heat_map, run_map)
+        self.levels = [cmap.index(level) for level in build_pyramid(values)]
+        self.marked = np.argwhere(np.in1d(self.runs, self.marked_runs).reshape(
+            self.runs.shape))
+        return values
+
+    def set_data(self, heat_map, run_map, cmap):
+        '''
+        Function to swap in a new heatmap (e.g. with more runs), keeping the
+        zoom, scroll position and highlighted runs.
+        '''
+        values = self.load(heat_map, run_map, cmap)
+
+        # grow the canvas up to VIEW_SIZE while the heatmap is small
+        rows, cols = values.shape
+        self.canvas.configure(width=max(int(self.canvas['width']),
+                                        min(cols * CDIM, VIEW_SIZE)),
+                              height=max(int(self.canvas['height']),
+                                         min(rows * CDIM, VIEW_SIZE)))
+
+        # same zoom (the pyramid may have gained or lost levels)
+        self.level, self.cell = self.zoom_level(self.zoom)
+        self.redraw()
+
+    def zoom_level(self, zoom):
+        '''
+        Function to return the (pyramid level, pixels per tile) of a zoom:
+        full resolution while tiles are large enough, else a coarser level.
+        '''
+        run_size = float(CDIM) / 2 ** zoom
+        level = 0
+        while run_size * 2 ** level < MIN_CELL:
+            level += 1
+        level = min(level, len(self.levels) - 1)
+        return level, int(round(run_size * 2 ** level))
+
+    def extent(self):
+        '''
+        Function to return the (width, height) in pixels of the whole heatmap
+        at the current zoom.
+        '''
+        rows, cols = self.levels[self.level].shape
+        return cols * self.cell, rows * self.cell
+
+    def view_size(self):
+        '''
+        Function to return the (width, height) of the visible canvas area.
+        '''
+        width = self.canvas.winfo_width()
+        height = self.canvas.winfo_height()
+        if width <= 1:
+            width = int(self.canvas['width'])
+            height = int(self.canvas['height'])
+        return width, height
+
+    def set_zoom(self, zoom):
+        '''
+        Function to change the zoom (0 = CDIM pixels per run, each step halves
+        or doubles the size), keeping the centre of the view in place.
+        '''
+        # tile size in pixels of one run at this zoom
+        run_size = float(CDIM) / 2 ** zoom
+        if run_size > MAX_CELL or (zoom > self.zoom and
+                                   self.level == len(self.levels) - 1):
+            return
+
+        # full resolution while tiles are large enough, else a coarser level
+        level, cell = self.zoom_level(zoom)
+
+        # keep centre
+        width, height = self.view_size()
+        old = float(self.cell) / 2 ** self.level
+        for axis, size in ((0, width), (1, height)):
+            centre = (self.offset[axis] + size / 2.0) / old
+            self.offset[axis] = int(centre * run_size - size / 2.0)
+        self.zoom, self.level, self.cell = zoom, level, cell
+        self.redraw()
+
+    def scroll(self, axis, args):
+        '''
+        Function implementing the xview/yview scrollbar protocol.
+        '''
+        size = self.view_size()[axis]
+        if args[0] == 'moveto':
+            self.offset[axis] = int(float(args[1]) * self.extent()[axis])
+        elif args[0] == 'scroll':
+            step = self.cell * SCROLL_UNITS if args[2] == 'units' else size
+            self.offset[axis] += int(args[1]) * step
+        self.redraw()
+
+    def xview(self, *args):
+        self.scroll(0, args)
+
+    def yview(self, *args):
+        self.scroll(1, args)
+
+    def redraw(self):
+        '''
+        Function to schedule a render (several events coalesce into one).
+        '''
+        if not self.pending:
+            self.pending = True
+            self.after_idle(self.render)
+
+    def render(self):
+        '''
+        Function to draw the visible tiles of the current level.
+        '''
+        self.pending = False
+        with perf_trace.span('render_view', level=self.level):
+            width, height = self.view_size()
+            total_w, total_h = self.extent()
+
+            # clamp scroll offset
+            for axis, size, total in ((0, width, total_w),
+                                      (1, height, total_h)):
+                self.offset[axis] = max(0, min(self.offset[axis],
+                                               total - size))
+            x0, y0 = self.offset
+
+            # visible tiles
+            codes = self.levels[self.level]
+            c0, r0 = x0 // self.cell, y0 // self.cell
+            c1 = min(codes.shape[1], (x0 + width) // self.cell + 1)
+            r1 = min(codes.shape[0], (y0 + height) // self.cell + 1)
+            tiles = self.colours[codes[r0:r1, c0:c1]]
+
+            # one pixel per tile, zoomed to the tile size
+            self.canvas.delete('all')
+            image = Tkinter.PhotoImage(width=c1 - c0, height=r1 - r0)
+            image.put(' '.join('{' + ' '.join(row) + '}'
+                               for row in tiles.tolist()))
+            if self.cell > 1:
+                image = image.zoom(self.cell)
+            self.image = image
+            self.canvas.create_image(c0 * self.cell - x0,
+                                     r0 * self.cell - y0, image=image,
+                                     anchor='nw')
+
+            # outlines of highlighted runs
+            scale = 2 ** self.level
+            for y, x in set(map(tuple, self.marked // scale)):
+                if r0 <= y < r1 and c0 <= x < c1:
+                    px, py = x * self.cell - x0, y * self.cell - y0
+                    self.canvas.create_rectangle(px, py, px + self.cell - 1,
+                                                 py + self.cell - 1,
+                                                 outline='black', width=2)
+
+            # scrollbars
+            self.xscrlbr.set(float(x0) / max(total_w, 1),
+                             float(x0 + width) / max(total_w, 1))
+            self.yscrlbr.set(float(y0) / max(total_h, 1),
+                             float(y0 + height) / max(total_h, 1))
+
+    def click(self, event):
+        '''
+        Function called when the heatmap is clicked. Full resolution tiles
+        open their run, aggregated tiles zoom in on the clicked point.
+        '''
+        x = (self.offset[0] + event.x) // self.cell
+        y = (self.offset[1] + event.y) // self.cell
+        if self.level > 0:
+            width, height = self.view_size()
+            self.offset = [self.offset[0] + event.x - width // 2,
+                           self.offset[1] + event.y - height // 2]
+            self.set_zoom(self.zoom - 1)
+            return
+        if 0 <= y < self.runs.shape[0] and 0 <= x < self.runs.shape[1] and \
+                self.runs[y, x] >= 0:
+            self.on_click(int(self.runs[y, x]))
+        else:
+            print 'IndexError: non-tile area of heatmap was clicked'
+
+    def highlight(self, runs):
+        '''
+        Function to outline the tiles of "runs" (replacing any previous
+        highlight).
+        '''
+        self.marked_runs = list(runs)
+        self.marked = np.argwhere(np.in1d(self.runs, self.marked_runs).reshape(
+            self.runs.shape))
+        self.redraw()
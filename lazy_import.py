@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+'''
+Copyright 2016 John David Anderson
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Author: John D. Anderson
+Email: jander43@vols.utk.edu
+Description:
+    This module defers importing heavy libraries (numpy, h5py, matplotlib,
+    primefac) until they are first used, so the GUI window can appear before
+    they are loaded. warm_up() loads them in a background thread instead.
+'''
+
+# libraries
+import logging
+import importlib
+import threading
+
+
+# class def
+class LazyModule(object):
+    '''
+    Class standing in for a module that is imported on first attribute access.
+    '''
+    # constructor
+    def __init__(self, name, setup=None, requires=()):
+        self.__dict__['_name'] = name
+        self.__dict__['_setup'] = setup
+        self.__dict__['_requires'] = requires
+        self.__dict__['_module'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    def lazy_load(self):
+        '''
+        Function to import the module (once) and return it.
+        '''
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    for required in self._requires:
+                        required.lazy_load()
+                    module = importlib.import_module(self._name)
+                    if self._setup is not None:
+                        self._setup(module)
+                    self.__dict__['_module'] = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self.lazy_load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self.lazy_load(), attr, value)
+
+
+# functions
+def warm_up(*modules):
+    '''
+    Function to load LazyModules in a background (daemon) thread.
+    '''
+    def load_all():
+        for module in modules:
+            try:
+                module.lazy_load()
+            except ImportError as err:
+                logging.info('Warm up: {0}'.format(err))
+
+    thread = threading.Thread(target=load_all)
+    thread.daemon = True
+    thread.start()
+    return thread
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+'''
+Copyright 2016 John David Anderson
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Author: John D. Anderson
+Email: jander43@vols.utk.edu
+Usage: live_convert.py 'file.hdf5'
+Description:
+    This module lets csv2hdf5 write an HDF5 file in single-writer/multiple-
+    reader (SWMR) mode, so the file can be viewed while it is converting. No
+    groups or datasets can be created once SWMR writing starts, so the CSV is
+    first scanned for its runs, their row counts and parameters, and every run
+    (and index) is created at its final size before the rows are filled in. A
+    "/_progress" group records how many rows of each run are written
+    (published at most every FLUSH_SECONDS) and whether conversion is done;
+    until then readers only see runs that are complete (see
+    stream_reader.list_runs).
+'''
+
+# libraries
+import sys
+import csv
+import time
+import lazy_import
+
+# lazily loaded libraries (see lazy_import.py)
+np = lazy_import.LazyModule('numpy')
+
+# custom libraries (local directory)
+import csv_parse
+import stream_reader
+
+# constants
+GROUP = stream_reader.PROGRESS_GROUP
+RUNS = 'runs'
+ROWS = 'rows'
+WRITTEN = 'written'
+DONE = 'done'
+FLUSH_SECONDS = 1.0
+
+
+# functions
+def prescan(csvfile, block_bytes=csv_parse.BLOCK_BYTES):
+    '''
+    Function to return ({run: row count}, {run: parameter strings}) of a CSV
+    body (the file must be positioned after the header), reading only the
+    run column of every row and the first row of each run.
+    '''
+    counts, params = {}, {}
+    while True:
+        lines = csvfile.readlines(block_bytes)
+        if not lines:
+            return counts, params
+
+        # drop blank lines (e.g. at end of file)
+        if lines.count('\n'):
+            lines = [line for line in lines if line != '\n']
+            if not lines:
+                continue
+
+        # rows per run in this block
+        runs = np.array([line.split(',', 1)[0].strip('"') for line in lines])
+        found, first, count = np.unique(runs.astype(np.int64),
+                                        return_index=True, return_counts=True)
+        for run, row, n in zip(found.tolist(), first, count.tolist()):
+            if run not in counts:
+                counts[run] = 0
+                fields = next(csv.reader([lines[row]]))
+                params[run] = fields[:csv_parse.PARAM_COLUMNS]
+            counts[run] += n
+
+
+def create_layout(hdf5file, datasets, counts):
+    '''
+    Function to create the "/_progress" datasets and then every run group and
+    dataset at its final length, before SWMR writing starts (progress comes
+    first, so a reader never mistakes a file being laid out for a finished
+    one).
+    '''
+    runs = sorted(counts)
+
+    # progress
+    progress = hdf5file.create_group(GROUP)
+    progress.create_dataset(DONE, data=np.int8(0))
+    progress.create_dataset(RUNS, data=np.array(runs, dtype=np.int64))
+    progress.create_dataset(ROWS, data=np.array([counts[run] for run in runs],
+                                                dtype=np.int64))
+    progress.create_dataset(WRITTEN, data=np.zeros(len(runs), dtype=np.int64))
+
+    # runs
+    for run in runs:
+        grp = hdf5file.create_group(str(run))
+        rows = counts[run]
+        chunk = (max(1, min(rows, stream_reader.TICK_CHUNK)), 2)
+        for dset_name in datasets:
+            grp.create_dataset(dset_name, (rows, 2), dtype=np.float64,
+                               maxshape=(None, 2), chunks=chunk)
+
+
+# class def
+class LiveWriter(object):
+    '''
+    Class filling the runs of a file created by create_layout(), switching it
+    to SWMR mode when the HDF5 library supports it.
+    '''
+    # constructor
+    def __init__(self, hdf5file, datasets):
+        self.hdf5file = hdf5file
+        self.datasets = datasets
+        self.runs = hdf5file[GROUP][RUNS][...]
+        self.written = np.zeros(len(self.runs), dtype=np.int64)
+        self.flushed = time.time()
+        if stream_reader.swmr_supported():
+            hdf5file.swmr_mode = True
+
+    def append(self, run, steps, values):
+        '''
+        Function to write the next rows of a run ("steps" and the matching
+        [rows x datasets] "values").
+        '''
+        index = np.searchsorted(self.runs, run)
+        start = self.written[index]
+        end = start + len(steps)
+        grp = self.hdf5file[str(run)]
+        for column, dset_name in enumerate(self.datasets):
+            grp[dset_name][start:end] = np.column_stack((steps,
+                                                         values[:, column]))
+        self.written[index] = end
+
+    def flush(self, force=False):
+        '''
+        Function to publish the rows written so far (at most every
+        FLUSH_SECONDS unless "force"). Data is flushed before the progress
+        that refers to it, so readers never see a run before its rows.
+        '''
+        if not force and time.time() - self.flushed < FLUSH_SECONDS:
+            return
+        self.hdf5file.flush()
+        self.hdf5file[GROUP][WRITTEN][:] = self.written
+        self.hdf5file.flush()
+        self.flushed = time.time()
+
+    def finish(self):
+        '''
+        Function to mark the conversion done, once every row (and any index
+        filled in afterwards) is written.
+        '''
+        self.hdf5file.flush()
+        self.hdf5file[GROUP][DONE][()] = 1
+        self.hdf5file.flush()
+
+
+# executable
+if __name__ == '__main__':
+
+    if len(sys.argv) != 2:
+        sys.exit()
+    else:
+        with stream_reader.open_hdf5(sys.argv[1]) as hdf5file:
+            state = 'converting' if stream_reader.is_live(hdf5file) else \
+                'complete'
+            print '{0}: {1} runs readable'.format(
+                state, len(stream_reader.list_runs(hdf5file)))
@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+'''
+Copyright 2016 John David Anderson
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Author: John D. Anderson
+Email: jander43@vols.utk.edu
+Usage:
+    mem_profile.py ['results.json']
+    mem_profile.py 'runs' 'ticks' 'metrics' ['results.json']
+Description:
+    This program profiles the memory of each stage of the pyvisualize load
+    and render path, headless, on synthetic BehaviorSpace data sets of
+    increasing size (see benchmark.py). Every stage runs in a fresh process
+    so its peak resident memory (RSS) above the state before the stage is
+    its own; when the tracemalloc module is available the peak of traced
+    allocations and the lines allocating most are reported too. Peaks are
+    divided into bytes per run and bytes per tick (i.e. per run x tick
+    touched). Run with the default CASES, the largest case is checked against
+    BUDGETS and the program exits with status 1 if any stage is over budget
+    (smaller data sets are dominated by fixed overheads, so are not checked).
+'''
+
+# libraries
+import sys
+import os
+import gc
+import json
+import shutil
+import tempfile
+import platform
+import subprocess
+import Queue
+import lazy_import
+
+# optional libraries (standard library from Python 3.4)
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# lazily loaded libraries (see lazy_import.py)
+mpl_figure = lazy_import.LazyModule('matplotlib.figure')
+backend_agg = lazy_import.LazyModule('matplotlib.backends.backend_agg')
+
+# custom libraries (local directory)
+import pyvisualize
+import heatmap_metrics
+import benchmark
+
+# constants
+CASES = ((100, 100, 4), (300, 200, 4), (1000, 300, 4))
+STAGES = ('csv2hdf5', 'find_group', 'read_hdf5', 'read_mean', 'square_list',
+          'simulation_data_portfolio')
+RUN = 1
+TOP = 5
+RESULTS = 'memory_results.json'
+HERE = os.path.abspath(__file__)
+
+# (bytes per run, bytes per tick) allowed for each stage in the largest case
+# (about twice what was measured when the profile was added)
+BUDGETS = {
+    'csv2hdf5': (192 * 2**10, 640),
+    'find_group': (4 * 2**20, 12 * 2**10),
+    'read_hdf5': (24 * 2**10, 24 * 2**10),
+    'read_mean': (128 * 2**10, 384),
+    'square_list': (2**10, 2**10),
+    'simulation_data_portfolio': (16 * 2**20, 64 * 2**10)
+}
+
+
+# functions
+def status_kb(field):
+    '''
+    Function to read a memory field (e.g. 'VmRSS') of this process from
+    /proc/self/status in bytes, or None where /proc is not available.
+    '''
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except IOError:
+        return None
+
+
+def reset_peak():
+    '''
+    Function to reset the peak RSS of this process (Linux only), returning
+    False if it cannot be reset.
+    '''
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except IOError:
+        return False
+
+
+def rss_peak():
+    '''
+    Function to return the peak RSS of this process in bytes.
+    '''
+    peak = status_kb('VmHWM')
+    if peak is None:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform != 'darwin':
+            peak *= 1024  # kilobytes on Linux
+    return peak
+
+
+def portfolio(data_dicts):
+    '''
+    Function to draw the plots of simulation_data_portfolio (same x/y lists
+    and figures) on Agg canvases, i.e. without a display.
+    '''
+    figures = []
+    for data_dict in data_dicts:
+        for dset_name, data_list in data_dict.items():
+            x_list, y_list = pyvisualize.gen_xy_list(data_list)
+            fig = mpl_figure.Figure(figsize=(2, 2), dpi=90)
+            backend_agg.FigureCanvasAgg(fig)
+            fig.add_subplot(111).plot(x_list, y_list)
+            fig.canvas.draw()
+            figures.append(fig)
+    return figures
+
+
+def setup(stage, path, ticks):
+    '''
+    Function to prepare the inputs of a stage, returning a callable running
+    only the stage itself ("path" is the CSV for 'csv2hdf5', else the HDF5
+    file).
+    '''
+    if stage == 'csv2hdf5':
+        return lambda: benchmark.convert(path)
+    elif stage == 'find_group':
+        return lambda: pyvisualize.find_group(path, RUN, Queue.Queue(),
+                                              Queue.Queue())
+    elif stage == 'read_hdf5':
+        return lambda: pyvisualize.read_hdf5(path, Queue.Queue(), '/metric_0',
+                                             ticks // 2)
+    elif stage == 'read_mean':
+        return lambda: pyvisualize.read_hdf5(path, Queue.Queue(), '/metric_0',
+                                             0, 'mean', ticks - 1)
+    elif stage == 'square_list':
+        values = heatmap_metrics.heatmap_values(path, '/metric_0', 'value',
+                                                ticks // 2)
+        return lambda: pyvisualize.layout_values(values)
+    elif stage == 'simulation_data_portfolio':
+        grpQ, attrQ = Queue.Queue(), Queue.Queue()
+        pyvisualize.find_group(path, RUN, grpQ, attrQ)
+        data_dicts = list(iter(grpQ.get, None))
+        return lambda: portfolio(data_dicts)
+    raise ValueError('unknown stage: {0}'.format(stage))
+
+
+def measure(stage, path, ticks):
+    '''
+    Function to run one stage in this process, returning a dict of its peak
+    RSS (and traced peak/top allocating lines) above the state before it.
+    '''
+    func = setup(stage, path, ticks)
+    lazy_import.warm_up(pyvisualize.np, pyvisualize.h5py, mpl_figure,
+                        backend_agg, pyvisualize.square_build.pf).join()
+    gc.collect()
+    exact = reset_peak()
+    base = status_kb('VmRSS') if exact else rss_peak()
+    if tracemalloc is not None:
+        tracemalloc.start()
+    func()
+    result = {'rss': max(0, rss_peak() - base), 'exact': exact}
+    if tracemalloc is not None:
+        result['traced'] = tracemalloc.get_traced_memory()[1]
+        stats = tracemalloc.take_snapshot().statistics('lineno')[:TOP]
+        result['top'] = [str(stat) for stat in stats]
+        tracemalloc.stop()
+    return result
+
+
+def touched(stage, runs, ticks):
+    '''
+    Function to return the (runs, ticks per run) a stage works on.
+    '''
+    if stage in ('find_group', 'simulation_data_portfolio'):
+        return 1, ticks
+    elif stage in ('read_hdf5', 'square_list'):
+        return runs, 1
+    return runs, ticks
+
+
+def profile_case(runs, ticks, metrics, workdir):
+    '''
+    Function to profile every stage on one synthetic data set, each in a
+    fresh process, returning a list of result dicts.
+    '''
+    case = '{0}x{1}x{2}'.format(runs, ticks, metrics)
+    csvpath = os.path.join(workdir, 'mem_{0}.csv'.format(case))
+    benchmark.gen_behaviorspace_csv(csvpath, runs, ticks, metrics)
+    hdfpath = csvpath.rsplit('.', 1)[0] + '.hdf5'
+
+    results = []
+    for stage in STAGES:
+        path = csvpath if stage == 'csv2hdf5' else hdfpath
+        out = subprocess.check_output([sys.executable, HERE, 'stage', stage,
+                                       path, str(ticks)],
+                                      cwd=os.path.dirname(HERE))
+        result = json.loads(out.splitlines()[-1])
+        nruns, nticks = touched(stage, runs, ticks)
+        peak = result.get('traced', result['rss'])
+        result.update({'case': case, 'stage': stage,
+                       'per_run': peak / float(nruns),
+                       'per_tick': peak / float(nruns * nticks)})
+        results.append(result)
+    return results
+
+
+def check_budgets(results):
+    '''
+    Function to return the results of the largest case over their BUDGETS.
+    '''
+    largest = results[-1]['case']
+    over = []
+    for result in results:
+        budget = BUDGETS.get(result['stage'])
+        if result['case'] == largest and budget is not None and \
+                (result['per_run'] > budget[0] or
+                 result['per_tick'] > budget[1]):
+            over.append(result)
+    return over
+
+
+def run_profile(cases=CASES, workdir=None):
+    '''
+    Function to profile every stage on data sets of increasing size,
+    returning a list of result dicts (smallest case first).
+    '''
+    cleanup = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='pyvisualize_mem_')
+    results = []
+    try:
+        for runs, ticks, metrics in cases:
+            results.extend(profile_case(runs, ticks, metrics, workdir))
+    finally:
+        if cleanup:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    # return
+    return results
+
+
+def write_results(results, outpath):
+    '''
+    Function to write profile results (plus machine details) as JSON.
+    '''
+    report = {
+              'meta': {
+                       'python': platform.python_version(),
+                       'platform': platform.platform(),
+                       'tracemalloc': tracemalloc is not None
+              },
+              'results': results
+    }
+    with open(outpath, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+# executable
+if __name__ == '__main__':
+
+    if len(sys.argv) == 5 and sys.argv[1] == 'stage':
+        print json.dumps(measure(sys.argv[2], sys.argv[3], int(sys.argv[4])))
+    elif len(sys.argv) in (1, 2, 4, 5):
+        cases = CASES
+        if len(sys.argv) >= 4:
+            cases = [tuple(int(arg) for arg in sys.argv[1:4])]
+        results = run_profile(cases)
+        write_results(results, sys.argv[-1] if len(sys.argv) in (2, 5)
+                      else RESULTS)
+        for result in results:
+            print '{0:>12} {1:<26} {2:>12,} B {3:>12,.0f} B/run ' \
+                  '{4:>10,.1f} B/tick'.format(result['case'], result['stage'],
+                                              result.get('traced',
+                                                         result['rss']),
+                                              result['per_run'],
+                                              result['per_tick'])
+        over = check_budgets(results) if cases == CASES else []
+        for result in over:
+            print 'OVER BUDGET: {0} ({1})'.format(result['stage'],
+                                                  result['case'])
+        sys.exit(1 if over else 0)
+    else:
+        sys.exit()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+'''
+Copyright 2016 John David Anderson
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Author: John D. Anderson
+Email: jander43@vols.utk.edu
+Usage: param_table.py 'file.hdf5' 'run'
+Description:
+    This program stores the parameters of every simulation once, as a typed
+    column table in the "/_parameters" group of the HDF5 file. Columns whose
+    values are all numbers are stored as int64/float64 arrays, and any other
+    column (e.g. "Batch") is dictionary-encoded as integer codes plus a list of
+    categories.
+'''
+
+# libraries
+import sys
+import array
+import lazy_import
+
+# lazily loaded libraries (see lazy_import.py)
+np = lazy_import.LazyModule('numpy')
+h5py = lazy_import.LazyModule('h5py')
+
+# constants
+GROUP = '_parameters'
+RUNS = 'runs'
+
+
+# functions
+def numeric(strings):
+    '''
+    Function to convert a list of strings to an int64/float64 array, or return
+    None if any of them is not a number (or is an integer too large for int64,
+    e.g. a random seed, which stays exact as a categorical value).
+    '''
+    try:
+        return np.array([int(s) for s in strings], dtype=np.int64)
+    except OverflowError:
+        return None
+    except ValueError:
+        pass
+    try:
+        return np.array([float(s) for s in strings], dtype=np.float64)
+    except (ValueError, OverflowError):
+        return None
+
+
+def read_table(hdf5file):
+    '''
+    Function to return the ParamTable of an open HDF5 file, or None if the file
+    predates parameter tables (i.e. parameters are group attributes).
+    '''
+    if GROUP not in hdf5file:
+        return None
+    return ParamTable(hdf5file[GROUP])
+
+
+def run_params(hdf5file, run, table=None):
+    '''
+    Function to return the [(name, value)] parameters of a run from the table
+    when the file has one, else from the run's group attributes.
+    '''
+    table = table or read_table(hdf5file)
+    if table is not None:
+        return table.row(run)
+    return list(hdf5file['/' + str(run)].attrs.iteritems())
+
+
+# class def
+class ParamEncoder(object):
+    '''
+    Class to collect the parameter strings of each run during conversion,
+    dictionary-encoding every column as it goes.
+    '''
+    # constructor
+    def __init__(self, names):
+        self.names = list(names)
+        self.runs = array.array('l')
+        self.lookup = [{} for __ in self.names]
+        self.codes = [array.array('l') for __ in self.names]
+
+    def add(self, run, strings):
+        '''
+        Function to record the parameter strings of a new run.
+        '''
+        self.runs.append(run)
+        for lookup, codes, string in zip(self.lookup, self.codes, strings):
+            codes.append(lookup.setdefault(string, len(lookup)))
+
+    def write(self, hdf5file):
+        '''
+        Function to write the table (rows sorted by run number) to an open
+        HDF5 file.
+        '''
+        grp = hdf5file.require_group(GROUP)
+        grp.attrs['names'] = np.array(self.names, dtype=object).astype('S')
+        order = np.argsort(np.array(self.runs, dtype=np.int64),
+                           kind='mergesort')
+        grp.create_dataset(RUNS, data=np.array(self.runs)[order])
+
+        # one dataset per column
+        for i, (lookup, codes) in enumerate(zip(self.lookup, self.codes)):
+            categories = sorted(lookup, key=lookup.get)
+            codes = np.array(codes, dtype=np.int32)[order]
+            values = numeric(categories)
+            if values is not None:
+                grp.create_dataset(str(i), data=values[codes])
+            else:
+                grp.create_dataset(str(i), data=codes)
+                grp.create_dataset('{0}_categories'.format(i),
+                                   data=np.array(categories, dtype='S'))
+
+
+class ParamTable(object):
+    '''
+    Class for reading the parameter table of an HDF5 file.
+    '''
+    # constructor
+    def __init__(self, grp):
+        self.names = [str(name) for name in grp.attrs['names']]
+        self.runs = grp[RUNS][...]
+        self.columns, self.categories = [], []
+        for i in range(len(self.names)):
+            self.columns.append(grp[str(i)][...])
+            cats = '{0}_categories'.format(i)
+            self.categories.append(grp[cats][...] if cats in grp else None)
+
+    def index(self, run):
+        '''
+        Function to return the row of a run (KeyError if missing).
+        '''
+        row = np.searchsorted(self.runs, run)
+        if row >= len(self.runs) or self.runs[row] != run:
+            raise KeyError(run)
+        return row
+
+    def row(self, run):
+        '''
+        Function to return the [(name, value string)] parameters of a run.
+        '''
+        row = self.index(run)
+        values = []
+        for name, column, cats in zip(self.names, self.columns,
+                                      self.categories):
+            value = column[row]
+            values.append((name, str(cats[value] if cats is not None
+                                     else value)))
+        return values
+
+    def keys(self, runs, exclude=()):
+        '''
+        Function to return a hashable key per run built from its (encoded)
+        parameters, skipping the columns named in "exclude".
+        '''
+        rows = np.searchsorted(self.runs, runs)
+        cols = [column[rows] for name, column in zip(self.names, self.columns)
+                if name not in exclude]
+        return zip(*[col.tolist() for col in cols])
+
+
+# executable
+if __name__ == '__main__':
+
+    if len(sys.argv) != 3:
+        sys.exit()
+    else:
+        with h5py.File(sys.argv[1], 'r') as hdf5file:
+            for name, value in run_params(hdf5file, int(sys.argv[2])):
+                print '{0}: {1}'.format(name, value)
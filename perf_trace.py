@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+'''
+Copyright 2016 John David Anderson
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Author: John D. Anderson
+Email: jander43@vols.utk.edu
+Description:
+    This module provides lightweight timing spans for the stages of the
+    pyvisualize pipeline. Every span updates a per-stage latency histogram,
+    and the most recent spans can be exported as JSON or in the Chrome trace
+    event format (chrome://tracing).
+'''
+
+# libraries
+import os
+import time
+import json
+import threading
+import collections
+import contextlib
+
+# constants
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float('inf'))
+MAX_EVENTS = 10000
+
+# globals
+ENABLED = True
+LOCK = threading.Lock()
+STATS = collections.OrderedDict()
+EVENTS = collections.deque(maxlen=MAX_EVENTS)
+EPOCH = time.time()
+
+
+# functions
+@contextlib.contextmanager
+def span(name, **args):
+    '''
+    Context manager timing the enclosed block as stage "name".
+    '''
+    if not ENABLED:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        record(name, start, time.time() - start, args)
+
+
+def timed(name):
+    '''
+    Decorator timing every call of a function as stage "name".
+    '''
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+    return decorator
+
+
+def record(name, start, seconds, args=None):
+    '''
+    Function to add one timing of stage "name" to the histograms/events.
+    '''
+    with LOCK:
+        stats = STATS.get(name)
+        if stats is None:
+            stats = STATS[name] = {'count': 0, 'total': 0.0, 'max': 0.0,
+                                   'last': 0.0, 'hist': [0] * len(BUCKETS)}
+        stats['count'] += 1
+        stats['total'] += seconds
+        stats['max'] = max(stats['max'], seconds)
+        stats['last'] = seconds
+        stats['hist'][next(i for i, b in enumerate(BUCKETS)
+                           if seconds <= b)] += 1
+        EVENTS.append((name, start, seconds, threading.current_thread().ident,
+                       args or {}))
+
+
+def percentile(stats, fraction):
+    '''
+    Function to estimate a percentile (upper bound of its histogram bucket).
+    '''
+    target = fraction * stats['count']
+    seen = 0
+    for bound, count in zip(BUCKETS, stats['hist']):
+        seen += count
+        if seen >= target:
+            return min(bound, stats['max'])
+    return stats['max']
+
+
+def summary():
+    '''
+    Function to return a dict of {stage: count/mean/p50/p95/max/last}.
+    '''
+    with LOCK:
+        return collections.OrderedDict(
+            (name, {'count': stats['count'],
+                    'mean': stats['total'] / stats['count'],
+                    'p50': percentile(stats, 0.5),
+                    'p95': percentile(stats, 0.95),
+                    'max': stats['max'],
+                    'last': stats['last'],
+                    'hist': dict(zip(map(str, BUCKETS), stats['hist']))})
+            for name, stats in STATS.items())
+
+
+def status_line():
+    '''
+    Function to format the last/mean latency of every stage in one line.
+    '''
+    parts = ['{0} {1:.0f}/{2:.0f}ms'.format(name, 1000 * stats['last'],
+                                            1000 * stats['mean'])
+             for name, stats in summary().items()]
+    return ' | '.join(parts) or 'no timings yet'
+
+
+def reset():
+    '''
+    Function to clear all histograms and events.
+    '''
+    with LOCK:
+        STATS.clear()
+        EVENTS.clear()
+
+
+def export_json(path):
+    '''
+    Function to write the per-stage summary as JSON.
+    '''
+    with open(path, 'w') as f:
+        json.dump(summary(), f, indent=2)
+
+
+def export_chrome_trace(path):
+    '''
+    Function to write the recorded spans in Chrome trace event format.
+    '''
+    with LOCK:
+        events = [{'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': tid,
+                   'ts': int((start - EPOCH) * 1e6),
+                   'dur': int(seconds * 1e6), 'args': args}
+                  for name, start, seconds, tid, args in EVENTS]
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
@@ -31,7 +31,8 @@ Usage:
 # libraries for GUI/Threads
 import logging
 import Tkinter
-from tkFileDialog import askopenfilename
+from tkFileDialog import askopenfilename, askopenfilenames
+from tkFileDialog import asksaveasfilename, askdirectory
 import ttk
 import sys
 import os
@@ -39,18 +40,40 @@ import time
 import threading
 import Queue
 import math
-import numpy as np
-import primefac as pf
-
-# libraries for data visualization
-import matplotlib
-matplotlib.use('TkAgg')
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
-import h5py
+import collections
+from multiprocessing.pool import ThreadPool
+
+# start of cold start measurement (see RootWindow.started)
+START = time.time()
+
+# libraries for data visualization (loaded lazily, see lazy_import.py)
+import lazy_import
+matplotlib = lazy_import.LazyModule('matplotlib',
+                                    setup=lambda mpl: mpl.use('TkAgg'))
+backend_tkagg = lazy_import.LazyModule('matplotlib.backends.backend_tkagg',
+                                       requires=(matplotlib,))
+mpl_figure = lazy_import.LazyModule('matplotlib.figure',
+                                    requires=(matplotlib,))
+h5py = lazy_import.LazyModule('h5py')
+np = lazy_import.LazyModule('numpy')
 
 # custom libraries (local directory)
 import square_build
+import heatmap_metrics
+import stream_reader
+import flat_store
+import storage
+import perf_trace
+import csv_parse
+import param_table
+import run_summary
+import tile_loader
+import heatmap_view
+import colour_lut
+import batch_export
+import live_convert
+import step_index
+import run_order
 
 # banner
 banner = '''
@@ -69,9 +92,11 @@ LG_FONT = ('Helvetica', 23)
 SM_FONT = ('Verdana', 16)
 EXEC = 'exec'
 COMPLR_T = '<string>'
+STARTUP_TARGET = 0.5
+POLL_MS = 50
+LIVE_MS = 2000
 FONTDICT = {
             'fontsize': 'small',
-            'fontweight': matplotlib.rcParams['axes.titleweight'],
             'verticalalignment': 'baseline',
             'horizontalalignment': 'center'
 }
@@ -79,6 +104,10 @@ FONTDICT = {
 # globals
 COLOBARDICT = {}
 WDIM = {}
+SLICECACHE = collections.OrderedDict()
+SLICECACHE_SIZE = 32
+SLICELOCK = threading.Lock()  # held for every SLICECACHE/SLICELOADING access
+SLICELOADING = {}
 SIMPORTDICT = {
                 'simdat': None,
                 'canvas': None,
@@ -96,9 +125,6 @@ else:
     # set debug to true
     logging.basicConfig(level=logging.DEBUG)
 
-    # self-explanatory
-    print banner
-
 
 # generators and functions
 def gen_list(ex_list):
@@ -120,82 +146,32 @@ def gen_xy_list(ex_list):
     return x_list, y_list
 
 
-def min_max(heatmap):
-    '''
-    Function to take a 2d list and return the minimum and maximum elements.
-    Adapted from: martineau, Wed Oct 05 2016, renegade, "Heat map from data
-                  points in python", Mar 25, 2015 at 22:11,
-                  http://stackoverflow.com/a/29269645/6926917
+@perf_trace.timed('find_group')
+def find_group(hdfpath, group_num, gQ, aQ, cancelled=None):
     '''
-    # searching for min and max elements
-    hmin = min(min(elem for elem in row) for row in heatmap)
-    hmax = max(max(elem for elem in row) for row in heatmap)
-
-    # returning
-    return hmin, hmax
-
-
-def crange(value, minval, maxval, palette):
+    Function to open HDF5 file (or any store, see storage.py) and return data
+    associated with "group_num". Datasets are streamed and downsampled (see
+    stream_reader.read_run) so very long runs never have to fit in memory.
+    Stops early (between datasets) once "cancelled()" returns True, returning
+    False if it did (else True).
     '''
-    Function to generate a specific color for an element in the heatmap.
-    Adapted from: martineau, Wed Oct 05 2016, renegade, "Heat map from data
-                  points in python", Mar 25, 2015 at 22:11,
-                  http://stackoverflow.com/a/29269645/6926917
-    '''
-    # get max index of palette
-    max_index = len(palette)-1
-
-    # convert elem in range minval - maxval to elem in range 0 to max_index
-    fval = (float(value-minval) / (maxval-minval)) * max_index
-
-    # truncate intermediate pallette value (fval) to an int
-    ival = int(fval)
-
-    # now caculate difference between the two
-    diff = fval - ival
-
-    # now select a color tuple from the palette
-    c0r, c0g, c0b = palette[ival]
-
-    # select color tuple that is +1 of previous but not greater than max_index
-    c1r, c1g, c1b = palette[min(ival+1, max_index)]
-
-    # now get difference of two color tuples
-    dr, dg, db = c1r-c0r, c1g-c0g, c1b-c0b
-
-    # now create color set based of diff and d* values
-    colorset = (c0r + diff * dr, c0g + diff * dg, c0b + diff * db)
+    finished = True
 
-    # convert to 0 - 255 range number sets
-    color = [int(c*255) for c in colorset]
+    # open store (flat sidecar when up to date, see flat_store.py)
+    with storage.open_store(hdfpath) as store:
 
-    # return color string in '#xxxxxx' format (e.g. #0000ff)
-    return '#' + '%02x' % color[0] + '%02x' % color[1] + '%02x' % color[2]
-
-
-def find_group(hdfpath, group_num, gQ, aQ):
-    '''
-    Function to open HDF5 file and return data associated with "group_num".
-    '''
-    # constants
-    HDFPATH = '/' + str(group_num)
-
-    # open hdf5 file
-    with h5py.File(hdfpath, 'r') as hdf5file:
-
-        # get attributes
-        attr_list = list(gen_list(hdf5file[HDFPATH].attrs.iteritems()))
+        # get attributes (i.e. one row of the parameter table)
+        attr_list = store.run_params(group_num)
 
         # update attributes
         aQ.put(attr_list)
         aQ.put(None)
 
         # iterate over data sets
-        for dset in hdf5file[HDFPATH]:
-
-            # generate list of data items
-            data_list = list(gen_list(hdf5file[HDFPATH + '/' + dset]))
-            # data_list = list(parse_list(data_list))
+        for dset, data_list in store.read_run(group_num):
+            if cancelled is not None and cancelled():
+                finished = False
+                break
 
             # create dict
             data_dict = {dset: data_list}
@@ -207,7 +183,36 @@ def find_group(hdfpath, group_num, gQ, aQ):
         gQ.put(None)
 
     # return
-    return
+    return finished
+
+
+def load_group(hdfpath, group_num, cancelled):
+    '''
+    Function run by the tile loader (see tile_loader.py) to read a simulation
+    into (attribute list, [{dset: data}]), or None if it was cancelled before
+    every dataset was read.
+    '''
+    grpQ, attrQ = Queue.Queue(), Queue.Queue()
+    if not find_group(hdfpath, group_num, grpQ, attrQ, cancelled):
+        return None
+    return list(iter(attrQ.get, None)), list(iter(grpQ.get, None))
+
+
+def show_group(controller, group_num, result):
+    '''
+    Function to show the data portfolio of a simulation loaded by the tile
+    loader.
+    '''
+    attr_lists, data_dicts = result
+    grpQ, attrQ = Queue.Queue(), Queue.Queue()
+    for attr_list in attr_lists:
+        attrQ.put(attr_list)
+    attrQ.put(None)
+    for data_dict in data_dicts:
+        grpQ.put(data_dict)
+    grpQ.put(None)
+    simulation_data_portfolio(group_num, grpQ, attrQ, controller)
+    logging.info('Showing: Data Portfolio for Group {0}'.format(group_num))
 
 
 def attribute_view(grp, attr_str):
@@ -234,6 +239,7 @@ def attribute_view(grp, attr_str):
 
 
 # NOTE: Needs to be refactored to a class
+@perf_trace.timed('portfolio')
 def simulation_data_portfolio(grp_name, grpQ, attrQ, controller):
     '''
     Function to generate x/y plots for all data sets for a given simulation.
@@ -305,11 +311,13 @@ def simulation_data_portfolio(grp_name, grpQ, attrQ, controller):
             ipady = xmax - 1
 
             # creat figure for canvas
-            fig = Figure(figsize=(2, 2), dpi=90)
+            fig = mpl_figure.Figure(figsize=(2, 2), dpi=90)
             a = fig.add_subplot(111)
-            a.set_title('Data: {0}'.format(dset_name), fontdict=FONTDICT)
+            fontdict = dict(FONTDICT, fontweight=matplotlib.rcParams[
+                'axes.titleweight'])
+            a.set_title('Data: {0}'.format(dset_name), fontdict=fontdict)
             a.plot(x_list, y_list)
-            fig_canvas = FigureCanvasTkAgg(fig, frame_innercan)
+            fig_canvas = backend_tkagg.FigureCanvasTkAgg(fig, frame_innercan)
             fig_canvas.get_tk_widget().grid(row=row, column=col,
                                             ipadx=ipadx,
                                             ipady=ipady, sticky='NSEW')
@@ -367,182 +375,227 @@ def simulation_data_portfolio(grp_name, grpQ, attrQ, controller):
     return
 
 
-def gen_heatmap(controller, data_queue, hdfpath):
+def draw_heatmap(controller, parent, heat_map, run_map, hdfpath, cmap):
     '''
+    Function to draw a scrollable, zoomable heatmap inside "parent", coloured
+    by "cmap" (a colour_lut.ColourMap), and return (view, tile width, height).
+    Only the tiles in view are drawn (see heatmap_view.py).
     Adapted from: martineau, Wed Oct 05 2016, renegade, "Heat map from data
                   points in python", Mar 25 2015 at 22:11,
                   http://stackoverflow.com/a/29269645/6926917
     '''
-    # constants
-    CDIM = 20
-
     # func def
-    def heatmap_callback(event):
+    def heatmap_callback(grp_num):
         '''
-        Function called when mouse event <CLICKED> is triggered on a heatmap
-        tile.
+        Function called when a heatmap tile is clicked.
         '''
-        # read mouse click event
-        canvas = event.widget
-        try:
-            rect = canvas.find_withtag('current')[0]
-        except IndexError:
-            print 'IndexError: non-tile area of heatmap was clicked'
-            return
-
-        # getting group number to access data for
-        grp_num = int(rect)
+        # load on worker threads (see RootWindow.load_tile)
+        controller.load_tile(hdfpath, grp_num)
 
-        # queue for thread
-        grpQ = Queue.Queue()
-        attrQ = Queue.Queue()
+    # virtualized heatmap
+    with perf_trace.span('heatmap_view'):
+        view = heatmap_view.HeatmapView(parent, heat_map, run_map, cmap,
+                                        heatmap_callback)
 
-        # purely a function implementation
-        find_group(hdfpath, grp_num, grpQ, attrQ)
+    # return
+    return view, heatmap_view.CDIM, heatmap_view.CDIM
 
-        # plot simulation data
-        simulation_data_portfolio(grp_num, grpQ, attrQ, controller)
 
-        # return
-        logging.info('Showing: Data Portfolio for Group {0}'.format(grp_num))
+def highlight_runs(view, runs):
+    '''
+    Function to outline the heatmap tiles of "runs" (clearing any previous
+    outlines) on a view returned by draw_heatmap().
+    '''
+    view.highlight(runs)
 
-    # 2d array from HDF5 file
-    heat_map = data_queue.get()
 
-    # calculating min/max values
-    # NOTE: adapted from martineau (see docstring at top of function)
-    heat_min, heat_max = min_max(heat_map)
+def gen_colorbar(cbardict):
+    '''
+    Function to create a colorbar to interpret meaning of heatmap colors.
+    Tiles are taken straight from the heatmap's colour LUT (see
+    colour_lut.py).
+    Adapted from: martineau, Wed Oct 05 2016, renegade, "Heat map from data
+                  points in python", Mar 25 2015 at 22:11,
+                  http://stackoverflow.com/a/29269645/6926917
+    '''
+    # get dict contents
+    cmap = cbardict['cmap']
+    rect_width = cbardict['rwidth']
+    rect_height = cbardict['rheight']
 
-    # collor palette for heatmap
-    # NOTE: adapted from martineau (see docstring at top of function)
-    palette = [(0, 0, 1), (0, 0.5, 0), (0, 1, 0), (1, 0.5, 0), (1, 0, 0)]
+    # create toplevel window
+    colorbar_view = Tkinter.Toplevel()
+    colorbar_view.title('{0} ({1})'.format(cmap.name, cmap.norm))
 
-    # rows/columns for heatmap
-    rows, cols = len(heat_map), len(heat_map[0])
-    cwidth, cheight = rows * CDIM, cols * CDIM
+    # create frame object
+    frm = ttk.Frame(colorbar_view)
+    frm.pack()
 
-    # get data view frame
-    dvf = controller.frames['DataView']
+    # create canvas object
+    cbarcan = Tkinter.Canvas(frm, width=rect_width, height=10*rect_height)
 
-    # canvas object for heatmap
-    can = Tkinter.Canvas(dvf)
+    # populate canvas with one tile per LUT entry (highest first)
+    # NOTE: adapted from martineau (see docstring at top of function)
+    step = 10.0 * rect_height / cmap.size
+    for i, color in enumerate(reversed(cmap.colours[:-1])):
+        cbarcan.create_rectangle(0, i * step, rect_width - 1,
+                                 (i + 1) * step, fill=color, width=0)
 
-    # update RootWindow's state with canvas object
-    controller.canvas['DataViewCanvas'] = can
+    # labels of the ends of the scale
+    cbar_values = 'Highest ({0:.4g})\n'.format(cmap.value_at(1))
+    cbar_values += '   |\n' * 10
+    cbar_values += 'Lowest ({0:.4g})'.format(cmap.value_at(0))
+    label = ttk.Label(frm, text=cbar_values, font={2}, anchor='center')
+    label.pack(expand=True, fill='both', side='left')
 
-    # create inner canvas for scrolling feature
-    yscrlbr = Tkinter.Scrollbar(can, orient='vertical')
-    xscrlbr = Tkinter.Scrollbar(can, orient='horizontal')
-    innercan = Tkinter.Canvas(can, bd=1, width=cwidth, height=cheight,
-                              yscrollcommand=yscrlbr.set,
-                              xscrollcommand=xscrlbr.set)
+    # final step
+    cbarcan.pack(side='left')
 
-    # functions for scrolling
-    def on_vertical(event):
-        innercan.yview_scroll(-1 * event.delta, 'units')
 
-    def on_horizontal(event):
-        innercan.xview_scroll(-1 * event.delta, 'units')
-
-    # populate canvas with tiles (i.e. rectangles)
-    # NOTE: adapted from martineau (see docstring at top of function)
-    rect_width, rect_height = cwidth // rows, cheight // cols
-    for y, row in enumerate(heat_map):
-        for x, temp in enumerate(row):
-            x0, y0 = x * rect_width, y * rect_height
-            x1, y1 = x0 + rect_width-1, y0 + rect_height-1
-            color = crange(temp, heat_min, heat_max, palette)
-            cr_val = (str(x), str(y))
-            rect = innercan.create_rectangle(x0, y0, x1, y1,
-                                             fill=color, width=0, tags=cr_val)
-
-    # gen colorbar list
-    interval = (heat_max - heat_min)/9
-    cbarlist = [heat_min + i*interval for i in range(9)]
-    cbarlist.append(heat_max)
-    cbarlist.reverse()
+def colorbar_button(controller, rect_width, rect_height, cmap):
+    '''
+    Function to add the "Colorbar" button for a heatmap to the DataView page.
+    '''
+    # get data view frame
+    dvf = controller.frames['DataView']
 
     # fill dict
     COLORBARDICT = {
-                    'colorbarlist': cbarlist,
+                    'cmap': cmap,
                     'rwidth': rect_width,
-                    'rheight': rect_height,
-                    'hmin': heat_min,
-                    'hmax': heat_max
+                    'rheight': rect_height
     }
 
-    # colorbar callback
-    def gen_colorbar(cbardict):
-        '''
-        Function to create a colorbar to interpret meaning of heatmap colors.
-        '''
-        # get dict contents
-        colorbarlist = cbardict['colorbarlist']
-        rect_width = cbardict['rwidth']
-        rect_height = cbardict['rheight']
-        heat_min = cbardict['hmin']
-        heat_max = cbardict['hmax']
-
-        # create toplevel window
-        colorbar_view = Tkinter.Toplevel()
-        colorbar_view.title('')
-
-        # create frame object
-        frm = ttk.Frame(colorbar_view)
-        frm.pack()
-
-        # create canvas object
-        cbarcan = Tkinter.Canvas(frm, width=rect_width, height=10*rect_height)
-
-        # color palette for heatmap
-        palette = [(0, 0, 1), (0, 0.5, 0), (0, 1, 0), (1, 0.5, 0), (1, 0, 0)]
-
-        # populate canvas with tiles
-        # NOTE: adapted from martineau (see docstring at top of function)
-        x = 0
-        cbar_values = 'Highest\n'
-        for y, cbar in enumerate(colorbarlist):
-            cbar_values += '   |\n'
-            x0, y0 = x * rect_width, y * rect_height
-            x1, y1 = x0 + rect_width-1, y0 + rect_height-1
-            color = crange(cbar, heat_min, heat_max, palette)
-            rect = cbarcan.create_rectangle(x0, y0, x1, y1, fill=color,
-                                            width=0)
-
-        cbar_values += 'Lowest'
-        label = ttk.Label(frm, text=cbar_values, font={2}, anchor='center')
-        label.pack(expand=True, fill='both', side='left')
-
-        # final step
-        cbarcan.pack(side='left')
-
     # configure colorbar button
     dvf.colorbar_button = ttk.Button(dvf.btn_frame, text='Colorbar',
                                      command=lambda: gen_colorbar(COLORBARDICT)
                                      )
     dvf.colorbar_button.pack(side='left')
+    dvf.colorbar = COLORBARDICT
+
+
+def gen_heatmap(controller, data_queue, hdfpath, datapath=None,
+                colormap='pyvisualize', norm='linear'):
+    '''
+    Function to generate the heatmap for one HDF5 file on the DataView page.
+    When "datapath" is given, a "Top N" button ranks its runs (see
+    run_summary.py).
+    '''
+    # 2d arrays of values/run numbers from HDF5 file
+    heat_map = data_queue.get()
+    run_map = data_queue.get()
+
+    # colour scale fitted to the values
+    with perf_trace.span('colour_lut'):
+        cmap = colour_lut.ColourMap([v for row in heat_map for v in row],
+                                    colormap, norm)
+
+    # get data view frame
+    dvf = controller.frames['DataView']
+
+    # draw heatmap and update RootWindow's state with canvas object
+    can, rect_width, rect_height = draw_heatmap(controller, dvf, heat_map,
+                                                run_map, hdfpath, cmap)
+    controller.canvas['DataViewCanvas'] = can
+
+    # configure colorbar button
+    colorbar_button(controller, rect_width, rect_height, cmap)
+
+    # configure top runs button
+    if datapath is not None:
+        dvf.top_button = ttk.Button(dvf.btn_frame, text='Top N',
+                                    command=lambda: TopRuns(controller, can,
+                                                            hdfpath, datapath))
+        dvf.top_button.pack(side='left')
 
-    # finish configurations/packing
-    yscrlbr.pack(side='right', fill='y')
-    xscrlbr.pack(side='bottom', fill='both')
-    innercan.pack(side='left', fill='both', expand=True)
-    innercan.config(scrollregion=innercan.bbox('all'))
-    # yscrlbr.config(command=innercan.yview)
-    # xscrlbr.config(command=innercan.xview)
-    innercan.bind('<Button-1>', heatmap_callback)
-    innercan.bind_all('<MouseWheel>', on_vertical)
-    innercan.bind_all('<Shift-MouseWheel>', on_horizontal)
+    # finish packing
     can.pack()  # NOTE: must call "pack()" or won't show
 
     # return
     return
 
 
+def gen_compare(controller, hdfpaths, value_dicts, mode,
+                colormap='pyvisualize', norm='linear', order=None,
+                layout='run'):
+    '''
+    Function to generate heatmaps for several HDF5 files on the DataView page,
+    either side by side or as differences from the first file, all sharing one
+    colour scale. Switching "mode" reuses "value_dicts" (i.e. no re-read).
+    Every panel uses the run "order" of the first file, so tiles line up.
+    '''
+    # panels to draw (i.e. [(label, hdfpath, {run: value})])
+    names = [get_filename(path) for path in hdfpaths]
+    if mode == 'difference':
+        base = value_dicts[0]
+        panels = [('{0} - {1}'.format(name, names[0]), path,
+                   {run: values[run] - base[run]
+                    for run in values if run in base})
+                  for name, path, values in zip(names[1:], hdfpaths[1:],
+                                                value_dicts[1:])]
+    else:
+        panels = zip(names, hdfpaths, value_dicts)
+
+    # heatmap layouts and shared scale
+    layouts = [layout_values(values, order, layout)
+               for __, __, values in panels]
+    with perf_trace.span('colour_lut'):
+        cmap = colour_lut.ColourMap([v for __, __, values in panels
+                                     for v in values.itervalues()],
+                                    colormap, norm)
+
+    # get data view frame
+    dvf = controller.frames['DataView']
+
+    # frame holding all heatmaps (destroyed by back_to_main)
+    frame = ttk.Frame(dvf)
+    controller.canvas['DataViewCanvas'] = frame
+
+    # draw each panel
+    for (label, path, __), (heat_map, run_map) in zip(panels, layouts):
+        panel = ttk.Frame(frame)
+        ttk.Label(panel, text=label, anchor='center').pack()
+        can, rect_width, rect_height = draw_heatmap(controller, panel,
+                                                    heat_map, run_map, path,
+                                                    cmap)
+        can.pack()
+        panel.pack(side='left')
+
+    # configure colorbar button
+    colorbar_button(controller, rect_width, rect_height, cmap)
+
+    # configure mode button
+    other = 'side by side' if mode == 'difference' else 'difference'
+
+    def switch_mode():
+        clear_dataview(controller)
+        gen_compare(controller, hdfpaths, value_dicts, other, colormap,
+                    norm, order, layout)
+
+    dvf.mode_button = ttk.Button(dvf.btn_frame, text=other.title(),
+                                 command=switch_mode)
+    dvf.mode_button.pack(side='left')
+
+    # finish packing
+    frame.pack()
+
+    # return
+    return
+
+
 def update_progbar(progress, Q, popup, controller):
     '''
-    Function to update the progressbar while CSV is converted to HDF5.
+    Function to update the progressbar while CSV is converted to HDF5 (never
+    waiting on the Q, so the GUI stays responsive between updates).
     '''
-    progress["value"] = Q.get()
+    latest = None
+    try:
+        while True:
+            latest = max(latest, Q.get_nowait())  # Q may be LIFO
+    except Queue.Empty:
+        pass
+    if latest is not None:
+        progress["value"] = latest
     if progress["maximum"] == progress["value"]:
         print "CONVERSION FINISHED!!!!"
         popup.destroy()
@@ -564,32 +617,18 @@ def hdf5_linesum(hdfpath):
     '''
     Function to count the number of lines in an HDF5 file.
     '''
-    with h5py.File(hdfpath, 'r') as hdf5file:
-        for count, __ in enumerate(hdf5file):
-            pass
-        return count+1
-
-
-def gen_hdf5_dnames(hdfpath):
-    '''
-    Generator to return list of data names from the HDF5 file.
-    '''
-    with h5py.File(hdfpath, 'r') as hdf5file:
-        for grp in hdf5file:
-            for dset in hdf5file['/' + grp]:
-                yield dset
-            return
+    with storage.open_store(hdfpath) as store:
+        return len(store.runs)
 
 
-def dataset_length(hdfpath):
+def step_range(hdfpath):
     '''
-    Function to return length of datasets
+    Function to return the (lowest, highest) step of any run of an HDF5 file
+    or store (see step_index.py).
     '''
-    with h5py.File(hdfpath, 'r') as hdf5file:
-        for grp in hdf5file:
-            for dset in hdf5file['/' + grp]:
-                return hdf5file['/' + grp + '/' + dset].len()
-        return 0
+    with storage.open_store(hdfpath) as store:
+        index = step_index.store_index(store)
+    return index.step_range()
 
 
 def get_filename(filepath):
@@ -602,13 +641,17 @@ def get_filename(filepath):
 
 
 # NOTE: Needs to be refactored for use in a subprocess
-def csv2hdf5(fpath, Q):
+@perf_trace.timed('csv2hdf5')
+def csv2hdf5(fpath, Q, backend='numpy', store='hdf5'):
     '''
-    Function to convert CSV data to HDF5.
+    Function to convert CSV data to HDF5, returning the path written. The
+    body of the CSV is parsed in blocks (see csv_parse.py) and each run's rows
+    in a block are written with one write per dataset. Parameters are stored
+    once per run in a typed table (see param_table.py) rather than as group
+    attributes. The file is written in SWMR mode so it can be viewed while
+    converting (see live_convert.py). With "store" 'npy' the CSV is converted
+    to a flat store directory instead (see storage.BACKENDS).
     '''
-    # limited scope libraries
-    import csv
-
     # functions
     def hdf5_path(argv):
         '''
@@ -627,81 +670,184 @@ def csv2hdf5(fpath, Q):
     if fpath == '':
         sys.exit()
 
-    # find line number
-    numline = csv_linesum(fpath)
-
-    # lists/dicts/containers for data
-    atlst = []
-    datasets = {}
+    # flat store directory (see flat_store.py)
+    if store == 'npy':
+        return flat_store.convert_csv(fpath, Q=Q, backend=backend)
 
     # getting path/name of hdf5 file
     h5name = hdf5_path(fpath)
 
-    # open "TABLE" csv file and copy to HDF5 file
-    with open(fpath, 'rU') as csvfile,  h5py.File(h5name, 'w') as hdf5:
+    # runs, their lengths and parameters (all created up front)
+    with open(fpath, 'rU') as csvfile, perf_trace.span('prescan'):
+        csv_parse.read_header(csvfile)
+        counts, params = live_convert.prescan(csvfile)
+    runs = sorted(counts)
 
-        # main loop
-        for i, line in enumerate(csv.reader(csvfile)):
+    # open "TABLE" csv file and copy to HDF5 file
+    with open(fpath, 'rU') as csvfile,  h5py.File(h5name, 'w',
+                                                 libver='latest') as hdf5:
+
+        # pulling dataset names and attributes
+        line = csv_parse.read_header(csvfile)
+        atlst = line[:csv_parse.PARAM_COLUMNS]
+        datasets = line[csv_parse.STEP_COLUMN + 1:]
+
+        # run datasets, parameters of all runs and (empty) indexes
+        live_convert.create_layout(hdf5, datasets, counts)
+        encoder = param_table.ParamEncoder(atlst)
+        for run in runs:
+            encoder.add(run, params[run])
+        encoder.write(hdf5)
+        if runs:
+            run_summary.create_index(hdf5, list(hdf5[str(runs[0])]), runs)
+            step_index.create_index(hdf5, runs)
+
+        # main loop (readable by other processes from here on)
+        writer = live_convert.LiveWriter(hdf5, datasets)
+        for i, block_runs, steps, values, __ in csv_parse.gen_blocks(
+                csvfile, len(line), backend):
+
+            for run, rows in csv_parse.group_runs(block_runs):
+                writer.append(run, steps[rows], values[rows])
+            writer.flush()
 
             # push increment to queue (NOTE: for progressbar)
             Q.put(i)
+        writer.flush(force=True)
+
+        # per-run summary and step indexes
+        if runs:
+            with perf_trace.span('run_summary'):
+                run_summary.write_summary(hdf5, create=False)
+            with perf_trace.span('step_index'):
+                step_index.write_index(hdf5, create=False)
+        writer.finish()
+
+    # return
+    return h5name
 
-            # pulling dataset names and attributes
-            if i == 6:
-                atlst = [row for j, row in enumerate(line) if j < 17]
-                datasets = {line[x]: x for x in range(18, len(list(line)))}
 
-            if i > 6:
-                if line[0] in hdf5:
-                    grp = hdf5[line[0]]
-                    for dset_name in grp:
-                        dset = grp[dset_name]
-                        newsize = dset.len()
-                        dset.resize((newsize+1, 2))
-                        dset[newsize, 0] = int(line[17])
-                        dset[newsize, 1] = float(line[datasets[dset_name]])
-                    continue
+def read_hdf5(hdf5path, Q, datapath, ticks, reduction='value', stop=None,
+              replicates='none', fill='nan', layout='run'):
+    '''
+    Function to read data from HDF5 file and pass to a Queue. The value of each
+    tile is either the raw value at step "ticks" (see step_index.FILLS for
+    runs without that step) or a reduction (see heatmap_metrics.REDUCTIONS)
+    over the steps "ticks" to "stop". Tiles are laid out by run_order.LAYOUTS.
+    '''
+    # dictionary for data (i.e. {run: value})
+    data_dict = cached_values(hdf5path, datapath, reduction, ticks, stop,
+                              replicates, fill)
 
-                # else create new group
-                grp = hdf5.create_group(line[0])
-                for attr, row in zip(atlst, line):
-                    grp.attrs[attr] = row
-                for name, index in datasets.iteritems():
-                    inlist = [int(line[17]), float(line[index])]
-                    grp.create_dataset(name, (1, 2), maxshape=(None, 2),
-                                       data=inlist)
+    # heatmap list and matching run numbers for each tile
+    data_array, run_array = layout_values(data_dict,
+                                          similarity(hdf5path, datapath,
+                                                     layout), layout)
+
+    # pass to Thread Queue
+    Q.put(data_array)
+    Q.put(run_array)
 
 
-def read_hdf5(hdf5path, Q, datapath, ticks):
+def similarity(hdf5path, datapath, layout):
     '''
-    Function to read data from HDF5 file and pass to a Queue.
+    Function to return the similarity order of the runs of a dataset (None
+    for the 'run' layout), built and stored in the file the first time.
     '''
-    # dictionary for data
-    data_dict = {}
+    if layout == 'run':
+        return None
+    with perf_trace.span('run_order', dataset=datapath):
+        return run_order.load_order(hdf5path, datapath)
 
-    # open hdf5 file
-    with h5py.File(hdf5path, 'r') as hdf5file:
-        for grp in hdf5file:
-            fullpath = '/' + grp + datapath
-            datapoint = hdf5file[fullpath][ticks]
-            data_dict[int(grp)] = datapoint[1]
 
-    # list for 2D array
-    ls_2d_array = list(gen_list(data_dict.values()))
+def cached_values(hdf5path, datapath, reduction='value', ticks=0, stop=None,
+                  replicates='none', fill='nan'):
+    '''
+    Function to return {run: value} for a heatmap, reading the file only the
+    first time a slice is requested (until the file changes or the slice is
+    evicted from the SLICECACHE_SIZE most recent slices). Safe to call from
+    several threads: concurrent requests for the same slice share one read.
+    '''
+    # key includes modification time/size of file
+    key = (hdf5path, tuple(flat_store.source_stamp(hdf5path)), datapath,
+           reduction, ticks, stop, replicates, fill)
+
+    # reuse, wait for a read in progress, or read
+    while True:
+        with SLICELOCK:
+            data_dict = SLICECACHE.pop(key, None)
+            if data_dict is not None:
+                SLICECACHE[key] = data_dict
+                return data_dict
+            loading = SLICELOADING.get(key)
+            if loading is None:
+                loading = SLICELOADING[key] = threading.Event()
+                break
+        loading.wait()
+
+    try:
+        with perf_trace.span('read_hdf5', reduction=reduction):
+            data_dict = heatmap_metrics.heatmap_values(hdf5path, datapath,
+                                                       reduction, ticks, stop,
+                                                       replicates, fill)
+        with SLICELOCK:
+            SLICECACHE[key] = data_dict
+            if len(SLICECACHE) > SLICECACHE_SIZE:
+                SLICECACHE.popitem(last=False)
+    finally:
+        with SLICELOCK:
+            del SLICELOADING[key]
+        loading.set()
 
-    # building heatmap
-    list_rows = square_build.square_builder(len(ls_2d_array))
+    # return
+    return data_dict
 
-    # heatmap list
-    data_array = square_build.square_list(list_rows, ls_2d_array)
 
-    # pass to Thread Queue
-    Q.put(data_array)
+def read_compare(hdf5paths, datapath, ticks, reduction='value', stop=None,
+                 replicates='none', fill='nan'):
+    '''
+    Function to read the same heatmap slice from several HDF5 files
+    concurrently, returning a list of {run: value} dicts.
+    '''
+    def read(hdf5path):
+        return cached_values(hdf5path, datapath, reduction, ticks, stop,
+                             replicates, fill)
 
+    pool = ThreadPool(len(hdf5paths))
+    try:
+        return pool.map(read, hdf5paths)
+    finally:
+        pool.close()
 
-def get_csv(controller):
+
+def layout_values(data_dict, order=None, layout='run'):
     '''
-    Function to grab path to CSV file, get number of lines, and start prog bar.
+    Function to arrange {run: value} into 2D lists of values and run numbers,
+    by run number or by a similarity "order" of the runs (see run_order.py).
+    '''
+    # list for 2D array (ordered by run number or similarity)
+    if order is None or layout == 'run':
+        runs = sorted(data_dict)
+    else:
+        runs = run_order.place(run_order.select(order, data_dict), layout)
+    ls_2d_array = [data_dict[run] for run in runs]
+
+    with perf_trace.span('square_build'):
+        # building heatmap
+        list_rows = square_build.square_builder(len(ls_2d_array))
+
+        # heatmap list and matching run numbers for each tile
+        data_array = square_build.square_list(list_rows, ls_2d_array)
+        run_array = square_build.square_list(list_rows, runs)
+
+    # return
+    return data_array, run_array
+
+
+def get_csv(controller, store='hdf5'):
+    '''
+    Function to grab path to CSV file, get number of lines, and start prog bar
+    (converting to a "store" of storage.BACKENDS).
     '''
     # choose csvfile
     csvpath = askopenfilename()
@@ -751,54 +897,163 @@ def get_csv(controller):
     Q = Queue.LifoQueue()
 
     # run conversion thread
-    my_thread = threading.Thread(target=csv2hdf5, args=(csvpath,  Q))
+    my_thread = threading.Thread(target=csv2hdf5,
+                                 args=(csvpath, Q, 'numpy', store))
     my_thread.start()
 
     # start controller.after cycle
     exec("update_progbar(progress, Q, %s, controller)" % var_name)
 
 
-def get_hdf5(controller):
+def get_hdf5(controller, store='hdf5'):
     '''
-    Function to allow selecting of HDF5 file, generating heatmap for file (by
+    Function to allow selecting of HDF5 file (or a flat store directory if
+    "store" is 'npy', see storage.py), generating heatmap for file (by
     calling gen_heatmap()), and navigating GUI page from the "MainView" page
     to the "DataView" page.
     '''
-    # choose HDF5 file
-    hdfpath = askopenfilename()
+    # choose HDF5 file/store directory
+    hdfpath = askdirectory() if store == 'npy' else askopenfilename()
 
     # error check
     if hdfpath == '':
         print 'No File Selected'
         return
 
-    # get file name
-    hdf_name = get_filename(hdfpath)
-
     # error check
-    if not hdf_name.lower().endswith(('hdf5', 'h5')):
+    if not storage.is_store(hdfpath):
         print 'Non-HDF File Selected'
         return
 
-    # get dataset names
-    dnames = [dset for dset in gen_hdf5_dnames(hdfpath)]
+    # get dataset names/length (locked until a conversion starts writing)
+    try:
+        dnames, dlen = hdf5_summary(hdfpath)
+    except IOError:
+        print 'File Not Readable Yet'
+        return
 
-    # get dataset length
-    dlen = dataset_length(hdfpath)
+    # file still being converted (see live_convert.py)
+    live = storage.is_live(hdfpath)
+    if live and not dnames:
+        print 'No Runs Converted Yet'
+        return
 
     # offer user choice of dataset for heatmap coloring
-    h = HeatmapDataSource(controller, dnames, hdfpath, dlen)
+    h = HeatmapDataSource(controller, dnames, hdfpath, step_range(hdfpath),
+                          live=live)
 
     # # count lines
     # maxprogress = hdf5_linesum(hdfpath)
 
 
+def hdf5_summary(hdfpath):
+    '''
+    Function to return (dataset names, dataset length) of an HDF5 file or
+    store (the flat sidecar when it is up to date, see storage.py).
+    '''
+    with storage.open_store(hdfpath) as store:
+        dnames = store.datasets
+        index = step_index.store_index(store)
+    return dnames, int(index.length.max()) if len(index.runs) else 0
+
+
+def get_hdf5_compare(controller):
+    '''
+    Function to allow selecting of several HDF5 files and comparing their
+    heatmaps (by calling gen_compare()) on the "DataView" page.
+    '''
+    # choose HDF5 files
+    hdfpaths = controller.tk.splitlist(askopenfilenames())
+
+    # error check
+    hdfpaths = [path for path in hdfpaths
+                if path.lower().endswith(('hdf5', 'h5'))]
+    if len(hdfpaths) < 2:
+        print 'Select At Least Two HDF Files'
+        return
+
+    # datasets common to all files (loaded concurrently)
+    pool = ThreadPool(len(hdfpaths))
+    try:
+        summaries = pool.map(hdf5_summary, hdfpaths)
+        ranges = pool.map(step_range, hdfpaths)
+    finally:
+        pool.close()
+    dnames = [dset for dset in summaries[0][0]
+              if all(dset in names for names, __ in summaries)]
+    steps = (max(first for first, __ in ranges),
+             min(last for __, last in ranges))
+
+    # offer user choice of dataset for heatmap coloring
+    h = HeatmapDataSource(controller, dnames, hdfpaths[0], steps,
+                          hdfpaths[1:])
+
+
+def get_flat(controller):
+    '''
+    Function to select an HDF5 file and export it to a flat, memory mapped
+    sidecar (see flat_store.py) in a background thread.
+    '''
+    # choose HDF5 file
+    hdfpath = askopenfilename()
+
+    # error check
+    if not hdfpath.lower().endswith(('hdf5', 'h5')):
+        print 'Non-HDF File Selected'
+        return
+
+    # run export thread
+    def export():
+        outdir = flat_store.export_flat(hdfpath)
+        logging.info('Exported: {0}'.format(outdir))
+
+    export_thread = threading.Thread(target=export)
+    export_thread.start()
+
+
+def get_batch(controller):
+    '''
+    Function to select an HDF5 file and open the batch export window (see
+    batch_export.py).
+    '''
+    # choose HDF5 file
+    hdfpath = askopenfilename()
+
+    # error check
+    if not hdfpath.lower().endswith(('hdf5', 'h5')):
+        print 'Non-HDF File Selected'
+        return
+
+    # datasets/steps of file
+    dnames = hdf5_summary(hdfpath)[0]
+    BatchExport(controller, dnames, hdfpath, step_range(hdfpath))
+
+
+def clear_dataview(controller):
+    '''
+    Function that removes the heatmap(s) and their buttons from the DataView
+    page.
+    '''
+    dvf = controller.frames['DataView']
+    controller.canvas['DataViewCanvas'].destroy()
+    dvf.colorbar_button.destroy()
+    if dvf.mode_button is not None:
+        dvf.mode_button.destroy()
+        dvf.mode_button = None
+    if dvf.top_button is not None:
+        dvf.top_button.destroy()
+        dvf.top_button = None
+
+
 def back_to_main(controller):
     '''
     Function that removes current GUI objects to navigate back to main page.
     '''
-    controller.canvas['DataViewCanvas'].destroy()
-    controller.frames['DataView'].colorbar_button.destroy()
+    dvf = controller.frames['DataView']
+    if dvf.live is not None:
+        dvf.live.stop()
+        dvf.live = None
+    clear_dataview(controller)
     controller.title('PyVisualize')
     controller.show_frame('MainView')
 
@@ -825,6 +1080,10 @@ class RootWindow(Tkinter.Tk):
         # NOTE: to be filled by gen_heatmap()
         self.canvas = {}
 
+        # loads data of clicked heatmap tiles (see tile_loader.py)
+        self.loader = tile_loader.TileLoader(load_group)
+        self.polling = False
+
         # populate frames dict
         frame_list = ('DataView', 'MainView')
         for frame in frame_list:
@@ -839,6 +1098,47 @@ class RootWindow(Tkinter.Tk):
         self.eval('tk::PlaceWindow %s center' %
                   self.winfo_pathname(self.winfo_id()))
 
+        # measure cold start once the window is drawn
+        self.after_idle(self.started)
+
+    def started(self):
+        '''
+        Function to log the cold start time and then load the heavy libraries
+        in the background (see lazy_import.py).
+        '''
+        startup = time.time() - START
+        logging.info('Startup: {0:.3f}s (target {1}s)'.format(startup,
+                                                              STARTUP_TARGET))
+        if startup > STARTUP_TARGET:
+            logging.warning('Startup slower than target')
+        lazy_import.warm_up(stream_reader.np, h5py, matplotlib, mpl_figure,
+                            backend_tkagg, square_build.pf)
+
+    def load_tile(self, hdfpath, group_num):
+        '''
+        Function to request the data of a clicked tile, showing it straight
+        away if cached, else once a worker has loaded it.
+        '''
+        result = self.loader.request(hdfpath, group_num)
+        if result is not None:
+            show_group(self, group_num, result)
+        elif not self.polling:
+            self.polling = True
+            self.after(POLL_MS, self.poll_tiles)
+
+    def poll_tiles(self):
+        '''
+        Function to check for loaded tiles while any loads are in flight.
+        '''
+        busy = self.loader.busy()
+        ready = self.loader.poll()
+        if ready is not None:
+            show_group(self, *ready)
+        if busy:
+            self.after(POLL_MS, self.poll_tiles)
+        else:
+            self.polling = False
+
     def show_frame(self, cont, msg=''):
         '''
         Function to move pages of the GUI.
@@ -872,11 +1172,45 @@ class MainView(ttk.Frame):
                                             command=lambda: get_csv(controller)
                                             ).pack(side='left', padx=5)
 
+        # convert file.csv to a file.npydir flat store (see storage.py)
+        self.csv_2_npy_button = ttk.Button(self.btn_frame,
+                                           text='Convert CSV -> NPY',
+                                           command=lambda: get_csv(controller,
+                                                                   'npy')
+                                           ).pack(side='left', padx=5)
+
         # open and view file.hdf5 contents
         self.view_hdf5_button = ttk.Button(self.btn_frame, text='Open HDF5',
                                            command=lambda: get_hdf5(controller)
                                            ).pack(side='left', padx=5)
 
+        # open and view a file.npydir flat store
+        self.view_npy_button = ttk.Button(self.btn_frame, text='Open NPY',
+                                          command=lambda: get_hdf5(controller,
+                                                                   'npy')
+                                          ).pack(side='left', padx=5)
+
+        # open and compare several file.hdf5 heatmaps
+        self.compare_hdf5_button = ttk.Button(self.btn_frame,
+                                              text='Compare HDF5',
+                                              command=lambda: get_hdf5_compare(
+                                                  controller)
+                                              ).pack(side='left', padx=5)
+
+        # export file.hdf5 to memory mapped sidecar
+        self.export_flat_button = ttk.Button(self.btn_frame,
+                                             text='Export Flat',
+                                             command=lambda: get_flat(
+                                                 controller)
+                                             ).pack(side='left', padx=5)
+
+        # export heatmap frames of many datasets/ticks
+        self.batch_export_button = ttk.Button(self.btn_frame,
+                                              text='Batch Export',
+                                              command=lambda: get_batch(
+                                                  controller)
+                                              ).pack(side='left', padx=5)
+
 
 class DataView(ttk.Frame):
     '''
@@ -899,8 +1233,190 @@ class DataView(ttk.Frame):
                                       command=lambda: back_to_main(controller))
         self.back_button.pack(side='left')
 
-        # colorbar for heatmap
+        # colorbar for heatmap (and its colour scale, see colorbar_button)
         self.colorbar_button = None
+        self.colorbar = None
+
+        # side by side/difference toggle for compared heatmaps
+        self.mode_button = None
+
+        # top N runs of a single heatmap
+        self.top_button = None
+
+        # refresh of a file still being converted (see LiveHeatmap)
+        self.live = None
+
+        # timing overlay (see perf_trace.py)
+        self.controller = controller
+        self.timings = Tkinter.StringVar()
+        self.timings_shown = False
+        self.timings_after = None
+        self.status_bar = ttk.Label(self, textvariable=self.timings,
+                                    anchor='w')
+        self.timings_button = ttk.Button(self.btn_frame, text='Timings',
+                                         command=self.toggle_timings)
+        self.timings_button.pack(side='right')
+        self.export_button = ttk.Button(self.btn_frame, text='Export Timings',
+                                        command=self.export_timings)
+        self.export_button.pack(side='right')
+
+    def toggle_timings(self):
+        '''
+        Function to show/hide the per-stage timing status bar.
+        '''
+        # (not mapped until the next idle pass, so tracked by a flag)
+        if self.timings_shown:
+            self.timings_shown = False
+            if self.timings_after is not None:
+                self.controller.after_cancel(self.timings_after)
+                self.timings_after = None
+            self.status_bar.pack_forget()
+            return
+        self.timings_shown = True
+        self.status_bar.pack(side='bottom', fill='x')
+        self.update_timings()
+
+    def update_timings(self):
+        '''
+        Function to refresh the timing status bar once a second while shown.
+        '''
+        self.timings_after = None
+        if not self.timings_shown:
+            return
+        self.timings.set(perf_trace.status_line())
+        self.timings_after = self.controller.after(1000, self.update_timings)
+
+    def export_timings(self):
+        '''
+        Function to save the timing histograms as JSON, plus a Chrome trace
+        ("file.trace.json") of the most recent spans.
+        '''
+        path = asksaveasfilename(defaultextension='.json')
+        if not path:
+            return
+        perf_trace.export_json(path)
+        perf_trace.export_chrome_trace(path.rsplit('.', 1)[0] + '.trace.json')
+        logging.info('Exported: timings to {0}'.format(path))
+
+
+class LiveHeatmap(object):
+    '''
+    Class for the heatmap of a file that is still being converted (see
+    live_convert.py). Every LIVE_MS it reads, in a background thread, only the
+    runs committed since the last refresh, and redraws when there are new
+    runs, until the conversion finishes.
+    '''
+    # constructor
+    def __init__(self, controller, hdfpath, datapath, ticks, reduction, stop,
+                 replicates, fill, colormap, norm):
+        self.controller = controller
+        self.hdfpath, self.datapath = hdfpath, datapath
+        self.ticks, self.reduction, self.stop = ticks, reduction, stop
+        self.replicates, self.fill = replicates, fill
+        self.colormap, self.norm = colormap, norm
+
+        # (run, replicate key, value) of every run read so far
+        self.run_values = []
+        self.seen = set()
+
+        # state of the background read
+        self.thread = None
+        self.new = []
+        self.live = True
+        self.stopped = False
+        self.drawn = False
+
+    def read(self):
+        '''
+        Function to read the values of runs committed since the last read.
+        '''
+        with stream_reader.open_hdf5(self.hdfpath) as hdf5file:
+            self.live = stream_reader.is_live(hdf5file)
+            runs = [run for run in stream_reader.list_runs(hdf5file)
+                    if run not in self.seen]
+        if runs:
+            with perf_trace.span('read_live', runs=len(runs)):
+                self.new = list(heatmap_metrics.gen_run_values(
+                    self.hdfpath, self.datapath, self.reduction, self.ticks,
+                    self.stop, self.replicates, runs, self.fill))
+
+    def merge(self):
+        '''
+        Function to add newly read runs, updating the heatmap in place (i.e.
+        keeping its zoom, scroll position, highlights and buttons) if there
+        are any.
+        '''
+        if not self.new:
+            return
+        self.run_values.extend(self.new)
+        self.seen.update(run for run, __, __ in self.new)
+        self.new = []
+
+        # all runs so far
+        data_dict = heatmap_metrics.aggregate_replicates(self.run_values,
+                                                         self.replicates)
+        heat_map, run_map = layout_values(data_dict)
+
+        # swap the new grid and colour scale into the drawn view
+        if self.drawn:
+            with perf_trace.span('colour_lut'):
+                cmap = colour_lut.ColourMap([v for row in heat_map
+                                             for v in row],
+                                            self.colormap, self.norm)
+            self.controller.canvas['DataViewCanvas'].set_data(heat_map,
+                                                              run_map, cmap)
+            self.controller.frames['DataView'].colorbar['cmap'] = cmap
+            return
+
+        # first draw
+        dataQ = Queue.Queue()
+        dataQ.put(heat_map)
+        dataQ.put(run_map)
+        gen_heatmap(self.controller, dataQ, self.hdfpath, self.datapath,
+                    self.colormap, self.norm)
+        self.drawn = True
+
+    def start(self):
+        '''
+        Function to draw the runs committed so far and start refreshing.
+        '''
+        self.read()
+        self.merge()
+        if self.live:
+            self.controller.after(LIVE_MS, self.refresh)
+
+    def refresh(self):
+        '''
+        Function to start a background read of newly committed runs.
+        '''
+        if self.stopped:
+            return
+        self.thread = threading.Thread(target=self.read)
+        self.thread.daemon = True
+        self.thread.start()
+        self.controller.after(POLL_MS, self.poll)
+
+    def poll(self):
+        '''
+        Function to wait for the background read, then merge its runs and
+        schedule the next refresh while the file is being converted.
+        '''
+        if self.stopped:
+            return
+        if self.thread.is_alive():
+            self.controller.after(POLL_MS, self.poll)
+            return
+        self.merge()
+        if self.live:
+            self.controller.after(LIVE_MS, self.refresh)
+        else:
+            logging.info('Conversion finished: {0}'.format(self.hdfpath))
+
+    def stop(self):
+        '''
+        Function to stop refreshing (e.g. when leaving the DataView page).
+        '''
+        self.stopped = True
 
 
 class HeatmapDataSource(Tkinter.Toplevel):
@@ -908,19 +1424,27 @@ class HeatmapDataSource(Tkinter.Toplevel):
     Class for generating data source choosing window for heatmap.
     '''
     # constructor
-    def __init__(self, root, dlist, fpath, dlen):
+    def __init__(self, root, dlist, fpath, steps, others=(), live=False):
         # create toplevel window
         Tkinter.Toplevel.__init__(self, root)
         self.title('Heatmap Data Source: {0}'.format(fpath.rsplit('/', 1)[1]))
 
+        # store other files to compare against (if any)
+        self.others = list(others)
+
+        # store whether file is still being converted
+        self.live = live
+        self.mode = Tkinter.StringVar()
+        self.mode.set('side by side')
+
         # create variable
         self.var = Tkinter.StringVar()
 
         # store hdfpath
         self.hdfpath = fpath
 
-        # store dset length
-        self.range = dlen - 1
+        # store lowest/highest step of any run
+        self.first, self.last = steps
 
         # store ticks value from entry
         self.timepoint = Tkinter.IntVar()
@@ -928,11 +1452,74 @@ class HeatmapDataSource(Tkinter.Toplevel):
         # store root window
         self.root = root
 
+        # store last tick of reduction range from entry
+        self.endpoint = Tkinter.IntVar()
+
+        # store reduction and replicate aggregation choices
+        self.reduction = Tkinter.StringVar()
+        self.reduction.set('value')
+        self.replicates = Tkinter.StringVar()
+        self.replicates.set('none')
+
+        # store fill for runs without the chosen step (see step_index.py)
+        self.fill = Tkinter.StringVar()
+        self.fill.set(step_index.FILLS[0])
+
+        # store colormap and normalization choices (see colour_lut.py)
+        self.colormap = Tkinter.StringVar()
+        self.colormap.set(colour_lut.COLORMAPS[0])
+        self.norm = Tkinter.StringVar()
+        self.norm.set(colour_lut.NORMS[0])
+
+        # store tile layout choice (see run_order.py)
+        self.layout = Tkinter.StringVar()
+        self.layout.set(run_order.LAYOUTS[0])
+
         # create entry box
         self.entry = ttk.Entry(self, textvariable=self.timepoint)
-        self.timepoint.set('Enter Integer from 0 to {0}'.format(self.range))
+        self.timepoint.set('Enter Step from {0:g} to {1:g}'.format(self.first,
+                                                                  self.last))
         self.entry.pack()
 
+        # create entry box for end of step range (ignored by "value")
+        self.end_entry = ttk.Entry(self, textvariable=self.endpoint)
+        self.endpoint.set(int(self.last))
+        self.end_entry.pack()
+
+        # create reduction/replicate menus
+        rdc_frame = ttk.Frame(self)
+        rdc_frame.pack()
+        ttk.Label(rdc_frame, text='reduction').pack(side='left')
+        ttk.OptionMenu(rdc_frame, self.reduction, self.reduction.get(),
+                       *heatmap_metrics.REDUCTIONS).pack(side='left')
+        ttk.Label(rdc_frame, text='replicates').pack(side='left')
+        ttk.OptionMenu(rdc_frame, self.replicates, self.replicates.get(),
+                       *heatmap_metrics.REPLICATE_REDUCTIONS
+                       ).pack(side='left')
+        ttk.Label(rdc_frame, text='missing').pack(side='left')
+        ttk.OptionMenu(rdc_frame, self.fill, self.fill.get(),
+                       *step_index.FILLS).pack(side='left')
+
+        # create colormap/normalization menus
+        cmap_frame = ttk.Frame(self)
+        cmap_frame.pack()
+        ttk.Label(cmap_frame, text='colormap').pack(side='left')
+        ttk.OptionMenu(cmap_frame, self.colormap, self.colormap.get(),
+                       *colour_lut.COLORMAPS).pack(side='left')
+        ttk.Label(cmap_frame, text='scale').pack(side='left')
+        ttk.OptionMenu(cmap_frame, self.norm, self.norm.get(),
+                       *colour_lut.NORMS).pack(side='left')
+        if not self.live:
+            ttk.Label(cmap_frame, text='layout').pack(side='left')
+            ttk.OptionMenu(cmap_frame, self.layout, self.layout.get(),
+                           *run_order.LAYOUTS).pack(side='left')
+
+        # create comparison mode menu
+        if self.others:
+            ttk.Label(rdc_frame, text='compare').pack(side='left')
+            ttk.OptionMenu(rdc_frame, self.mode, self.mode.get(),
+                           'side by side', 'difference').pack(side='left')
+
         # loop over dlist to create checkboxes
         for text in dlist:
             c = Tkinter.Radiobutton(
@@ -961,24 +1548,61 @@ class HeatmapDataSource(Tkinter.Toplevel):
         # check for int
         try:
             ticks = self.timepoint.get()
+            stop = self.endpoint.get()
         except:
             return
 
+        # reduction over a range or value at single timepoint
+        reduction = self.reduction.get()
+        if reduction == 'value':
+            stop = ticks
+
         # check for empty var
         dataset = self.var.get()
-        if dataset is not '' and ticks <= self.range and ticks >= 0:
+        if dataset is not '' and self.first <= ticks <= stop <= self.last:
+
+            # compare several files
+            if self.others:
+                hdfpaths = [self.hdfpath] + self.others
+                value_dicts = read_compare(hdfpaths, '/'+dataset, ticks,
+                                           reduction, stop,
+                                           self.replicates.get(),
+                                           self.fill.get())
+                gen_compare(self.root, hdfpaths, value_dicts, self.mode.get(),
+                            self.colormap.get(), self.norm.get(),
+                            similarity(self.hdfpath, '/'+dataset,
+                                       self.layout.get()),
+                            self.layout.get())
+
+            # file still being converted: refresh as runs are committed
+            elif self.live:
+                live = LiveHeatmap(self.root, self.hdfpath, '/'+dataset,
+                                   ticks, reduction, stop,
+                                   self.replicates.get(), self.fill.get(),
+                                   self.colormap.get(), self.norm.get())
+                self.root.frames['DataView'].live = live
+                live.start()
 
             # generate heatmap canvas
             # NOTE: Need to refactor WITHOUT threads ...
-            dataQ = Queue.Queue()
-            read_hdf5(self.hdfpath, dataQ, '/'+dataset, ticks)
+            else:
+                dataQ = Queue.Queue()
+                read_hdf5(self.hdfpath, dataQ, '/'+dataset, ticks, reduction,
+                          stop, self.replicates.get(), self.fill.get(),
+                          self.layout.get())
 
-            # generate heatmap
-            gen_heatmap(self.root, dataQ, self.hdfpath)
+                # generate heatmap
+                gen_heatmap(self.root, dataQ, self.hdfpath, '/'+dataset,
+                            self.colormap.get(), self.norm.get())
 
             # show 'DataView' page
             left = 'Heatmap({0})'.format(dataset)
+            if self.others:
+                left = 'Compare({0} files, {1})'.format(len(self.others) + 1,
+                                                        dataset)
             right = 'TimePoint({0})'.format(ticks)
+            if reduction != 'value':
+                right = '{0}({1}-{2})'.format(reduction.title(), ticks, stop)
             title = 'PyVisualize: ' + left + ' | ' + right
             self.root.title(title)
             self.root.show_frame('DataView', '{0} Heatmap'.format(dataset))
@@ -987,9 +1611,182 @@ class HeatmapDataSource(Tkinter.Toplevel):
             self.destroy()
 
 
+class BatchExport(Tkinter.Toplevel):
+    '''
+    Class for choosing the datasets, step range and format of a batch export
+    of heatmap frames.
+    '''
+    # constructor
+    def __init__(self, root, dlist, fpath, steps):
+        # create toplevel window
+        Tkinter.Toplevel.__init__(self, root)
+        self.title('Batch Export: {0}'.format(get_filename(fpath)))
+
+        # store hdfpath and lowest/highest step of any run
+        self.hdfpath = fpath
+        self.first, self.last = steps
+
+        # store step range, format and colour choices
+        self.start = Tkinter.IntVar()
+        self.start.set(int(self.first))
+        self.stop = Tkinter.IntVar()
+        self.stop.set(int(self.last))
+        self.every = Tkinter.IntVar()
+        self.every.set(1)
+        self.fmt = Tkinter.StringVar()
+        self.fmt.set(batch_export.FORMATS[0])
+        self.colormap = Tkinter.StringVar()
+        self.colormap.set(colour_lut.COLORMAPS[0])
+        self.norm = Tkinter.StringVar()
+        self.norm.set(colour_lut.NORMS[0])
+
+        # create entry boxes (start, stop, every)
+        tick_frame = ttk.Frame(self)
+        tick_frame.pack()
+        for text, var in (('start', self.start), ('stop', self.stop),
+                          ('every', self.every)):
+            ttk.Label(tick_frame, text=text).pack(side='left')
+            ttk.Entry(tick_frame, textvariable=var, width=8).pack(side='left')
+
+        # create format/colour menus
+        menu_frame = ttk.Frame(self)
+        menu_frame.pack()
+        ttk.OptionMenu(menu_frame, self.fmt, self.fmt.get(),
+                       *batch_export.FORMATS).pack(side='left')
+        ttk.OptionMenu(menu_frame, self.colormap, self.colormap.get(),
+                       *colour_lut.COLORMAPS).pack(side='left')
+        ttk.OptionMenu(menu_frame, self.norm, self.norm.get(),
+                       *colour_lut.NORMS).pack(side='left')
+
+        # loop over dlist to create checkboxes
+        self.checks = []
+        for text in dlist:
+            var = Tkinter.IntVar()
+            Tkinter.Checkbutton(self, text=text.strip('/'),
+                                variable=var).pack(anchor='w')
+            self.checks.append((text, var))
+
+        # create submit button
+        self.submit = ttk.Button(self, text='export',
+                                 command=lambda: self.get_choice())
+        self.submit.pack(side='bottom')
+
+    def get_choice(self, event=None):
+        '''
+        Function to start the export in a background thread.
+        '''
+        # check for int
+        try:
+            start, stop, every = (self.start.get(), self.stop.get(),
+                                  self.every.get())
+        except:
+            return
+
+        # check choices
+        datasets = [text for text, var in self.checks if var.get()]
+        if (not datasets or not self.first <= start <= stop <= self.last or
+                every < 1):
+            return
+        outdir = askdirectory()
+        if not outdir:
+            return
+
+        # run export thread
+        args = (self.hdfpath, outdir, start, stop, every, self.fmt.get(),
+                datasets, self.colormap.get(), self.norm.get())
+
+        def export():
+            batch_export.batch_export(*args)
+            logging.info('Exported: frames to {0}'.format(outdir))
+
+        export_thread = threading.Thread(target=export)
+        export_thread.start()
+
+        # then close window
+        self.destroy()
+
+
+class TopRuns(Tkinter.Toplevel):
+    '''
+    Class for ranking the runs of a heatmap by a summary statistic (see
+    run_summary.py) and outlining the top N tiles.
+    '''
+    # constructor
+    def __init__(self, root, canvas, hdfpath, datapath):
+        # create toplevel window
+        Tkinter.Toplevel.__init__(self, root)
+        self.title('Top Runs: {0}'.format(datapath.strip('/')))
+
+        # store heatmap canvas and data source
+        self.canvas = canvas
+        self.hdfpath = hdfpath
+        self.datapath = datapath
+
+        # store statistic, order and N
+        self.stat = Tkinter.StringVar()
+        self.stat.set('peak')
+        self.order = Tkinter.StringVar()
+        self.order.set('largest')
+        self.count = Tkinter.IntVar()
+        self.count.set(10)
+
+        # create menus/entry
+        frame = ttk.Frame(self)
+        frame.pack()
+        ttk.OptionMenu(frame, self.stat, self.stat.get(),
+                       *run_summary.STATS).pack(side='left')
+        ttk.OptionMenu(frame, self.order, self.order.get(),
+                       'largest', 'smallest').pack(side='left')
+        ttk.Entry(frame, textvariable=self.count, width=6).pack(side='left')
+
+        # create ranking label
+        self.ranking = Tkinter.StringVar()
+        ttk.Label(self, textvariable=self.ranking, anchor='w',
+                  justify='left').pack(fill='both')
+
+        # create buttons
+        ttk.Button(self, text='highlight',
+                   command=lambda: self.get_choice()).pack(side='left')
+        ttk.Button(self, text='clear',
+                   command=lambda: highlight_runs(self.canvas, [])
+                   ).pack(side='left')
+
+        # bind to TopRuns widget
+        self.bind("<Return>", self.get_choice)
+
+    def get_choice(self, event=None):
+        '''
+        Function to rank the runs and highlight them on the heatmap.
+        '''
+        # check for int
+        try:
+            count = self.count.get()
+        except:
+            return
+
+        # query summary index
+        with perf_trace.span('top_runs'):
+            top = run_summary.top_runs(self.hdfpath, self.datapath,
+                                       self.stat.get(), count,
+                                       self.order.get() == 'largest')
+
+        # show ranking and highlight tiles
+        self.ranking.set('\n'.join('{0}. run {1}: {2:.6g}'.format(i + 1, run,
+                                                                   value)
+                                   for i, (run, value) in enumerate(top)))
+        highlight_runs(self.canvas, [run for run, __ in top])
+        logging.info('Highlighted: top {0} runs by {1}'.format(
+            len(top), self.stat.get()))
+
+
 # executable
 if __name__ == '__main__':
 
     # launch
     app = RootWindow()
+
+    # self-explanatory
+    if not getattr(sys, 'frozen', False):
+        print banner
+
     app.mainloop()
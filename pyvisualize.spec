@@ -9,7 +9,10 @@ a = Analysis(['pyvisualize.py'],
              pathex=['/Users/TigerJ/CS/Projects/ORNL_CS/PyVisualize'],
              binaries=None,
              datas=added_files,
-             hiddenimports=['Tkinter', 'FileDialog'],
+             hiddenimports=['Tkinter', 'FileDialog', 'numpy', 'h5py',
+                            'primefac', 'matplotlib.figure', 'matplotlib.cm',
+                            'matplotlib.backends.backend_tkagg',
+                            'matplotlib.backends.backend_agg'],
              hookspath=[],
              runtime_hooks=[],
              excludes=[],
@@ -0,0 +1,374 @@
+#!/usr/bin/env python
+'''
+Copyright 2016 John David Anderson
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Author: John D. Anderson
+Email: jander43@vols.utk.edu
+Usage: run_order.py 'file.hdf5' 'dataset' ['similarity' | 'hilbert']
+Description:
+    This program orders the runs of a dataset so runs with similar
+    trajectories get neighbouring heatmap tiles. Every run is downsampled to
+    POINTS steps; LANDMARKS representative series are picked and refined
+    (k-means, with distances computed in chunks of CHUNK_RUNS runs), ordered
+    by average linkage clustering, and every run is placed between the
+    landmarks on either side of its own. The order is stored beside the file
+    ("file.hdf5.order.npz", stamped like flat_store sidecars so the file is
+    never rewritten), then laid out in serpentine rows ('similarity') or
+    along a Hilbert curve ('hilbert') over the square heatmap grid.
+'''
+
+# libraries
+import sys
+import os
+import math
+import lazy_import
+
+# lazily loaded libraries (see lazy_import.py)
+np = lazy_import.LazyModule('numpy')
+
+# custom libraries (local directory)
+import stream_reader
+import flat_store
+import storage
+import step_index
+import square_build
+
+# constants
+SUFFIX = '.order.npz'
+LAYOUTS = ('run', 'similarity', 'hilbert')
+POINTS = 32
+LANDMARKS = 64
+ITERATIONS = 3
+CHUNK_RUNS = 4096
+
+# globals
+ORDERCACHE = {}
+
+
+# functions
+def profiles(source, datapath, index, runs, points=POINTS,
+             memory_limit=stream_reader.MEMORY_LIMIT):
+    '''
+    Function to return a [runs x points] array of the values of every run at
+    "points" steps evenly spread over the step range of "index" (a
+    step_index.StepIndex), taking the nearest step each run has. Only the
+    sampled rows are read, from a store (see storage.py), in blocks of runs
+    that fit in "memory_limit".
+    '''
+    first, last = index.step_range()
+    steps = np.linspace(first, last, points)
+    run_chunk, __ = stream_reader.chunk_shape(points, memory_limit)
+    series = []
+    for r0 in xrange(0, len(runs), run_chunk):
+        block_runs = runs[r0:r0 + run_chunk]
+        rows = np.column_stack([index.rows(step, 'nearest', block_runs)
+                                for step in steps])
+        series.append(source.read_rows(datapath, block_runs, rows)[1])
+    if not series:
+        return np.empty((0, points))
+    return np.concatenate(series)
+
+
+def normalize(series):
+    '''
+    Function to centre every sampled point on its mean over runs and scale
+    all points by one common deviation (missing values become the mean).
+    '''
+    valid = ~np.isnan(series)
+    means = np.where(valid, series, 0).sum(axis=0) / np.maximum(
+        valid.sum(axis=0), 1)
+    series = np.where(valid, series - means, 0)
+    scale = series.std()
+    return series / scale if scale > 0 else series
+
+
+def sq_distances(a, b):
+    '''
+    Function to return the [len(a) x len(b)] squared euclidean distances
+    between the rows of "a" and "b".
+    '''
+    dist = (a ** 2).sum(axis=1)[:, None] + (b ** 2).sum(axis=1)[None, :] - \
+        2 * a.dot(b.T)
+    return np.maximum(dist, 0)
+
+
+def nearest(series, centres, chunk=CHUNK_RUNS):
+    '''
+    Function to return the index of the nearest centre of every row, holding
+    at most [chunk x centres] distances at once.
+    '''
+    labels = np.empty(len(series), dtype=np.int64)
+    for c0 in xrange(0, len(series), chunk):
+        labels[c0:c0 + chunk] = sq_distances(series[c0:c0 + chunk],
+                                             centres).argmin(axis=1)
+    return labels
+
+
+def landmarks(series, k=LANDMARKS, iterations=ITERATIONS, chunk=CHUNK_RUNS):
+    '''
+    Function to return (centres, labels) of up to "k" landmark series:
+    farthest point samples (starting from the run nearest the mean) refined
+    by a few k-means iterations.
+    '''
+    # farthest point sampling
+    chosen = [int(sq_distances(series, series.mean(axis=0)[None]).argmin())]
+    gaps = sq_distances(series, series[chosen])[:, 0]
+    while len(chosen) < min(k, len(series)):
+        far = int(gaps.argmax())
+        if gaps[far] == 0:
+            break  # every run equals a landmark
+        chosen.append(far)
+        gaps = np.minimum(gaps, sq_distances(series, series[[far]])[:, 0])
+    centres = series[chosen]
+
+    # k-means refinement (empty clusters keep their centre)
+    for __ in range(iterations):
+        labels = nearest(series, centres, chunk)
+        counts = np.bincount(labels, minlength=len(centres))
+        for col in range(series.shape[1]):
+            sums = np.bincount(labels, series[:, col], len(centres))
+            centres[:, col] = np.where(counts > 0, sums / np.maximum(
+                counts, 1), centres[:, col])
+    return centres, nearest(series, centres, chunk)
+
+
+def leaf_order(centres):
+    '''
+    Function to order centres by average linkage clustering, joining each
+    pair of clusters at their closest ends.
+    '''
+    dist = np.sqrt(sq_distances(centres, centres))
+    link = dist.copy()
+    np.fill_diagonal(link, np.inf)
+    sizes = np.ones(len(centres))
+    members = [[i] for i in range(len(centres))]
+    for __ in range(len(centres) - 1):
+        i, j = sorted(np.unravel_index(link.argmin(), link.shape))
+        a, b = members[i], members[j]
+        joins = [(dist[a[-1], b[0]], a + b),
+                 (dist[a[-1], b[-1]], a + b[::-1]),
+                 (dist[a[0], b[0]], a[::-1] + b),
+                 (dist[a[0], b[-1]], b + a)]
+        members[i], members[j] = min(joins, key=lambda join: join[0])[1], []
+
+        # average distance of the merged cluster to the others
+        link[i] = (link[i] * sizes[i] + link[j] * sizes[j]) / (sizes[i] +
+                                                                sizes[j])
+        link[:, i] = link[i]
+        link[i, i] = link[j] = link[:, j] = np.inf
+        sizes[i] += sizes[j]
+    return max(members, key=len)
+
+
+def similarity_order(series, k=LANDMARKS, chunk=CHUNK_RUNS):
+    '''
+    Function to return the row positions of "series" in similarity order:
+    grouped by landmark in leaf order, and within a group ordered from the
+    previous landmark towards the next one.
+    '''
+    if not len(series):
+        return np.arange(0)
+    series = normalize(series)
+    centres, labels = landmarks(series, k, chunk=chunk)
+    order = np.array(leaf_order(centres))
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+
+    # position between neighbouring landmarks
+    key = np.empty(len(series))
+    for c0 in xrange(0, len(series), chunk):
+        part, ranks = series[c0:c0 + chunk], rank[labels[c0:c0 + chunk]]
+        prev = centres[order[np.maximum(ranks - 1, 0)]]
+        nxt = centres[order[np.minimum(ranks + 1, len(order) - 1)]]
+        dprev = np.where(ranks > 0, np.sqrt(((part - prev) ** 2).sum(
+            axis=1)), 0)
+        dnext = np.where(ranks < len(order) - 1, np.sqrt(((part - nxt) ** 2)
+                                                         .sum(axis=1)), 0)
+        key[c0:c0 + chunk] = dprev - dnext
+    return np.lexsort((key, rank[labels]))
+
+
+def hilbert_index(side, x, y):
+    '''
+    Function to return the distance of cells (x, y) along a Hilbert curve
+    filling a "side" x "side" square ("side" a power of two).
+    '''
+    x, y = np.array(x, dtype=np.int64), np.array(y, dtype=np.int64)
+    dist = np.zeros(len(x), dtype=np.int64)
+    s = side // 2
+    while s > 0:
+        rx, ry = (x & s) > 0, (y & s) > 0
+        dist += s * s * ((3 * rx.astype(np.int64)) ^ ry.astype(np.int64))
+
+        # rotate quadrant
+        flip = rx & ~ry
+        x, y = np.where(flip, side - 1 - x, x), np.where(flip, side - 1 - y,
+                                                         y)
+        x, y = np.where(ry, x, y), np.where(ry, y, x)
+        s //= 2
+    return dist
+
+
+def select(order, runs):
+    '''
+    Function to return "runs" in the sequence of "order" (runs missing from
+    the order, e.g. added since, follow in run number order).
+    '''
+    runs = set(runs)
+    ordered = [run for run in order if run in runs]
+    return ordered + sorted(runs.difference(ordered))
+
+
+def place(runs, layout):
+    '''
+    Function to return ordered "runs" in row by row tile order of the square
+    heatmap grid (see square_build.py) for a layout of LAYOUTS.
+    '''
+    runs = list(runs)
+    if layout not in LAYOUTS:
+        raise ValueError('unknown layout: {0}'.format(layout))
+    if layout == 'run':
+        return sorted(runs)
+    if not runs:
+        return runs
+    widths = [row[0] for row in square_build.square_builder(len(runs))]
+
+    # serpentine rows (every other row reversed)
+    if layout == 'similarity':
+        placed, start = [], 0
+        for i, width in enumerate(widths):
+            row = runs[start:start + width]
+            placed.extend(row[::-1] if i % 2 else row)
+            start += width
+        return placed
+
+    # hilbert curve over the grid (skipping cells outside it)
+    rows = np.repeat(np.arange(len(widths)), widths)
+    cols = np.concatenate([np.arange(width) for width in widths])
+    side = 2 ** int(math.ceil(math.log(max(len(widths), max(widths), 1), 2)))
+    cells = np.argsort(hilbert_index(side, cols, rows), kind='mergesort')
+    placed = np.empty(len(runs), dtype=np.int64)
+    placed[cells] = runs
+    return placed.tolist()
+
+
+def build_order(hdf5path, datapath, k=LANDMARKS,
+                memory_limit=stream_reader.MEMORY_LIMIT):
+    '''
+    Function to return the runs of a dataset in similarity order, reading
+    from the store at "hdf5path" (see storage.py).
+    '''
+    with storage.open_store(hdf5path) as store:
+        runs = store.runs
+        index = step_index.store_index(store, runs)
+        series = profiles(store, datapath, index, runs,
+                          memory_limit=memory_limit)
+    return np.asarray(runs, dtype=np.int64)[similarity_order(series, k)]
+
+
+def order_path(path):
+    '''
+    Function to generate the path of the file holding the stored orders of
+    an HDF5 file or store.
+    '''
+    return path.rstrip('/') + SUFFIX
+
+
+def read_order(path, datapath, stamp):
+    '''
+    Function to return the stored order of a dataset, or None if there is
+    none for this version ("stamp") of the file.
+    '''
+    try:
+        saved = np.load(order_path(path))
+    except IOError:
+        return None
+    with saved:
+        dnames = saved['datasets'].tolist()
+        if tuple(saved['source']) != stamp or \
+                datapath.strip('/') not in dnames:
+            return None
+        return saved[str(dnames.index(datapath.strip('/')))]
+
+
+def store_order(path, datapath, order, stamp):
+    '''
+    Function to store an order beside the file (keeping the orders of other
+    datasets of the same version), so the file itself and everything cached
+    by its stamp stay current. Returns False if it cannot be written.
+    '''
+    arrays = {}
+    try:
+        with np.load(order_path(path)) as saved:
+            if tuple(saved['source']) == stamp:
+                arrays = {name: saved[str(i)] for i, name in
+                          enumerate(saved['datasets'].tolist())}
+    except IOError:
+        pass
+    arrays[datapath.strip('/')] = np.asarray(order, dtype=np.int64)
+
+    # write a temporary file, then replace any earlier one
+    dnames = sorted(arrays)
+    fields = {str(i): arrays[name] for i, name in enumerate(dnames)}
+    temp = order_path(path) + '.tmp'
+    try:
+        with open(temp, 'wb') as f:
+            np.savez(f, source=np.array(stamp), datasets=np.array(dnames),
+                     **fields)
+        os.rename(temp, order_path(path))
+    except (IOError, OSError):
+        return False
+    return True
+
+
+def load_order(hdf5path, datapath):
+    '''
+    Function to return the runs of a dataset in similarity order: stored
+    beside the file, else built once and stored (or, if it cannot be written
+    or the file is still being converted, kept in memory per file version).
+    '''
+    key = (hdf5path, datapath)
+    stamp = tuple(flat_store.source_stamp(hdf5path))
+    entry = ORDERCACHE.get(key)
+    if entry is not None and entry[0] == stamp:
+        return entry[1]
+
+    # stored order
+    order = read_order(hdf5path, datapath, stamp)
+
+    # build (and store)
+    if order is None:
+        live = False
+        if storage.backend(hdf5path) == 'hdf5':
+            with stream_reader.open_hdf5(hdf5path) as hdf5file:
+                live = stream_reader.is_live(hdf5file)
+        order = build_order(hdf5path, datapath)
+        if not live:
+            store_order(hdf5path, datapath, order, stamp)
+    ORDERCACHE[key] = (stamp, order)
+    return order
+
+
+# executable
+if __name__ == '__main__':
+
+    if len(sys.argv) not in (3, 4):
+        sys.exit()
+    else:
+        layout = sys.argv[3] if len(sys.argv) == 4 else 'similarity'
+        placed = place(load_order(sys.argv[1], sys.argv[2]).tolist(), layout)
+        list_rows = square_build.square_builder(len(placed))
+        for row in square_build.square_list(list_rows, placed):
+            print ' '.join('{0:>5}'.format(run) for run in row)
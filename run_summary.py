@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+'''
+Copyright 2016 John David Anderson
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Author: John D. Anderson
+Email: jander43@vols.utk.edu
+Usage:
+    run_summary.py 'file.hdf5'
+    run_summary.py 'file.hdf5' 'dataset' 'statistic' 'N' ['smallest']
+Description:
+    This program builds a per-run summary index (final value, peak, step of
+    the peak, least squares slope and variance of every dataset) in one
+    streaming pass over an HDF5 file, and stores it in the "/_summary" group.
+    The index ranks the top N runs of a dataset without reading raw series
+    (other stores, see storage.py, are summarized in memory once).
+'''
+
+# libraries
+import sys
+import lazy_import
+
+# lazily loaded libraries (see lazy_import.py)
+np = lazy_import.LazyModule('numpy')
+h5py = lazy_import.LazyModule('h5py')
+
+# custom libraries (local directory)
+import stream_reader
+import flat_store
+import storage
+
+# constants
+GROUP = '_summary'
+RUNS = 'runs'
+STATS = ('final', 'peak', 'time_to_peak', 'slope', 'variance')
+
+# globals
+SUMMARYCACHE = {}
+
+
+# functions
+def new_acc(nruns):
+    '''
+    Function to create the accumulators of a block of "nruns" runs.
+    '''
+    acc = {key: np.zeros(nruns) for key in ('n', 'mx', 'my', 'sxx', 'sxy',
+                                            'syy')}
+    for key in ('peak', 'peak_step', 'final'):
+        acc[key] = np.empty(nruns)
+        acc[key].fill(np.nan)
+    return acc
+
+
+def summary_block(acc, steps, values):
+    '''
+    Function to fold one [runs x ticks] block into the accumulators "acc".
+    Means and (co)variances are merged pairwise (Chan et al.) so long runs do
+    not lose precision.
+    '''
+    valid = ~np.isnan(values)
+    nb = valid.sum(axis=1).astype(np.float64)
+    has = nb > 0
+    div = np.maximum(nb, 1)
+
+    # block means and centred sums
+    mx = np.where(valid, steps, 0).sum(axis=1) / div
+    my = np.where(valid, values, 0).sum(axis=1) / div
+    dx = np.where(valid, steps - mx[:, None], 0)
+    dy = np.where(valid, values - my[:, None], 0)
+
+    # merge with previous blocks
+    n = acc['n'] + nb
+    weight = acc['n'] * nb / np.maximum(n, 1)
+    delta_x, delta_y = mx - acc['mx'], my - acc['my']
+    acc['sxx'] += (dx * dx).sum(axis=1) + delta_x * delta_x * weight
+    acc['sxy'] += (dx * dy).sum(axis=1) + delta_x * delta_y * weight
+    acc['syy'] += (dy * dy).sum(axis=1) + delta_y * delta_y * weight
+    acc['mx'] += delta_x * nb / np.maximum(n, 1)
+    acc['my'] += delta_y * nb / np.maximum(n, 1)
+    acc['n'] = n
+
+    # peak (first occurrence) and its step
+    index = np.arange(len(values))
+    top = np.where(valid, values, -np.inf).argmax(axis=1)
+    peak = values[index, top]
+    prev = np.where(np.isnan(acc['peak']), -np.inf, acc['peak'])
+    better = has & (np.where(has, peak, -np.inf) > prev)
+    acc['peak'] = np.where(better, peak, acc['peak'])
+    acc['peak_step'] = np.where(better, steps[index, top], acc['peak_step'])
+
+    # last valid value
+    last = values.shape[1] - 1 - valid[:, ::-1].argmax(axis=1)
+    acc['final'] = np.where(has, values[index, last], acc['final'])
+
+
+def finish(acc):
+    '''
+    Function to turn accumulators into a [runs x len(STATS)] array.
+    '''
+    empty = acc['n'] == 0
+    slope = np.where(acc['sxx'] > 0, acc['sxy'] / np.where(
+        acc['sxx'] > 0, acc['sxx'], 1), np.nan)
+    variance = np.where(empty, np.nan, acc['syy'] / np.maximum(acc['n'], 1))
+    return np.column_stack((acc['final'], acc['peak'], acc['peak_step'],
+                            slope, variance))
+
+
+def summarize(store, datapath, memory_limit=stream_reader.MEMORY_LIMIT):
+    '''
+    Function to return (runs, [runs x len(STATS)] array) for one dataset of a
+    store (see storage.py), streaming over its blocks once.
+    '''
+    runs, stats = [], []
+    acc, current = None, None
+    for block_runs, __, steps, values in store.gen_blocks(
+            datapath, memory_limit=memory_limit):
+        if block_runs is not current:
+            if acc is not None:
+                stats.append(finish(acc))
+            current, acc = block_runs, new_acc(len(block_runs))
+            runs.extend(block_runs)
+        summary_block(acc, steps, values)
+    if acc is not None:
+        stats.append(finish(acc))
+    if not stats:
+        return runs, np.empty((0, len(STATS)))
+    return runs, np.vstack(stats)
+
+
+def dataset_names(hdf5file):
+    '''
+    Function to return the dataset names of the first run of an open file.
+    '''
+    runs = stream_reader.list_runs(hdf5file)
+    return list(hdf5file['/' + str(runs[0])]) if runs else []
+
+
+def create_index(hdf5file, dnames, runs):
+    '''
+    Function to create the (empty) summary index datasets of an HDF5 file
+    opened for writing, replacing any existing index.
+    '''
+    if GROUP in hdf5file:
+        del hdf5file[GROUP]
+    grp = hdf5file.create_group(GROUP)
+    grp.attrs['stats'] = np.array(STATS, dtype='S')
+    grp.attrs['datasets'] = np.array(dnames, dtype=object).astype('S')
+    grp.create_dataset(RUNS, data=np.array(runs, dtype=np.int64))
+    for i in range(len(dnames)):
+        grp.create_dataset(str(i), (len(runs), len(STATS)), dtype=np.float64)
+
+
+def write_summary(hdf5file, memory_limit=stream_reader.MEMORY_LIMIT,
+                  create=True):
+    '''
+    Function to build the summary index of every dataset and store it in an
+    HDF5 file opened for writing (filling the datasets made by create_index()
+    beforehand if "create" is False, e.g. while writing in SWMR mode).
+    '''
+    if create:
+        create_index(hdf5file, dataset_names(hdf5file),
+                     stream_reader.list_runs(hdf5file))
+    grp = hdf5file[GROUP]
+    store = stream_reader.HDF5Store(hdf5file)
+    for i, dset in enumerate(grp.attrs['datasets']):
+        __, stats = summarize(store, str(dset), memory_limit)
+        grp[str(i)][...] = stats
+
+
+def read_column(hdf5file, datapath, stat):
+    '''
+    Function to return (runs, values) of one statistic of a dataset from the
+    summary index, or None if the file has no (finished) index.
+    '''
+    if GROUP not in hdf5file or stream_reader.is_live(hdf5file):
+        return None
+    grp = hdf5file[GROUP]
+    dnames = [str(name) for name in grp.attrs['datasets']]
+    column = list(STATS).index(stat)
+    index = dnames.index(datapath.strip('/'))
+    return grp[RUNS][...], grp[str(index)][:, column]
+
+
+def summary_column(hdf5path, datapath, stat):
+    '''
+    Function to return (runs, values) of one statistic of a dataset, from the
+    stored index or (for other stores, and files converted before the index
+    existed) from an index built in memory once per file version.
+    '''
+    if storage.backend(hdf5path) == 'hdf5':
+        with stream_reader.open_hdf5(hdf5path) as hdf5file:
+            column = read_column(hdf5file, datapath, stat)
+        if column is not None:
+            return column
+
+    # build (and cache) in memory
+    key = (hdf5path, datapath, tuple(flat_store.source_stamp(hdf5path)))
+    if key not in SUMMARYCACHE:
+        with storage.open_store(hdf5path) as store:
+            runs, stats = summarize(store, datapath)
+        SUMMARYCACHE[key] = (np.array(runs, dtype=np.int64), stats)
+    runs, stats = SUMMARYCACHE[key]
+    return runs, stats[:, list(STATS).index(stat)]
+
+
+def top_runs(hdf5path, datapath, stat, n, largest=True):
+    '''
+    Function to return [(run, value)] of the "n" runs with the largest (or
+    smallest) value of a statistic, best first (NaN values rank last).
+    '''
+    if stat not in STATS:
+        raise ValueError('unknown statistic: {0}'.format(stat))
+    runs, values = summary_column(hdf5path, datapath, stat)
+    n = min(n, len(values))
+    if n <= 0:
+        return []
+
+    # partial sort (i.e. only the top "n" are ordered)
+    keys = np.where(np.isnan(values), np.inf, -values if largest else values)
+    top = np.argpartition(keys, n - 1)[:n]
+    top = top[np.argsort(keys[top], kind='mergesort')]
+    return [(int(runs[i]), float(values[i])) for i in top]
+
+
+# executable
+if __name__ == '__main__':
+
+    if len(sys.argv) == 2:
+        with h5py.File(sys.argv[1], 'r+') as hdf5file:
+            write_summary(hdf5file)
+    elif len(sys.argv) in (5, 6):
+        largest = len(sys.argv) == 5 or sys.argv[5] != 'smallest'
+        for run, value in top_runs(sys.argv[1], sys.argv[2], sys.argv[3],
+                                   int(sys.argv[4]), largest):
+            print '{0}: {1}'.format(run, value)
+    else:
+        sys.exit()
@@ -26,7 +26,10 @@ Description:
 import sys
 import math
 import random
-import primefac as pf
+import lazy_import
+
+# lazily loaded libraries (see lazy_import.py)
+pf = lazy_import.LazyModule('primefac')
 
 
 # functions
@@ -38,12 +41,14 @@ def square_list(dimensions, item_list):
     # list
     array = []
 
-    # loop
+    # loop (slicing, since popping the front of a list is O(n) per item)
+    start = 0
     for item in dimensions:
-        temp = []
-        for i in range(item[0]):
-            temp.append(item_list.pop(0))
-        array.append(temp)
+        array.append(item_list[start:start + item[0]])
+        start += item[0]
+
+    # consume items (as popping did)
+    del item_list[:start]
 
     # return
     return array
@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+'''
+Copyright 2016 John David Anderson
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Author: John D. Anderson
+Email: jander43@vols.utk.edu
+Usage: step_index.py 'file.hdf5' ['step' 'nan' | 'previous' | 'nearest']
+Description:
+    This module maps [step] values to rows of every run, so heatmaps can be
+    read by step even when runs are measured every N steps, stop early or
+    record steps irregularly. A run whose steps are evenly spaced is stored
+    as (first step, stride, length) and resolved arithmetically; the steps of
+    the (rare) irregular runs are kept in one sorted array and resolved with
+    a single searchsorted() for all of them. The index is stored in the
+    "/_steps" group by csv2hdf5, or built once per file version otherwise.
+'''
+
+# libraries
+import sys
+import lazy_import
+
+# lazily loaded libraries (see lazy_import.py)
+np = lazy_import.LazyModule('numpy')
+
+# custom libraries (local directory)
+import stream_reader
+import flat_store
+
+# constants
+GROUP = '_steps'
+RUNS = 'runs'
+FIELDS = ('first', 'stride', 'length')
+FILLS = ('nan', 'previous', 'nearest')
+
+# globals
+STEPCACHE = {}
+
+
+# functions
+def scan_block(acc, t0, steps):
+    '''
+    Function to fold one [runs x ticks] block of steps into the accumulators
+    "acc" (first step, stride, length, last step, regular flag of each run).
+    '''
+    if t0 == 0:
+        acc['first'] = steps[:, 0].copy()
+    acc['length'] += (~np.isnan(steps)).sum(axis=1)
+
+    # differences, joined to the last step of the previous block
+    joined = np.hstack((acc['last'][:, None], steps))
+    diffs = np.diff(joined, axis=1)
+    valid = ~np.isnan(diffs)
+
+    # stride from the first difference of each run
+    need = np.isnan(acc['stride']) & valid.any(axis=1)
+    if need.any():
+        firsts = diffs[np.arange(len(diffs)), valid.argmax(axis=1)]
+        acc['stride'] = np.where(need, firsts, acc['stride'])
+    acc['regular'] &= (~valid | (diffs == acc['stride'][:, None])).all(
+        axis=1)
+
+    # last valid step
+    has = (~np.isnan(steps)).any(axis=1)
+    last = steps.shape[1] - 1 - (~np.isnan(steps))[:, ::-1].argmax(axis=1)
+    acc['last'] = np.where(has, steps[np.arange(len(steps)), last],
+                           acc['last'])
+
+
+def scan(store, runs=None, memory_limit=stream_reader.MEMORY_LIMIT):
+    '''
+    Function to build the StepIndex of "runs" (all if None) of a store (see
+    storage.py), streaming once over the steps of its first dataset (the
+    steps of irregular runs are then read whole).
+    '''
+    if runs is None:
+        runs = store.runs
+    if not len(runs):
+        return StepIndex([], [], [], [])
+
+    # stream over run blocks
+    fields, acc, current = [], None, None
+    for block_runs, t0, steps, __ in store.gen_blocks(
+            store.datasets[0], 0, None, runs, memory_limit):
+        if block_runs is not current:
+            if acc is not None:
+                fields.append(acc)
+            current, nruns = block_runs, len(block_runs)
+            acc = {'length': np.zeros(nruns, dtype=np.int64),
+                   'regular': np.ones(nruns, dtype=bool)}
+            for key in ('first', 'stride', 'last'):
+                acc[key] = np.empty(nruns)
+                acc[key].fill(np.nan)
+        scan_block(acc, t0, steps)
+    fields.append(acc)
+
+    # stride 0 marks irregular runs (and runs of one row get stride 1)
+    first = np.concatenate([block['first'] for block in fields])
+    length = np.concatenate([block['length'] for block in fields])
+    stride = np.concatenate([np.where(block['regular'] &
+                                      (block['stride'] > 0),
+                                      block['stride'], 0)
+                             for block in fields])
+    stride[length <= 1] = 1
+
+    # steps of irregular runs
+    steps = {runs[i]: store.run_steps(runs[i])
+             for i in np.flatnonzero(stride == 0)}
+    return StepIndex(runs, first, stride, length, steps)
+
+
+def create_index(hdf5file, runs):
+    '''
+    Function to create the (empty) "/_steps" datasets of an HDF5 file opened
+    for writing, replacing any existing index.
+    '''
+    if GROUP in hdf5file:
+        del hdf5file[GROUP]
+    grp = hdf5file.create_group(GROUP)
+    grp.create_dataset(RUNS, data=np.array(runs, dtype=np.int64))
+    for field in FIELDS:
+        grp.create_dataset(field, (len(runs),), dtype=np.float64)
+
+
+def write_index(hdf5file, memory_limit=stream_reader.MEMORY_LIMIT,
+                create=True):
+    '''
+    Function to build the step index of every run and store it in an HDF5
+    file opened for writing (filling the datasets made by create_index()
+    beforehand if "create" is False, e.g. while writing in SWMR mode).
+    '''
+    runs = stream_reader.list_runs(hdf5file)
+    if create:
+        create_index(hdf5file, runs)
+    index = scan(stream_reader.HDF5Store(hdf5file), runs, memory_limit)
+    grp = hdf5file[GROUP]
+    for field in FIELDS:
+        grp[field][...] = getattr(index, field)
+
+
+def read_index(hdf5file):
+    '''
+    Function to return the StepIndex stored in an HDF5 file, or None if the
+    file has no (finished) index.
+    '''
+    if GROUP not in hdf5file or stream_reader.is_live(hdf5file):
+        return None
+    grp = hdf5file[GROUP]
+    runs = grp[RUNS][...]
+    first, stride, length = [grp[field][...] for field in FIELDS]
+
+    # steps of irregular runs
+    steps = {}
+    irregular = np.flatnonzero(stride == 0)
+    if len(irregular):
+        dset = list(hdf5file['/' + str(runs[0])])[0]
+        for i in irregular:
+            steps[runs[i]] = hdf5file['/{0}/{1}'.format(runs[i], dset)][:, 0]
+    return StepIndex(runs, first, stride, length, steps)
+
+
+def load_index(hdf5file, hdf5path, runs=None):
+    '''
+    Function to return the StepIndex of an open HDF5 file covering "runs"
+    (all if None): the stored index if there is one, else an index scanned
+    once per file version. While a file is still being converted the cached
+    index is kept and only newly committed runs are scanned.
+    '''
+    if runs is None:
+        runs = stream_reader.list_runs(hdf5file)
+    stamp = tuple(flat_store.source_stamp(hdf5path))
+    live = stream_reader.is_live(hdf5file)
+
+    # cached (or stored) index
+    entry = STEPCACHE.get(hdf5path)
+    if entry is not None and (entry[0] == stamp or (live and entry[2])):
+        index = entry[1]
+    else:
+        index = None if live else read_index(hdf5file)
+        if index is None:
+            index = StepIndex([], [], [], [])
+
+    # scan runs not in index yet
+    missing = np.setdiff1d(np.asarray(runs, dtype=np.int64), index.runs)
+    if len(missing):
+        index = index.merge(scan(stream_reader.HDF5Store(hdf5file),
+                                 missing.tolist()))
+    STEPCACHE[hdf5path] = (stamp, index, live)
+    return index
+
+
+def store_index(store, runs=None):
+    '''
+    Function to return the StepIndex of a store (see storage.py) covering
+    "runs" (all if None): load_index() for HDF5 files, else the index saved
+    beside the arrays (scanned and saved the first time).
+    '''
+    if isinstance(store, stream_reader.HDF5Store):
+        return load_index(store.hdf5file, store.path, runs)
+    saved = store.read_index()
+    if saved is not None:
+        runs, first, stride, length = saved
+        steps = {run: store.run_steps(run) for run in runs[stride == 0]}
+        return StepIndex(runs, first, stride, length, steps)
+
+    # scan (and save, if the store can be written)
+    index = scan(store)
+    try:
+        store.save_index(index.runs, index.first, index.stride, index.length)
+    except (IOError, OSError):
+        pass
+    return index
+
+
+# class def
+class StepIndex(object):
+    '''
+    Class resolving [step] values to rows of runs. Regular runs are
+    described by "first", "stride" and "length"; runs with stride 0 are
+    irregular and resolved through their "steps" ({run: sorted steps}).
+    '''
+    # constructor
+    def __init__(self, runs, first, stride, length, steps=None):
+        self.runs = np.asarray(runs, dtype=np.int64)
+        self.first = np.asarray(first, dtype=np.float64)
+        self.stride = np.asarray(stride, dtype=np.float64)
+        self.length = np.asarray(length, dtype=np.int64)
+        self.steps = steps or {}
+
+        # steps of irregular runs in one array, each run shifted above the
+        # previous one so a single searchsorted() covers all of them
+        irregular = np.flatnonzero(self.stride == 0)
+        self.segment = np.zeros(len(self.runs), dtype=np.int64)
+        self.segment[irregular] = np.arange(len(irregular))
+        parts = [np.asarray(self.steps[run], dtype=np.float64)
+                 for run in self.runs[irregular]]
+        sizes = np.array([len(part) for part in parts], dtype=np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        self.low = np.array([part[0] for part in parts])
+        self.width = max([part[-1] - part[0] for part in parts] or [0]) + 1
+        self.keys = np.concatenate([part - part[0] + i * self.width
+                                    for i, part in enumerate(parts)] or
+                                   [np.empty(0)])
+        self.flat = np.concatenate(parts or [np.empty(0)])
+
+        # last step of every run (NaN for empty runs)
+        self.last = self.first + self.stride * (self.length - 1)
+        self.last[self.length == 0] = np.nan
+        for i in irregular:
+            self.last[i] = self.flat[self.offsets[self.segment[i]] +
+                                     self.length[i] - 1]
+
+    def positions(self, runs=None):
+        '''
+        Function to return the index positions of "runs" (all if None).
+        '''
+        if runs is None:
+            return np.arange(len(self.runs))
+        pos = np.searchsorted(self.runs, runs)
+        if np.any(pos >= len(self.runs)) or \
+                np.any(self.runs[np.minimum(pos, len(self.runs) - 1)] !=
+                       runs):
+            raise KeyError('runs not in step index')
+        return pos
+
+    def count(self, pos, step, side):
+        '''
+        Function to return how many steps of each run (at "pos") are below
+        "step" (side 'left') or at most "step" (side 'right').
+        '''
+        stride = self.stride[pos]
+        regular = stride > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scaled = (step - self.first[pos]) / np.where(regular, stride, 1)
+        if side == 'left':
+            counts = np.ceil(scaled)
+        else:
+            counts = np.floor(scaled) + 1
+        counts = np.where(np.isnan(counts), 0, counts).astype(np.int64)
+
+        # irregular runs
+        if not regular.all():
+            sel = np.flatnonzero(~regular)
+            seg = self.segment[pos[sel]]
+            keys = step - self.low[seg] + seg * self.width
+            counts[sel] = np.searchsorted(self.keys, keys, side) - \
+                self.offsets[seg]
+        return np.clip(counts, 0, self.length[pos])
+
+    def step_at(self, pos, rows):
+        '''
+        Function to return the step of row "rows" of each run (at "pos").
+        '''
+        steps = self.first[pos] + self.stride[pos] * rows
+        irregular = self.stride[pos] == 0
+        if irregular.any():
+            sel = np.flatnonzero(irregular)
+            steps[sel] = self.flat[self.offsets[self.segment[pos[sel]]] +
+                                   rows[sel]]
+        return steps
+
+    def rows(self, step, fill='nan', runs=None):
+        '''
+        Function to return the row holding "step" in every run (or "runs"),
+        -1 where a run has no such row. Missing steps are filled with the
+        row of the 'previous' or 'nearest' step if asked.
+        '''
+        if fill not in FILLS:
+            raise ValueError('unknown fill: {0}'.format(fill))
+        pos = self.positions(runs)
+        below = self.count(pos, step, 'left')
+        upto = self.count(pos, step, 'right')
+        if fill == 'nan':
+            return np.where(upto > below, below, -1)
+        if fill == 'previous':
+            return upto - 1
+
+        # nearest of the previous and next rows (ties go to previous)
+        length = self.length[pos]
+        prev, nxt = upto - 1, np.minimum(below, length - 1)
+        gap_prev = step - self.step_at(pos, np.maximum(prev, 0))
+        gap_next = self.step_at(pos, np.maximum(nxt, 0)) - step
+        rows = np.where((prev >= 0) & ((below >= length) |
+                                       (gap_prev <= gap_next)), prev, nxt)
+        return np.where(length > 0, rows, -1)
+
+    def span(self, start, stop, runs=None):
+        '''
+        Function to return (first rows, last rows) of the steps "start" to
+        "stop" in every run (or "runs"); last < first where there are none.
+        '''
+        pos = self.positions(runs)
+        return self.count(pos, start, 'left'), self.count(pos, stop,
+                                                          'right') - 1
+
+    def step_range(self):
+        '''
+        Function to return the (lowest, highest) step of any run.
+        '''
+        if not np.any(self.length):
+            return 0, -1
+        return np.nanmin(self.first), np.nanmax(self.last)
+
+    def merge(self, other):
+        '''
+        Function to return the StepIndex of the runs of both indexes.
+        '''
+        runs = np.concatenate((self.runs, other.runs))
+        order = np.argsort(runs, kind='mergesort')
+        steps = dict(self.steps)
+        steps.update(other.steps)
+        return StepIndex(runs[order],
+                         np.concatenate((self.first, other.first))[order],
+                         np.concatenate((self.stride, other.stride))[order],
+                         np.concatenate((self.length, other.length))[order],
+                         steps)
+
+
+# executable
+if __name__ == '__main__':
+
+    if len(sys.argv) not in (2, 4):
+        sys.exit()
+    else:
+        with stream_reader.open_hdf5(sys.argv[1]) as hdf5file:
+            index = load_index(hdf5file, sys.argv[1])
+        if len(sys.argv) == 2:
+            print 'steps {0} - {1}, {2} irregular runs'.format(
+                index.step_range()[0], index.step_range()[1],
+                len(index.steps))
+        else:
+            for run, row in zip(index.runs, index.rows(float(sys.argv[2]),
+                                                       sys.argv[3])):
+                print '{0}: {1}'.format(run, row)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+'''
+Copyright 2016 John David Anderson
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Author: John D. Anderson
+Email: jander43@vols.utk.edu
+Usage: storage.py 'file.hdf5' | 'file.npydir'
+Description:
+    This module opens simulation data stored by any of the BACKENDS behind
+    one interface, so the heatmap and portfolio readers do not depend on the
+    layout of the data:
+
+        'hdf5'  one group of [step, value] datasets per run (csv2hdf5),
+                read through stream_reader.HDF5Store
+        'npy'   one memory mapped [runs x ticks] .npy array per dataset
+                (flat_store.convert_csv, or the sidecar of an HDF5 file),
+                read through flat_store.FlatFile
+
+    Every store has "runs" and "datasets" and the methods run_params(),
+    keys(), gen_blocks(), read_rows(), read_run(), run_steps() and close()
+    (stores are also context managers); step_index.store_index() returns the
+    step index of any store. Like stream_reader.gen_blocks(), gen_blocks()
+    yields every tick block of a set of runs with the same "runs" object:
+    reduce_runs(), step_index.scan() and run_summary.summarize() detect a new
+    set of runs by identity.
+'''
+
+# libraries
+import sys
+import os
+
+# custom libraries (local directory)
+import stream_reader
+import flat_store
+
+# constants
+BACKENDS = ('hdf5', 'npy')
+
+
+# functions
+def backend(path):
+    '''
+    Function to return the backend of a path (a directory is a flat store).
+    '''
+    return 'npy' if os.path.isdir(path) else 'hdf5'
+
+
+def open_store(path):
+    '''
+    Function to open the store at "path": a flat store directory, else the
+    flat sidecar of an HDF5 file when it is up to date, else the HDF5 file.
+    '''
+    if backend(path) == 'npy':
+        store = flat_store.open_dir(path)
+        if store is None:
+            raise IOError('not a complete flat store: {0}'.format(path))
+        return store
+    return flat_store.open_flat(path) or stream_reader.HDF5Store(
+        hdf5path=path)
+
+
+def is_store(path):
+    '''
+    Function to check if "path" is an HDF5 file or a complete flat store.
+    '''
+    if backend(path) == 'npy':
+        return os.path.isfile(os.path.join(path, flat_store.INDEX))
+    return path.lower().endswith(('hdf5', 'h5'))
+
+
+def is_live(path):
+    '''
+    Function to check if a store is still being converted (only HDF5 files
+    are readable while converting, see live_convert.py).
+    '''
+    if backend(path) == 'npy':
+        return False
+    with stream_reader.open_hdf5(path) as hdf5file:
+        return stream_reader.is_live(hdf5file)
+
+
+def disk_size(path):
+    '''
+    Function to return the bytes a store takes on disk.
+    '''
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, name))
+               for name in os.listdir(path))
+
+
+# executable
+if __name__ == '__main__':
+
+    if len(sys.argv) != 2:
+        sys.exit()
+    else:
+        with open_store(sys.argv[1]) as store:
+            print '{0}: {1} runs, datasets {2}, {3} bytes'.format(
+                type(store).__name__, len(store.runs),
+                ', '.join(store.datasets), disk_size(sys.argv[1]))
@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+'''
+Copyright 2016 John David Anderson
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Author: John D. Anderson
+Email: jander43@vols.utk.edu
+Usage: stream_reader.py 'file.hdf5' 'dataset' 'memory limit (bytes)'
+Description:
+    This program streams [step, value] datasets out of an HDF5 file as fixed
+    size NumPy blocks of (runs x ticks), so files much larger than RAM can be
+    read with a hard limit on the memory held at any one time.
+'''
+
+# libraries
+import sys
+import math
+import lazy_import
+
+# lazily loaded libraries (see lazy_import.py)
+np = lazy_import.LazyModule('numpy')
+h5py = lazy_import.LazyModule('h5py')
+
+# custom libraries (local directory)
+import param_table
+
+# constants
+MEMORY_LIMIT = 64 * 2**20
+TICK_CHUNK = 4096
+PORTFOLIO_POINTS = 2000
+ITEM_BYTES = 16  # one float64 step + one float64 value per tick
+CELL_BYTES = 3 * ITEM_BYTES  # block plus temporaries made while folding it
+ACC_BYTES = 128  # accumulators/results kept per run by a block consumer
+HANDLE_BYTES = 48 * 2**10 + TICK_CHUNK * ITEM_BYTES  # open dataset + chunk
+PROGRESS_GROUP = '_progress'
+
+
+# functions
+def swmr_supported():
+    '''
+    Function to check if the HDF5 library supports single-writer/multiple-
+    reader (SWMR) mode (i.e. HDF5 1.10 or later).
+    '''
+    return h5py.version.hdf5_version_tuple >= (1, 10, 0)
+
+
+def open_hdf5(hdf5path):
+    '''
+    Function to open an HDF5 file read-only, in SWMR mode when available so
+    files still being converted (see live_convert.py) can be read too.
+    '''
+    if swmr_supported():
+        try:
+            return h5py.File(hdf5path, 'r', libver='latest', swmr=True)
+        except IOError:
+            pass  # e.g. already open without SWMR in this process
+    return h5py.File(hdf5path, 'r')
+
+
+def is_live(hdf5file):
+    '''
+    Function to check if an open HDF5 file is still being converted.
+    '''
+    return (PROGRESS_GROUP in hdf5file and
+            not hdf5file[PROGRESS_GROUP]['done'][()])
+
+
+def list_runs(hdf5file):
+    '''
+    Function to return the run numbers (i.e. group names) of an open HDF5 file
+    in ascending order. While the file is still being converted only runs
+    that are completely written are returned.
+    '''
+    if is_live(hdf5file):
+        progress = hdf5file[PROGRESS_GROUP]
+        done = progress['written'][...] >= progress['rows'][...]
+        return progress['runs'][...][done].tolist()
+    return sorted(int(grp) for grp in hdf5file if grp.isdigit())
+
+
+def chunk_shape(nticks, memory_limit=MEMORY_LIMIT, run_bytes=ACC_BYTES):
+    '''
+    Function to determine how many (runs, ticks) fit in one block without
+    exceeding "memory_limit" bytes, counting the block and its temporaries
+    (CELL_BYTES per run x tick), the rows of the one run being read and
+    "run_bytes" per run (e.g. accumulators, open dataset handles).
+    '''
+    minimum = run_bytes + CELL_BYTES + ITEM_BYTES
+    if memory_limit < minimum:
+        raise ValueError('memory limit must be at least '
+                         '{0} bytes'.format(minimum))
+
+    # ticks per block (never wider than the limit allows for a single run)
+    ticks = max(1, min(nticks, TICK_CHUNK, (memory_limit - run_bytes) //
+                       (CELL_BYTES + ITEM_BYTES)))
+
+    # runs per block fill the rest of the budget
+    runs = max(1, (memory_limit - ticks * ITEM_BYTES) //
+               (ticks * CELL_BYTES + run_bytes))
+
+    # return
+    return runs, ticks
+
+
+def gen_blocks(hdf5file, datapath, start=0, stop=None, runs=None,
+               memory_limit=MEMORY_LIMIT):
+    '''
+    Generator to yield (runs, first tick, steps, values) from an open HDF5
+    file, where "steps" and "values" are [runs x ticks] arrays covering ticks
+    "start" to "stop" (inclusive). Ticks past the end of shorter runs are NaN.
+    Blocks are ordered run-major: every tick block of a set of runs is yielded
+    (with the same "runs" object, so readers spot a new set by identity)
+    before moving on to the next set of runs.
+    '''
+    # constants
+    DPATH = datapath.strip('/')
+
+    # select runs
+    if runs is None:
+        runs = list_runs(hdf5file)
+
+    # open dataset handles once per run block (counted against the limit)
+    nticks = TICK_CHUNK if stop is None else stop - start + 1
+    run_chunk, tick_chunk = chunk_shape(nticks, memory_limit,
+                                        HANDLE_BYTES + ACC_BYTES)
+    for r0 in xrange(0, len(runs), run_chunk):
+        block_runs = runs[r0:r0 + run_chunk]
+        dsets = [hdf5file['/{0}/{1}'.format(run, DPATH)]
+                 for run in block_runs]
+        lengths = [dset.len() for dset in dsets]
+        last = max(max(lengths) - 1, start) if stop is None else stop
+
+        # stream over tick axis
+        for t0 in xrange(start, last + 1, tick_chunk):
+            t1 = min(t0 + tick_chunk, last + 1)
+            steps = np.empty((len(dsets), t1 - t0))
+            values = np.empty((len(dsets), t1 - t0))
+            steps.fill(np.nan)
+            values.fill(np.nan)
+            for i, dset in enumerate(dsets):
+                end = min(t1, lengths[i])
+                if end > t0:
+                    rows = dset[t0:end]
+                    steps[i, :end - t0] = rows[:, 0]
+                    values[i, :end - t0] = rows[:, 1]
+            yield block_runs, t0, steps, values
+
+
+def stream_chunks(hdf5path, datapath, start=0, stop=None, runs=None,
+                  memory_limit=MEMORY_LIMIT):
+    '''
+    Generator wrapping gen_blocks() that opens and closes the HDF5 file.
+    '''
+    with open_hdf5(hdf5path) as hdf5file:
+        for block in gen_blocks(hdf5file, datapath, start, stop, runs,
+                                memory_limit):
+            yield block
+
+
+def read_rows(hdf5file, datapath, runs, rows):
+    '''
+    Function to return (steps, values) of row "rows[i]" of every run
+    "runs[i]" of an open HDF5 file (NaN where the row is -1). "rows" may also
+    be a [runs x points] array, in which case the points of each run are read
+    in one selection.
+    '''
+    # constants
+    DPATH = datapath.strip('/')
+
+    rows = np.asarray(rows)
+    steps, values = np.empty(rows.shape), np.empty(rows.shape)
+    steps.fill(np.nan)
+    values.fill(np.nan)
+    found = rows >= 0
+    if rows.ndim == 1:
+        for i in np.flatnonzero(found):
+            steps[i], values[i] = hdf5file['/{0}/{1}'.format(runs[i],
+                                                             DPATH)][rows[i]]
+        return steps, values
+
+    # several points per run (selections must be sorted and unique)
+    for i in np.flatnonzero(found.any(axis=1)):
+        wanted = np.unique(rows[i][found[i]])
+        data = hdf5file['/{0}/{1}'.format(runs[i], DPATH)][wanted.tolist()]
+        pos = np.searchsorted(wanted, rows[i][found[i]])
+        steps[i, found[i]] = data[pos, 0]
+        values[i, found[i]] = data[pos, 1]
+    return steps, values
+
+
+def downsample(rows, bucket):
+    '''
+    Function to reduce a [step, value] array to the minimum and maximum point
+    of every "bucket" consecutive rows (i.e. keeping peaks in the plot).
+    '''
+    if bucket <= 1:
+        return rows
+
+    # split into buckets (last bucket may be short)
+    out = []
+    for b0 in xrange(0, len(rows), bucket):
+        part = rows[b0:b0 + bucket]
+        lo, hi = sorted((part[:, 1].argmin(), part[:, 1].argmax()))
+        out.append(part[lo])
+        if hi != lo:
+            out.append(part[hi])
+
+    # return
+    return np.array(out)
+
+
+def read_run(hdf5file, run, max_points=PORTFOLIO_POINTS,
+             memory_limit=MEMORY_LIMIT):
+    '''
+    Generator to yield (dataset name, [step, value] array) for every dataset of
+    a run, downsampled to at most ~"max_points" rows and read in blocks of at
+    most "memory_limit" bytes.
+    '''
+    # constants
+    HDFPATH = '/' + str(run)
+
+    # iterate over data sets
+    for dset_name in hdf5file[HDFPATH]:
+        dset = hdf5file[HDFPATH + '/' + dset_name]
+        length = dset.len()
+
+        # rows per bucket (two points kept each), and blocks of whole buckets
+        bucket = int(math.ceil(2 * length / float(max_points))) or 1
+        __, tick_chunk = chunk_shape(length, memory_limit)
+        tick_chunk = max(bucket, tick_chunk - tick_chunk % bucket)
+
+        # stream
+        parts = [downsample(dset[t0:t0 + tick_chunk], bucket)
+                 for t0 in xrange(0, length, tick_chunk)]
+        yield dset_name, np.concatenate(parts) if parts else np.empty((0, 2))
+
+
+# class def
+class HDF5Store(object):
+    '''
+    Class giving an HDF5 file written by pyvisualize (one group per run) the
+    same interface as flat_store.FlatFile (see storage.py). Wraps an open
+    "hdf5file", or opens (and on close() closes) "hdf5path".
+    '''
+    # constructor
+    def __init__(self, hdf5file=None, hdf5path=None):
+        self.owned = hdf5file is None
+        self.hdf5file = open_hdf5(hdf5path) if self.owned else hdf5file
+        self.path = hdf5path or self.hdf5file.filename
+        self.runs = list_runs(self.hdf5file)
+        self.datasets = list(self.hdf5file['/' + str(self.runs[0])]) \
+            if self.runs else []
+        self.table = param_table.read_table(self.hdf5file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        '''
+        Function to close the file (if opened by this store).
+        '''
+        if self.owned:
+            self.hdf5file.close()
+
+    def run_params(self, run):
+        '''
+        Function to return the [(name, value)] parameters of a run.
+        '''
+        return param_table.run_params(self.hdf5file, run, self.table)
+
+    def keys(self, runs, exclude=()):
+        '''
+        Function to return a hashable key per run built from its parameters,
+        skipping the parameters named in "exclude".
+        '''
+        if self.table is not None:
+            return self.table.keys(runs, exclude)
+        return [tuple(sorted((k, v) for k, v in
+                             self.hdf5file['/' + str(run)].attrs.iteritems()
+                             if k not in exclude)) for run in runs]
+
+    def gen_blocks(self, datapath, start=0, stop=None, runs=None,
+                   memory_limit=MEMORY_LIMIT):
+        '''
+        Generator with the blocks of gen_blocks().
+        '''
+        return gen_blocks(self.hdf5file, datapath, start, stop, runs,
+                          memory_limit)
+
+    def read_rows(self, datapath, runs, rows):
+        '''
+        Function with the output of read_rows().
+        '''
+        return read_rows(self.hdf5file, datapath, runs, rows)
+
+    def read_run(self, run, max_points=PORTFOLIO_POINTS):
+        '''
+        Generator with the output of read_run().
+        '''
+        return read_run(self.hdf5file, run, max_points)
+
+    def run_steps(self, run):
+        '''
+        Function to return the steps of every row of a run.
+        '''
+        return self.hdf5file['/{0}/{1}'.format(run, self.datasets[0])][:, 0]
+
+
+# executable
+if __name__ == '__main__':
+
+    if len(sys.argv) != 4:
+        sys.exit()
+    else:
+        for runs, first, steps, values in stream_chunks(
+                sys.argv[1], sys.argv[2], memory_limit=int(sys.argv[3])):
+            print 'runs {0}-{1}, ticks {2}-{3}, {4} bytes'.format(
+                runs[0], runs[-1], first, first + values.shape[1] - 1,
+                steps.nbytes + values.nbytes)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+'''
+Copyright 2016 John David Anderson
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Author: John D. Anderson
+Email: jander43@vols.utk.edu
+Description:
+    This module loads the data of clicked heatmap tiles on a pool of worker
+    threads. A click on a run that is already loading is coalesced with the
+    load in flight, a newer click cancels loads of other runs, and recently
+    loaded runs are kept in an LRU cache so reopening them is instant.
+'''
+
+# libraries
+import Queue
+import logging
+import threading
+import collections
+from multiprocessing.pool import ThreadPool
+
+# custom libraries (local directory)
+import flat_store
+
+# constants
+WORKERS = 2
+CACHE_SIZE = 16
+
+
+# class def
+class TileLoader(object):
+    '''
+    Class dispatching run loads to worker threads. "load" is called as
+    load(path, run, cancelled) and must return None if cancelled() became
+    true during the load.
+    '''
+    # constructor
+    def __init__(self, load, workers=WORKERS, cache_size=CACHE_SIZE):
+        self.load = load
+        self.workers = workers
+        self.cache_size = cache_size
+        self.pool = None
+        self.lock = threading.Lock()
+        self.latest = None
+        self.pending = set()
+        self.queued = set()
+        self.cache = collections.OrderedDict()
+        self.results = Queue.Queue()
+
+    def cached(self, key):
+        '''
+        Function to return a cached result (marking it recently used), or None.
+        Must be called holding the lock.
+        '''
+        entry = self.cache.pop(key, None)
+        if entry is None or entry[0] != flat_store.source_stamp(key[0]):
+            return None
+        self.cache[key] = entry
+        return entry[1]
+
+    def request(self, path, run):
+        '''
+        Function to request the data of a run. Returns the result straight
+        away if it is cached, else None (the result is then returned by poll()
+        once loaded).
+        '''
+        key = (path, run)
+        with self.lock:
+            self.latest = key
+            result = self.cached(key)
+            if result is not None:
+                self.queued.discard(key)  # served, so not delivered again
+            if result is not None or key in self.pending:
+                return result
+            self.pending.add(key)
+        self.submit(key)
+        return None
+
+    def submit(self, key):
+        '''
+        Function to start loading "key" on the worker pool.
+        '''
+        if self.pool is None:
+            self.pool = ThreadPool(self.workers)
+        self.pool.apply_async(self.work, (key,))
+
+    def work(self, key):
+        '''
+        Function run by a worker thread to load one run (unless a newer
+        request for another run arrived in the meantime).
+        '''
+        def cancelled():
+            return self.latest != key
+
+        result, failed = None, False
+        try:
+            if not cancelled():
+                stamp = flat_store.source_stamp(key[0])
+                result = self.load(key[0], key[1], cancelled)
+        except Exception:
+            failed = True
+            logging.exception('Loading run {0} failed'.format(key[1]))
+
+        # cache/deliver result (or reload if requested again after cancelling)
+        with self.lock:
+            resubmit = result is None and not failed and not cancelled()
+            if result is not None:
+                self.cache[key] = (stamp, result)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+                self.queued.add(key)
+                self.results.put((key, result))
+            if not resubmit:
+                self.pending.discard(key)
+        if resubmit:
+            self.submit(key)
+
+    def busy(self):
+        '''
+        Function to check if any loads are in flight.
+        '''
+        with self.lock:
+            return bool(self.pending)
+
+    def poll(self):
+        '''
+        Function to collect finished loads, returning (run, result) of the
+        most recent request if it is ready, else None (results of stale
+        requests, or already served by request(), are only cached).
+        '''
+        ready = None
+        while True:
+            try:
+                key, result = self.results.get_nowait()
+            except Queue.Empty:
+                return ready
+            with self.lock:
+                if key not in self.queued:
+                    continue
+                self.queued.discard(key)
+                if key == self.latest:
+                    ready = key[1], result